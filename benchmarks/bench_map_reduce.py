@@ -0,0 +1,74 @@
+"""
+Compares the wall-clock time of answering a question about a large file
+with the sequential refine loop and with the concurrent map plus tree
+reduce, against a fake LLM that sleeps to simulate request latency.
+
+Usage:
+    python -m benchmarks.bench_map_reduce [--chunks N] [--latency S] [--concurrency N] [--fan-in N]
+"""
+
+
+# Standard lib
+import time
+import argparse
+
+# 3rd party
+from langchain_core.runnables import RunnableSequence
+from langchain_community.chat_models.fake import FakeListChatModel
+
+# Local
+from chaingpt.api import llm
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """
+    A fake chat model that takes `latency` seconds per call.
+    """
+    latency: float = 0.0
+
+    def _call(self, *args, **kwargs) -> str:
+        time.sleep(self.latency)
+        return super()._call(*args, **kwargs)
+
+
+def _use_model(model):
+    """
+    Swaps the model of every map-reduce chain for `model`.
+    """
+    for name in ["summarize_chunk_chain", "read_summary_chain", "extract_notes_chain", "combine_notes_chain"]:
+        chain = getattr(llm, name)
+        steps = [model if step is llm.llm else step for step in chain.steps]
+        setattr(llm, name, RunnableSequence(*steps))
+
+
+def _time(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=64, help="Number of chunks in the file")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per LLM call")
+    parser.add_argument("--concurrency", type=int, default=llm.MAP_REDUCE_CONCURRENCY, help="Concurrent LLM calls")
+    parser.add_argument("--fan-in", type=int, default=llm.MAP_REDUCE_FAN_IN, help="Notes merged per LLM call")
+    args = parser.parse_args()
+
+    _use_model(SlowFakeChatModel(responses=["Some notes."], latency=args.latency))
+    chunks = [f"def function_{i}():\n    return {i}\n" * 50 for i in range(args.chunks)]
+    question = "What do the functions return?"
+
+    refine = _time(llm.text_qa_map_reduce, question, chunks, mode="refine")
+    tree = _time(llm.text_qa_map_reduce, question, chunks, mode="tree",
+                 max_concurrency=args.concurrency, fan_in=args.fan_in)
+
+    print(f"chunks:  {args.chunks}")
+    print(f"latency: {args.latency:.2f}s per call")
+    print(f"refine:  {refine:.2f}s")
+    print(f"tree:    {tree:.2f}s ({args.concurrency} concurrent, fan-in {args.fan_in})")
+    print(f"speedup: {refine / tree:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Compares the time it takes to build the Wolfi package index from a
+synthetic corpus of melange files using the original serial loop
+(full `yaml.safe_load` per file) and the parallel, partial parser.
+
+Usage:
+    python -m benchmarks.bench_wolfi_index [--files N] [--workers N]
+"""
+
+
+# Standard lib
+import os
+import time
+import argparse
+import tempfile
+
+# 3rd party
+import yaml
+from whoosh.index import create_in
+from whoosh.fields import Schema, TEXT, ID
+
+# Local
+from chaingpt.api import wolfi
+
+
+def _melange_yaml(i: int) -> str:
+    """
+    Returns a melange file resembling the ones in wolfi-dev/os, with
+    most of its bulk in the pipeline and test sections.
+    """
+    steps = "".join(
+        f"  - runs: |\n"
+        f"      ./configure --prefix=/usr --with-feature-{j}\n"
+        f"      make -j$(nproc) install DESTDIR=${{{{targets.destdir}}}}\n"
+        for j in range(20))
+    tests = "".join(f"    - runs: pkg-{i} --check {j}\n" for j in range(10))
+    return (f"package:\n"
+            f"  name: pkg-{i}\n"
+            f"  version: 1.{i}.0\n"
+            f"  epoch: 0\n"
+            f"  description: Synthetic benchmark package number {i}\n"
+            f"  copyright:\n"
+            f"    - license: Apache-2.0\n"
+            f"  dependencies:\n"
+            f"    runtime:\n"
+            f"      - busybox\n"
+            f"environment:\n"
+            f"  contents:\n"
+            f"    packages:\n"
+            f"      - build-base\n"
+            f"      - busybox\n"
+            f"pipeline:\n"
+            f"  - uses: fetch\n"
+            f"    with:\n"
+            f"      uri: https://example.com/pkg-{i}-${{{{package.version}}}}.tar.gz\n"
+            f"{steps}"
+            f"test:\n"
+            f"  pipeline:\n"
+            f"{tests}")
+
+
+def _schema() -> Schema:
+    return Schema(file_name=ID(stored=True, unique=True),
+                  package_name=TEXT(stored=True),
+                  package_desc=TEXT(stored=True))
+
+
+def _build_serial(os_path: str, index_path: str):
+    """
+    The index build loop as it was before parallel parsing.
+    """
+    writer = create_in(index_path, _schema()).writer()
+    for name in os.listdir(os_path):
+        if name.endswith(".yaml"):
+            with open(os.path.join(os_path, name), "r", encoding="utf-8") as f:
+                data = yaml.safe_load(f)
+            writer.add_document(file_name=name,
+                                package_name=data["package"]["name"],
+                                package_desc=data["package"]["description"])
+    writer.commit()
+
+
+def _build_parallel(os_path: str, index_path: str, workers: int):
+    writer = create_in(index_path, _schema()).writer()
+    names = [n for n in os.listdir(os_path) if wolfi._is_package_file(n)]
+    paths = [os.path.join(os_path, n) for n in names]
+    for name, package in zip(names, wolfi._parse_package_files(paths, workers=workers)):
+        if package is not None:
+            writer.add_document(file_name=name, package_name=package.name,
+                                package_desc=package.description)
+    writer.commit()
+
+
+def _time(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=3000, help="Number of melange files to generate")
+    parser.add_argument("--workers", type=int, default=wolfi.BUILD_WORKERS, help="Parser processes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os_path = os.path.join(tmp, "os")
+        os.makedirs(os_path)
+        for i in range(args.files):
+            with open(os.path.join(os_path, f"pkg-{i}.yaml"), "w", encoding="utf-8") as f:
+                f.write(_melange_yaml(i))
+
+        serial_path = os.path.join(tmp, "serial-index")
+        parallel_path = os.path.join(tmp, "parallel-index")
+        os.makedirs(serial_path)
+        os.makedirs(parallel_path)
+
+        serial = _time(_build_serial, os_path, serial_path)
+        parallel = _time(_build_parallel, os_path, parallel_path, args.workers)
+
+    print(f"files:    {args.files}")
+    print(f"loader:   {wolfi._YAML_LOADER.__name__}")
+    print(f"serial:   {serial:.2f}s")
+    print(f"parallel: {parallel:.2f}s ({args.workers} workers)")
+    print(f"speedup:  {serial / parallel:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
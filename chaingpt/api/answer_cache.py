@@ -0,0 +1,136 @@
+"""
+A persistent cache of `fileqa` answers.
+
+Answers are keyed by the git blob SHA of the analyzed file, the
+normalized question and every setting that affects the LLM's answer, so
+the same question about the same file contents is only paid for once,
+across sessions and repositories.
+"""
+
+
+# Standard lib
+from typing import Optional, Dict, Any
+import os
+import re
+import json
+import time
+import hashlib
+
+# Local
+from chaingpt.api.llm import LLMResponse
+from chaingpt.utils import config
+from chaingpt.utils.sqlite_store import SQLiteStore, DefaultStore
+
+
+ANSWER_CACHE_CONFIG = config.config["llm"].get("answer_cache") or {}
+ANSWER_CACHE_ENABLED = ANSWER_CACHE_CONFIG.get("enabled", True)
+ANSWER_CACHE_PATH = ANSWER_CACHE_CONFIG.get("path") or \
+    os.path.join(os.path.dirname(config.CONFIG_FILE_NAME), "fileqa_cache.sqlite")
+TTL_DAYS = ANSWER_CACHE_CONFIG.get("ttl_days", 30)
+MAX_SIZE_MB = ANSWER_CACHE_CONFIG.get("max_size_mb", 100)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    output TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    truncated INTEGER NOT NULL DEFAULT 0,
+    skipped_chunks INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question so trivially different phrasings share a cache
+    entry: case, repeated whitespace and trailing punctuation are ignored.
+    """
+    return _WHITESPACE_RE.sub(" ", question).strip().rstrip("?.! ").lower()
+
+
+def cache_key(blob_sha: str, question: str, settings: Dict[str, Any]) -> str:
+    """
+    Returns the cache key for a question about a file.
+
+    Args:
+        blob_sha (str): The git blob SHA of the file.
+        question (str): The question. It is normalized first.
+        settings (Dict[str, Any]): Everything else that affects the answer,
+            such as the model, chunking settings and prompt version.
+    """
+    material = json.dumps([blob_sha, normalize_question(question), settings], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class AnswerCache(SQLiteStore):
+    """
+    An SQLite-backed cache of `LLMResponse` objects, safe to share between
+    threads and processes. Entries expire `ttl_days` after they were
+    stored, and the least recently used entries are evicted once the
+    stored answers exceed `max_size_mb`.
+    """
+    TABLE = "answers"
+    SCHEMA = _SCHEMA
+    SIZE = "LENGTH(CAST(output AS BLOB))"
+
+    def __init__(self, path: str=ANSWER_CACHE_PATH, ttl_days: float=TTL_DAYS, max_size_mb: float=MAX_SIZE_MB):
+        super().__init__(path, max_size_mb=max_size_mb)
+        self.ttl = ttl_days * 24 * 60 * 60
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(answers)")]
+        # Columns added after the first release
+        for column in ["truncated", "skipped_chunks"]:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE answers ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        """
+        Returns the cached response for `key`, or `None`. Cached responses
+        report no tokens used.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output, model, created, truncated, skipped_chunks FROM answers WHERE key = ?",
+                (key,)).fetchone()
+            if row is not None and now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return LLMResponse(output=row[0], model=row[1], input_tokens=0, output_tokens=0,
+                           cached=True, truncated=bool(row[3]), skipped_chunks=row[4])
+
+    def put(self, key: str, response: LLMResponse):
+        """
+        Stores `response` for `key` and evicts expired entries and entries
+        over the size budget.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, response.output, response.model, response.input_tokens,
+                 response.output_tokens, now, now, int(response.truncated), response.skipped_chunks))
+            self._conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            self._evict()
+
+
+_default_cache = DefaultStore(AnswerCache)
+
+
+def default_cache() -> Optional[AnswerCache]:
+    """
+    Returns the cache configured by `llm.answer_cache`, or `None` if it is disabled.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return _default_cache.get()
@@ -0,0 +1,205 @@
+"""
+Reads Alpine/Wolfi `APKINDEX.tar.gz` files.
+
+An APKINDEX is a gzipped tar (usually a signature tar concatenated with
+the index tar) holding a text file of package records. Each record is a
+block of `<field>:<value>` lines separated by a blank line.
+"""
+
+
+# Standard lib
+from typing import Iterator, Iterable, Optional, Tuple, IO, List
+import gzip
+import http.client
+import os
+import re
+import tarfile
+import urllib.request
+import urllib.error
+
+# Local
+from chaingpt.api.catalog import CatalogPackage
+
+
+APKINDEX_MEMBER = "APKINDEX"
+
+# Seconds to wait on the APKINDEX server before giving up on a request or read
+DOWNLOAD_TIMEOUT = 60
+
+# Ordering of apk version suffixes relative to a version without a suffix
+_SUFFIX_ORDER = {"alpha": -4, "beta": -3, "pre": -2, "rc": -1,
+                 "cvs": 1, "svn": 2, "git": 3, "hg": 4, "p": 5}
+
+_VERSION_RE = re.compile(r"^(?P<nums>\d+(?:\.\d+)*)(?P<letter>[a-z]?)"
+                         r"(?P<suffixes>(?:_[a-z]+\d*)*)(?:-r(?P<release>\d+))?$")
+_SUFFIX_RE = re.compile(r"_([a-z]+)(\d*)")
+
+# Version constraint operators that may follow a dependency name
+_CONSTRAINT_RE = re.compile(r"[<>=~]")
+
+
+def version_key(version: str) -> Tuple:
+    """
+    Returns a key that sorts apk version strings (e.g. `3.12.1_rc1-r2`)
+    from oldest to newest. Versions that do not follow the apk format are
+    ordered by their numeric components.
+    """
+    match = _VERSION_RE.match(version)
+    if match is None:
+        nums = tuple(int(n) for n in re.findall(r"\d+", version))
+        return (nums, "", ((0, 0),), 0)
+
+    nums = tuple(int(n) for n in match["nums"].split("."))
+    suffixes = tuple((_SUFFIX_ORDER.get(name, 0), int(n or 0))
+                     for name, n in _SUFFIX_RE.findall(match["suffixes"]))
+    # A version without further suffixes sorts between pre-releases and patches
+    suffixes += ((0, 0),)
+    return (nums, match["letter"], suffixes, int(match["release"] or 0))
+
+
+def dependency_name(dep: str) -> str:
+    """
+    Strips any version constraint from a dependency or provides entry
+    (e.g. `python-3.12>=3.12.1` -> `python-3.12`, `so:libc.so.6=6` -> `so:libc.so.6`).
+    """
+    match = _CONSTRAINT_RE.search(dep)
+    return dep[:match.start()] if match else dep
+
+
+def _record_to_package(record: dict) -> Optional[CatalogPackage]:
+    if "P" not in record:
+        return None
+    try:
+        installed_size = int(record.get("I", 0))
+    except ValueError:
+        installed_size = 0
+    return CatalogPackage(name=record["P"],
+                          description=record.get("T", ""),
+                          version=record.get("V", ""),
+                          provides=tuple(record.get("p", "").split()),
+                          depends=tuple(record.get("D", "").split()),
+                          installed_size=installed_size)
+
+
+def parse_records(lines: Iterable[str]) -> Iterator[CatalogPackage]:
+    """
+    Parses the text of an APKINDEX member into packages.
+    """
+    record = {}
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            package = _record_to_package(record)
+            if package is not None:
+                yield package
+            record = {}
+            continue
+        field, sep, value = line.partition(":")
+        if sep and len(field) == 1:
+            record[field] = value
+    package = _record_to_package(record)
+    if package is not None:
+        yield package
+
+
+def parse_apkindex(fileobj: IO[bytes]) -> Iterator[CatalogPackage]:
+    """
+    Streams through a gzipped APKINDEX tar and yields every package
+    record. The archive is never fully loaded into memory or written to disk.
+
+    Args:
+        fileobj: A binary file object positioned at the start of the `APKINDEX.tar.gz`.
+
+    Returns:
+        An `Iterator` over `CatalogPackage` objects.
+
+    Raises:
+        ValueError: If the archive does not contain an APKINDEX.
+    """
+    # Signed indexes are a gzipped signature tar concatenated with the gzipped
+    # index tar. `GzipFile` reads across both gzip members and `ignore_zeros`
+    # reads past any end-of-archive marker between the two tars.
+    try:
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as gz, \
+                tarfile.open(fileobj=gz, mode="r|", ignore_zeros=True) as tar:
+            for member in tar:
+                if member.name != APKINDEX_MEMBER:
+                    continue
+                lines = (line.decode("utf-8", errors="replace")
+                         for line in tar.extractfile(member))
+                yield from parse_records(lines)
+                return
+    except (tarfile.TarError, EOFError, OSError, http.client.HTTPException) as e:
+        raise ValueError(f"Unable to read APKINDEX: {e}") from e
+    raise ValueError("The archive does not contain an APKINDEX")
+
+
+def newest(packages: Iterable[CatalogPackage]) -> List[CatalogPackage]:
+    """
+    Keeps only the newest version of each package name. An APKINDEX
+    lists every published version of a package.
+    """
+    best = {}
+    for p in packages:
+        current = best.get(p.name)
+        if current is None or version_key(p.version) >= version_key(current.version):
+            best[p.name] = p
+    return list(best.values())
+
+
+def _is_url(source: str) -> bool:
+    return source.startswith("http://") or source.startswith("https://")
+
+
+def open_apkindex(source: str, validator: str=None,
+                  timeout: float=DOWNLOAD_TIMEOUT) -> Optional[Tuple[IO[bytes], str]]:
+    """
+    Opens an APKINDEX from a URL or a local path for streaming.
+
+    Args:
+        source (str): An `http(s)://` URL or a local file path.
+        validator (str, optional): The validator returned by a previous call.
+            If the index has not changed since, `None` is returned.
+        timeout (float, optional): Seconds to wait on a remote `source` to
+            connect or send more data.
+
+    Returns:
+        A `(fileobj, validator)` tuple, or `None` if the index is unchanged.
+        The caller must close `fileobj`.
+
+    Raises:
+        FileNotFoundError: If a local `source` does not exist.
+        ValueError: If a remote `source` cannot be retrieved.
+    """
+    if not _is_url(source):
+        stat = os.stat(source)
+        current = f"{stat.st_mtime_ns}:{stat.st_size}"
+        if current == validator:
+            return None
+        return open(source, "rb"), current
+
+    request = urllib.request.Request(source)
+    if validator is not None:
+        kind, _, value = validator.partition(":")
+        if kind == "etag":
+            request.add_header("If-None-Match", value)
+        elif kind == "modified":
+            request.add_header("If-Modified-Since", value)
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise ValueError(f"Error retrieving {source}: HTTP {e.code}") from e
+    except urllib.error.URLError as e:
+        raise ValueError(f"Error retrieving {source}: {e.reason}") from e
+    except (OSError, http.client.HTTPException) as e:
+        # Timeouts and dropped connections while reading the response headers
+        raise ValueError(f"Error retrieving {source}: {e}") from e
+
+    current = ""
+    if response.headers.get("ETag"):
+        current = "etag:" + response.headers["ETag"]
+    elif response.headers.get("Last-Modified"):
+        current = "modified:" + response.headers["Last-Modified"]
+    return response, current
@@ -0,0 +1,527 @@
+"""
+A compact, read-only snapshot of the Wolfi package catalog.
+
+The catalog is a single file made of named sections. Strings are stored
+as one packed UTF-8 blob per column plus an array of offsets into it, and
+keyword search uses a precomputed token -> package posting list. The file
+can be memory-mapped so loading it does not depend on its size.
+"""
+
+
+# Standard lib
+from typing import List, Iterable, Optional, Dict, Tuple
+from dataclasses import dataclass
+from array import array
+import mmap
+import os
+import re
+import struct
+import sys
+from collections import Counter
+import heapq
+
+# 3rd party
+from whoosh.analysis import STOP_WORDS
+
+
+MAGIC = b"WOLFICAT"
+
+# Bump whenever the sections or their encoding change
+FORMAT = 3
+
+# magic, format, byte order (0 = little, 1 = big), section count
+_HEADER = struct.Struct("<8sHBxI")
+# section name, offset, length
+_TOC_ENTRY = struct.Struct("<16sQQ")
+_ALIGN = 8
+
+# Mirrors whoosh's StandardAnalyzer so catalog and index searches agree
+_TOKEN_RE = re.compile(r"\w+(?:\.?\w+)*")
+_MIN_TOKEN_LEN = 2
+
+# Package names are also indexed by character n-grams for typo-tolerant search
+NGRAM_SIZE = 3
+# Candidates (by n-gram Dice coefficient) that are re-ranked by edit distance
+_FUZZY_CANDIDATES = 64
+# Near matches scoring below this similarity are dropped
+FUZZY_MIN_SCORE = 0.5
+
+# A version embedded in a package name, e.g. the `3.12` in `python-3.12-dev`
+_NAME_VERSION_RE = re.compile(r"-(\d+(?:\.\d+)*)(?=-|$)")
+
+# Package fields stored as string columns, in sorted-by-name order
+_STRING_COLUMNS = ("name", "description", "version")
+# Package fields holding names, stored as space separated string columns
+_LIST_COLUMNS = ("provides", "depends")
+
+# Posting tables: search keys mapped to lists of package positions
+_POSTING_TABLES = ("token", "ngram")
+
+_U32_SECTIONS = tuple(c + "_off" for c in _STRING_COLUMNS + _LIST_COLUMNS + _POSTING_TABLES) \
+    + tuple(t + suffix for t in _POSTING_TABLES for suffix in ("_post_off", "_post_ids"))
+_U64_SECTIONS = ("installed_size",)
+_SECTIONS = _U32_SECTIONS + _U64_SECTIONS \
+    + tuple(c + "_str" for c in _STRING_COLUMNS + _LIST_COLUMNS + _POSTING_TABLES)
+
+
+@dataclass(frozen=True)
+class CatalogPackage:
+    """
+    A package stored in the catalog.
+
+    name (str): The package name.
+    description (str): The package description.
+    version (str): The package version, including the epoch (e.g. `3.12.1-r0`).
+    provides (Tuple[str]): Names this package provides, e.g. `cmd:python3=3.12.1-r0`.
+    depends (Tuple[str]): Runtime dependencies, possibly with version constraints.
+    installed_size (int): The installed size in bytes, or 0 if unknown.
+    """
+    name: str
+    description: str
+    version: str = ""
+    provides: Tuple[str, ...] = ()
+    depends: Tuple[str, ...] = ()
+    installed_size: int = 0
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits `text` into lowercase search tokens.
+    """
+    return [t for t in _TOKEN_RE.findall(text.lower())
+            if len(t) >= _MIN_TOKEN_LEN and t not in STOP_WORDS]
+
+
+def ngrams(text: str, n: int=NGRAM_SIZE) -> List[str]:
+    """
+    Returns the character n-grams of `text`, padded with `$` at both ends
+    so prefixes and suffixes are weighted. The characters of each n-gram
+    are sorted so that transposed letters (`pyhton`) still share n-grams
+    with the correct spelling (`python`).
+    """
+    padded = f"${text.lower()}$"
+    return ["".join(sorted(padded[i:i + n])) for i in range(len(padded) - n + 1)]
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    Returns the optimal string alignment distance between `a` and `b`:
+    the number of insertions, deletions, substitutions and adjacent
+    transpositions needed to turn one into the other.
+    """
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[len(b)]
+
+
+def _similarity(query: str, name: str) -> float:
+    """
+    Scores how closely `name` matches a possibly misspelled `query`,
+    from 0 to 1. Matching the start of a longer name (e.g. `pyhton3`
+    against `python-3.12`) scores almost as well as matching all of it.
+    """
+    def score(a: str, b: str) -> float:
+        return 1 - edit_distance(a, b) / max(len(a), len(b), 1)
+
+    # Compare the query to name prefixes of similar length
+    best = score(query, name)
+    for n in range(max(1, len(query) - 1), min(len(name), len(query) + 2) + 1):
+        best = max(best, 0.9 * score(query, name[:n]))
+    return best
+
+
+def name_version_key(name: str) -> Tuple[int, ...]:
+    """
+    Returns the version embedded in a package name as a sortable tuple,
+    e.g. `(3, 12)` for `python-3.12`, or `()` if the name has none.
+    """
+    matches = _NAME_VERSION_RE.findall(name)
+    if not matches:
+        return ()
+    return tuple(int(n) for n in matches[-1].split("."))
+
+
+def _name_base(name: str) -> str:
+    """
+    Returns `name` without its embedded version, e.g. `python` for `python-3.12`.
+    """
+    return _NAME_VERSION_RE.sub("", name)
+
+
+def _version_ordered(names: List[str], key) -> List[str]:
+    """
+    Sorts `names` by `key` (ascending) and, within equal keys, puts newer
+    versions of the same package first.
+    """
+    by_version = sorted(names, key=name_version_key, reverse=True)
+    return sorted(by_version, key=key)
+
+
+def _pad(n: int) -> int:
+    return (_ALIGN - n % _ALIGN) % _ALIGN
+
+
+def _pack_strings(strings: List[str]) -> Tuple[bytes, bytes]:
+    """
+    Packs `strings` into an offsets array and a UTF-8 blob.
+    """
+    offsets = array("I", [0])
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets.tobytes(), bytes(blob)
+
+
+def _pack_postings(table: str, postings: Dict[str, List[int]]) -> List[Tuple[str, bytes]]:
+    """
+    Packs a posting table into its sorted key column, posting offsets
+    and posting lists.
+    """
+    keys = sorted(postings, key=lambda k: k.encode("utf-8"))
+    off, blob = _pack_strings(keys)
+    post_off = array("I", [0])
+    post_ids = array("I")
+    for k in keys:
+        post_ids.extend(postings[k])
+        post_off.append(len(post_ids))
+    return [(table + "_off", off), (table + "_str", blob),
+            (table + "_post_off", post_off.tobytes()), (table + "_post_ids", post_ids.tobytes())]
+
+
+class _StringColumn:
+    """
+    Random access over a packed string column without decoding it up front.
+    """
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def raw(self, i: int) -> bytes:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def __getitem__(self, i: int) -> str:
+        return self.raw(i).decode("utf-8")
+
+    def bisect_left(self, key: bytes) -> int:
+        """
+        Returns the first position whose value is >= `key`. The column
+        must be sorted by its UTF-8 encoding.
+        """
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class _PostingTable:
+    """
+    Looks up the posting list of a key by binary search over the sorted keys.
+    """
+    def __init__(self, keys: _StringColumn, offsets: memoryview, ids: memoryview):
+        self._keys = keys
+        self._offsets = offsets
+        self._ids = ids
+
+    def get(self, key: str) -> List[int]:
+        raw = key.encode("utf-8")
+        i = self._keys.bisect_left(raw)
+        if i < len(self._keys) and self._keys.raw(i) == raw:
+            return self._ids[self._offsets[i]:self._offsets[i + 1]].tolist()
+        return []
+
+
+class WolfiCatalog:
+    """
+    A loaded catalog file. Use `WolfiCatalog.write` to create one and
+    `WolfiCatalog.load` to open it.
+    """
+    def __init__(self, buffer, sections: Dict[str, memoryview], mapped: mmap.mmap=None):
+        self._buffer = buffer
+        self._mmap = mapped
+        # Every view into the buffer. They must be released before an mmap can be closed.
+        self._views = list(sections.values())
+
+        def u32(name: str) -> memoryview:
+            view = sections[name].cast("I")
+            self._views.append(view)
+            return view
+
+        self._columns = {
+            c: _StringColumn(u32(c + "_off"), sections[c + "_str"])
+            for c in _STRING_COLUMNS + _LIST_COLUMNS
+        }
+        self._installed_size = sections["installed_size"].cast("Q")
+        self._views.append(self._installed_size)
+        self._postings = {
+            t: _PostingTable(_StringColumn(u32(t + "_off"), sections[t + "_str"]),
+                             u32(t + "_post_off"), u32(t + "_post_ids"))
+            for t in _POSTING_TABLES
+        }
+
+    @staticmethod
+    def write(path: str, packages: Iterable[CatalogPackage]):
+        """
+        Writes `packages` to a catalog file at `path`. The file is
+        written to a temporary path first and atomically moved into place
+        so concurrent readers never see a partial catalog.
+
+        Args:
+            path (str): Where to write the catalog.
+            packages (Iterable[CatalogPackage]): The packages to store. Later
+                packages replace earlier ones with the same name.
+        """
+        by_name = {p.name: p for p in packages}
+        ordered = sorted(by_name.values(), key=lambda p: p.name.encode("utf-8"))
+
+        tokens = {}
+        grams = {}
+        for i, p in enumerate(ordered):
+            for token in set(tokenize(p.name) + tokenize(p.description)):
+                tokens.setdefault(token, []).append(i)
+            for gram in set(ngrams(p.name)):
+                grams.setdefault(gram, []).append(i)
+
+        sections = []
+        for c in _STRING_COLUMNS:
+            off, blob = _pack_strings([getattr(p, c) for p in ordered])
+            sections += [(c + "_off", off), (c + "_str", blob)]
+        for c in _LIST_COLUMNS:
+            off, blob = _pack_strings([" ".join(getattr(p, c)) for p in ordered])
+            sections += [(c + "_off", off), (c + "_str", blob)]
+        sizes = array("Q", [p.installed_size for p in ordered])
+        sections += [("installed_size", sizes.tobytes())]
+        sections += _pack_postings("token", tokens)
+        sections += _pack_postings("ngram", grams)
+
+        byteorder = 0 if sys.byteorder == "little" else 1
+        header = _HEADER.pack(MAGIC, FORMAT, byteorder, len(sections))
+        offset = _HEADER.size + _TOC_ENTRY.size * len(sections)
+        offset += _pad(offset)
+        toc = b""
+        for name, data in sections:
+            toc += _TOC_ENTRY.pack(name.encode("ascii"), offset, len(data))
+            offset += len(data) + _pad(len(data))
+
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(header + toc)
+            f.write(b"\0" * _pad(len(header) + len(toc)))
+            for _, data in sections:
+                f.write(data)
+                f.write(b"\0" * _pad(len(data)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, use_mmap: bool=True) -> "WolfiCatalog":
+        """
+        Opens the catalog at `path`.
+
+        Args:
+            path (str): The catalog file.
+            use_mmap (bool, optional): Memory-map the file instead of reading it into memory.
+
+        Returns:
+            A `WolfiCatalog`.
+
+        Raises:
+            FileNotFoundError: If `path` does not exist.
+            ValueError: If the file is not a catalog or was written by an
+                        incompatible version.
+        """
+        with open(path, "rb") as f:
+            if use_mmap:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                buffer = memoryview(mapped)
+            else:
+                mapped = None
+                buffer = memoryview(f.read())
+
+        sections = {}
+        try:
+            if len(buffer) < _HEADER.size:
+                raise ValueError(f"{path} is not a Wolfi catalog")
+            magic, fmt, byteorder, n_sections = _HEADER.unpack_from(buffer, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a Wolfi catalog")
+            if fmt != FORMAT or byteorder != (0 if sys.byteorder == "little" else 1):
+                raise ValueError(f"{path} was written by an incompatible catalog version")
+
+            for i in range(n_sections):
+                name, offset, length = _TOC_ENTRY.unpack_from(buffer, _HEADER.size + i * _TOC_ENTRY.size)
+                if offset + length > len(buffer):
+                    raise ValueError(f"{path} is truncated")
+                sections[name.rstrip(b"\0").decode("ascii")] = buffer[offset:offset + length]
+            for name in _SECTIONS:
+                if name not in sections:
+                    raise ValueError(f"{path} is missing the {name} section")
+                if name in _U32_SECTIONS and len(sections[name]) % 4:
+                    raise ValueError(f"{path} has a malformed {name} section")
+                if name in _U64_SECTIONS and len(sections[name]) % 8:
+                    raise ValueError(f"{path} has a malformed {name} section")
+            return cls(buffer, sections, mapped)
+        except (ValueError, UnicodeDecodeError, struct.error) as e:
+            for view in sections.values():
+                view.release()
+            buffer.release()
+            if mapped is not None:
+                mapped.close()
+            if isinstance(e, ValueError):
+                raise
+            raise ValueError(f"{path} is not a valid Wolfi catalog") from e
+
+    def close(self):
+        """
+        Releases the underlying buffer. The catalog cannot be used afterwards.
+        """
+        for view in self._views:
+            view.release()
+        self._buffer.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __len__(self) -> int:
+        return len(self._columns["name"])
+
+    def package(self, i: int) -> CatalogPackage:
+        """
+        Returns the package at position `i` (packages are sorted by name).
+        """
+        fields = {c: self._columns[c][i] for c in _STRING_COLUMNS}
+        fields.update({c: tuple(self._columns[c][i].split()) for c in _LIST_COLUMNS})
+        return CatalogPackage(installed_size=self._installed_size[i], **fields)
+
+    def packages(self) -> Iterable[CatalogPackage]:
+        """
+        Iterates over every package, sorted by name.
+        """
+        for i in range(len(self)):
+            yield self.package(i)
+
+    def get(self, name: str) -> Optional[CatalogPackage]:
+        """
+        Returns the package named exactly `name` or `None`.
+        """
+        key = name.encode("utf-8")
+        names = self._columns["name"]
+        i = names.bisect_left(key)
+        if i < len(names) and names.raw(i) == key:
+            return self.package(i)
+        return None
+
+    def _prefix_ids(self, prefix: str) -> range:
+        key = prefix.encode("utf-8")
+        names = self._columns["name"]
+        start = names.bisect_left(key)
+        end = start
+        while end < len(names) and names.raw(end).startswith(key):
+            end += 1
+        return range(start, end)
+
+    def prefix(self, prefix: str, limit: int=10) -> List[CatalogPackage]:
+        """
+        Returns up to `limit` packages whose names start with `prefix`, sorted by name.
+        """
+        ids = self._prefix_ids(prefix)
+        return [self.package(i) for i in ids[:limit]]
+
+    def keyword(self, query: str, limit: int=10) -> List[CatalogPackage]:
+        """
+        Returns up to `limit` packages whose name or description contain
+        every token of `query`. Packages matching on their name rank first
+        and newer versions of the same package come before older ones.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        ids = None
+        for token in tokens:
+            posting = set(self._postings["token"].get(token))
+            ids = posting if ids is None else ids & posting
+            if not ids:
+                return []
+
+        names = {self._columns["name"][i]: i for i in ids}
+
+        def rank(name: str) -> Tuple[int, int, str]:
+            in_name = all(t in tokenize(name) for t in tokens)
+            base = _name_base(name)
+            return (0 if in_name else 1, len(base), base)
+
+        ordered = _version_ordered(list(names), rank)
+        return [self.package(names[n]) for n in ordered[:limit]]
+
+    def fuzzy(self, query: str, limit: int=10,
+              min_score: float=FUZZY_MIN_SCORE) -> List[Tuple[CatalogPackage, float]]:
+        """
+        Returns up to `limit` packages whose names are near matches of a
+        possibly misspelled `query` (e.g. `pyhton3` or `golang-1.22`),
+        with their similarity scores. Candidates sharing the most name
+        n-grams with `query` are re-ranked by edit distance. Among similarly
+        scored names, newer versions of a package come first.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        grams = set(ngrams(query))
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._postings["ngram"].get(gram))
+
+        # Dice coefficient between the n-gram sets. A name of n bytes has
+        # at most n padded n-grams, which is close enough for ranking.
+        names = self._columns["name"]
+        def dice(i: int) -> float:
+            return 2 * counts[i] / (len(grams) + len(names.raw(i)))
+        candidates = heapq.nlargest(_FUZZY_CANDIDATES, counts, key=dice)
+
+        scores = {}
+        for i in candidates:
+            name = names[i]
+            score = _similarity(query, name.lower())
+            if score >= min_score:
+                scores[name] = (i, score)
+
+        # Round scores so near-equal matches are ordered by version
+        ordered = _version_ordered(list(scores), lambda n: (-round(scores[n][1], 1), _name_base(n)))
+        return [(self.package(scores[n][0]), scores[n][1]) for n in ordered[:limit]]
+
+    def search(self, query: str, limit: int=10) -> List[CatalogPackage]:
+        """
+        Returns up to `limit` packages for a simple keyword `query`. An
+        exact name match comes first, followed by keyword matches and
+        then by packages whose names start with `query`.
+        """
+        query = query.strip()
+        output = []
+        seen = set()
+
+        def add(packages: Iterable[CatalogPackage]):
+            for p in packages:
+                if len(output) >= limit:
+                    return
+                if p.name not in seen:
+                    seen.add(p.name)
+                    output.append(p)
+
+        exact = self.get(query)
+        if exact is not None:
+            add([exact])
+        add(self.keyword(query, limit))
+        add(self.prefix(query, limit))
+        return output
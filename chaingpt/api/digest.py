@@ -0,0 +1,168 @@
+"""
+Question-independent digests of large files.
+
+A digest records what a file is for, the symbols it exports, the
+configuration it defines or reads and a summary of every chunk. It is
+built once per blob SHA and stored, so later questions about the file are
+answered from the digest plus only the relevant raw chunks instead of a
+full scan.
+"""
+
+
+# Standard lib
+from typing import List, Optional
+from dataclasses import dataclass, asdict
+import os
+import json
+import time
+
+# Local
+from chaingpt.api.llm import summarize_file, LLM_MODEL, PROMPT_VERSION
+from chaingpt.api.symbol_index import extract_symbols
+from chaingpt.utils import config
+from chaingpt.utils.sqlite_store import SQLiteStore, DefaultStore
+
+
+DIGEST_CONFIG = config.config["llm"].get("digest") or {}
+DIGEST_ENABLED = DIGEST_CONFIG.get("enabled", False)
+# Build digests on a background thread after the first question instead of before answering it
+DIGEST_BACKGROUND = DIGEST_CONFIG.get("background", True)
+DIGEST_PATH = DIGEST_CONFIG.get("path") or \
+    os.path.join(os.path.dirname(config.CONFIG_FILE_NAME), "file_digests.sqlite")
+MAX_ENTRIES = DIGEST_CONFIG.get("max_entries", 10000)
+
+# Exported symbols listed per digest
+MAX_SYMBOLS = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+@dataclass(frozen=True)
+class FileDigest:
+    """
+    A question-independent description of a file.
+
+    purpose (str): What the file is for.
+    symbols (List[str]): The top-level public classes, functions and types it defines.
+    key_config (List[str]): Configuration keys, environment variables, flags and constants.
+    chunk_summaries (List[str]): A summary of every chunk, in file order.
+    """
+    purpose: str
+    symbols: List[str]
+    key_config: List[str]
+    chunk_summaries: List[str]
+
+    def render(self) -> str:
+        """
+        Formats the digest for an LLM prompt.
+        """
+        text = f"Purpose: {self.purpose}\n"
+        if self.symbols:
+            text += "Exported symbols: " + ", ".join(self.symbols) + "\n"
+        if self.key_config:
+            text += "Key configuration:\n" + "".join(f"- {c}\n" for c in self.key_config)
+        text += "Chunk summaries:\n"
+        text += "".join(f"{i + 1}. {s}\n" for i, s in enumerate(self.chunk_summaries))
+        return text
+
+
+def _exported_symbols(file_path: str, text: str) -> List[str]:
+    definitions, _ = extract_symbols(file_path, text)
+    names = [s.name for s in definitions
+             if "." not in s.qualname and not s.name.startswith("_") and s.kind != "variable"]
+    return list(dict.fromkeys(names))[:MAX_SYMBOLS]
+
+
+def _parse_description(output: str) -> dict:
+    """
+    Parses the LLM's JSON description of a file, tolerating code fences
+    and falling back to using the whole output as the purpose.
+    """
+    start, end = output.find("{"), output.rfind("}")
+    if start != -1 and end > start:
+        try:
+            description = json.loads(output[start:end + 1])
+            if isinstance(description, dict):
+                return description
+        except ValueError:
+            pass
+    return {"purpose": output.strip()}
+
+
+def build_digest(file_path: str, text: str, chunks: List[str]) -> FileDigest:
+    """
+    Builds the digest of a file. Symbols are extracted locally; the purpose,
+    configuration and chunk summaries come from the LLM.
+
+    Args:
+        file_path (str): The file path, relative to the top-level of the repository.
+        text (str): The file contents.
+        chunks (List[str]): The chunks of `text`, in order.
+
+    Returns:
+        A `FileDigest`.
+    """
+    summaries, output, _ = summarize_file(chunks, file_path=file_path)
+    description = _parse_description(output)
+    key_config = description.get("key_config") or []
+    if not isinstance(key_config, list):
+        key_config = [str(key_config)]
+    return FileDigest(purpose=str(description.get("purpose", "")),
+                      symbols=_exported_symbols(file_path, text),
+                      key_config=[str(c) for c in key_config],
+                      chunk_summaries=list(summaries))
+
+
+def digest_key(blob_sha: str, chunk_size: int, chunk_overlap: int) -> str:
+    """
+    Returns the storage key of a digest. Digests depend on the file contents,
+    the chunking, the model and the prompts.
+    """
+    return f"{blob_sha}:{chunk_size}:{chunk_overlap}:{LLM_MODEL}:{PROMPT_VERSION}"
+
+
+class DigestStore(SQLiteStore):
+    """
+    An SQLite-backed store of `FileDigest` objects, safe to share between
+    threads and processes. The least recently used digests are evicted
+    beyond `max_entries`.
+    """
+    TABLE = "digests"
+    SCHEMA = _SCHEMA
+
+    def __init__(self, path: str=DIGEST_PATH, max_entries: int=MAX_ENTRIES):
+        super().__init__(path, max_entries=max_entries)
+
+    def get(self, key: str) -> Optional[FileDigest]:
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM digests WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE digests SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return FileDigest(**json.loads(row[0]))
+
+    def put(self, key: str, digest: FileDigest):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?)",
+                               (key, json.dumps(asdict(digest)), time.time()))
+            self._evict()
+
+
+_default_store = DefaultStore(DigestStore)
+
+
+def default_store() -> Optional[DigestStore]:
+    """
+    Returns the store configured by `llm.digest`, or `None` if digests are disabled.
+    """
+    if not DIGEST_ENABLED:
+        return None
+    return _default_store.get()
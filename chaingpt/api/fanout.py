@@ -0,0 +1,174 @@
+"""
+Answering a question from many files of a repository at once.
+
+The files matching a glob are ranked locally by how many of the
+question's terms appear in their paths and, judging by the trigram
+index, in their contents. The best candidates are then analyzed
+concurrently, each on its own, until a token budget is spent, and their
+answers are combined into one.
+"""
+
+
+# Standard lib
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+
+# Local
+from chaingpt.api.llm import LLMResponse, LLM_MODEL, text_qa_merge
+from chaingpt.api.retrieval import tokenize, STOPWORDS
+from chaingpt.utils import config
+
+
+FANOUT_CONFIG = (config.config.get("workspace") or {}).get("fanout") or {}
+# Files analyzed per question
+MAX_FILES = FANOUT_CONFIG.get("max_files", 40)
+# Files analyzed at once
+CONCURRENCY = FANOUT_CONFIG.get("concurrency", 8)
+# No file is started once this many tokens were used
+TOKEN_BUDGET = FANOUT_CONFIG.get("token_budget", 200000)
+
+# A term in a path counts this many times a term in the contents
+PATH_WEIGHT = 2
+
+
+@dataclass
+class FanoutResult:
+    """
+    The answer to a question asked of many files.
+
+    response (LLMResponse): The combined answer. Its `sources` hold the answer
+        of every analyzed file, most relevant file first.
+    candidates (int): The number of files that matched the glob and the question.
+    analyzed (List[str]): The analyzed files, in the order they finished.
+    budget_exhausted (bool): Whether candidates were left out because the token budget ran out.
+    failed (Dict[str, str]): The error of every file whose analysis failed, by path.
+    """
+    response: LLMResponse
+    candidates: int
+    analyzed: List[str]
+    budget_exhausted: bool
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+def question_terms(question: str) -> List[str]:
+    """
+    Returns the terms of `question` worth looking for in files.
+    """
+    terms = []
+    for term in tokenize(question):
+        if term in STOPWORDS:
+            continue
+        # Matched as substrings, so the singular also finds the plural
+        if len(term) > 4 and term.endswith("s"):
+            term = term[:-1]
+        terms.append(term)
+    return list(dict.fromkeys(terms))
+
+
+def rank_files(terms: List[str], files: List[str], content_counts: Dict[str, int]) -> List[str]:
+    """
+    Orders files by how many of `terms` their paths and contents contain.
+    Files containing none are dropped, unless there are no terms.
+
+    Args:
+        terms (List[str]): The terms of the question.
+        files (List[str]): The candidate paths.
+        content_counts (Dict[str, int]): How many terms every file contains, by path.
+
+    Returns:
+        The relevant files, most relevant first.
+    """
+    scores = {}
+    for path in files:
+        lower = path.lower()
+        score = PATH_WEIGHT * sum(t in lower for t in terms) + content_counts.get(path, 0)
+        if score or not terms:
+            scores[path] = score
+    return sorted(scores, key=lambda p: (-scores[p], p))
+
+
+def fanout_qa(question: str, files: List[str], ask: Callable[[str], LLMResponse],
+              concurrency: int=CONCURRENCY, token_budget: int=TOKEN_BUDGET,
+              on_result: Callable[[str, LLMResponse], None]=None,
+              candidates: Optional[int]=None) -> FanoutResult:
+    """
+    Asks a question of every file concurrently, then combines the answers.
+
+    Files are started in order, at most `concurrency` at a time, until the
+    answers received so far used `token_budget` tokens; files that are
+    already running are finished, so the budget can be overshot by up to
+    `concurrency` files. Files that vanished or turned out to be
+    binary are skipped, and other failures, such as API errors, are recorded
+    without losing the answers of the other files.
+
+    Args:
+        question (str): The question to ask.
+        files (List[str]): The files to analyze, most relevant first.
+        ask (Callable[[str], LLMResponse]): Answers the question about a single file.
+        concurrency (int, optional): The most files analyzed at once.
+        token_budget (int, optional): No file is started once this many tokens were used.
+            Files already running are finished and may use more.
+        on_result (Callable[[str, LLMResponse], None], optional): Called with every
+            file's answer as soon as it is received.
+        candidates (int, optional): The number of candidate files `files` was taken from.
+
+    Returns:
+        A `FanoutResult`.
+    """
+    answers: Dict[str, LLMResponse] = {}
+    failed: Dict[str, str] = {}
+    analyzed = []
+    used = 0
+    started = 0
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        running = {}
+        while True:
+            while len(running) < concurrency and started < len(files):
+                if used >= token_budget:
+                    exhausted = True
+                    break
+                running[pool.submit(ask, files[started])] = files[started]
+                started += 1
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                try:
+                    response = future.result()
+                except (FileNotFoundError, ValueError):
+                    continue
+                except Exception as e:
+                    failed[path] = f"{type(e).__name__}: {e}"
+                    continue
+                answers[path] = response
+                analyzed.append(path)
+                used += response.input_tokens + response.output_tokens
+                if on_result is not None:
+                    on_result(path, response)
+
+    sources = {p: answers[p].output for p in files if p in answers}
+    input_tokens = sum(r.input_tokens for r in answers.values())
+    output_tokens = sum(r.output_tokens for r in answers.values())
+    if len(sources) > 1:
+        merged = text_qa_merge(question, sources)
+        output = merged.output
+        input_tokens += merged.input_tokens
+        output_tokens += merged.output_tokens
+    elif sources:
+        output = next(iter(sources.values()))
+    else:
+        output = "No files relevant to the question were found."
+    response = LLMResponse(output=output,
+                           model=LLM_MODEL,
+                           input_tokens=input_tokens,
+                           output_tokens=output_tokens,
+                           sources=sources,
+                           skipped_chunks=sum(r.skipped_chunks for r in answers.values()))
+    return FanoutResult(response=response,
+                        candidates=len(files) if candidates is None else candidates,
+                        analyzed=analyzed,
+                        budget_exhausted=exhausted,
+                        failed=failed)
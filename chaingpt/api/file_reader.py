@@ -0,0 +1,192 @@
+"""
+Bounded-memory reading of repository files.
+
+Files are memory-mapped and decoded block by block with an encoding
+sniffed from their first block, and are cut into chunks lazily, so
+analyzing a file holds at most about a chunk of it in memory no matter
+how large it is. Binary files are detected from their first block before
+anything else is read.
+"""
+
+
+# Standard lib
+from typing import Iterator, Optional
+import os
+import mmap
+import codecs
+import hashlib
+
+# Local
+from chaingpt.api.tokens import split_tokens, DEFAULT_MODEL
+
+
+# Files with a NUL byte in their first block are treated as binary
+BINARY_SNIFF_SZ = 8000
+# Bytes decoded at a time
+BLOCK_SZ = 64 * 1024
+
+# UTF-32 first: its little-endian BOM starts with the UTF-16 one
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+# Chunks are cut at the last of these in their second half
+_SEPARATORS = ("\n\n", "\n", " ")
+
+
+def sniff_encoding(head: bytes, final: bool=True) -> str:
+    """
+    Guesses the encoding of a file from its first bytes: a byte order mark
+    if there is one, else UTF-8 if the bytes decode as UTF-8, else Latin-1,
+    which decodes any bytes. Pass `final=False` if `head` is only the
+    beginning of the file, which may end in the middle of a character.
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=final)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def is_binary(head: bytes, encoding: str) -> bool:
+    """
+    Returns `True` if the first bytes of a file look binary. NUL bytes are
+    expected in UTF-16 and UTF-32 text.
+    """
+    if encoding.startswith(("utf-16", "utf-32")):
+        return False
+    return b"\0" in head
+
+
+def _split_point(text: str, chunk_size: int) -> int:
+    for separator in _SEPARATORS:
+        i = text.rfind(separator, chunk_size // 2, chunk_size)
+        if i != -1:
+            return i + len(separator)
+    return chunk_size
+
+
+class FileReader:
+    """
+    Reads a text file through a memory map.
+
+    path (str): The file to read.
+    max_chars (int, optional): Stop reading after this many characters. Files
+        with more characters are reported as `truncated`.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    def __init__(self, path: str, max_chars: int=None):
+        self.path = path
+        self.max_chars = max_chars
+        self.size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(BINARY_SNIFF_SZ)
+        self.encoding = sniff_encoding(head, final=len(head) >= self.size)
+        self.binary = is_binary(head, self.encoding)
+        self._truncated: Optional[bool] = None
+        self._blob_sha: Optional[str] = None
+
+    def _blocks(self) -> Iterator[bytes]:
+        if self.size == 0:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            for start in range(0, len(m), BLOCK_SZ):
+                yield m[start:start + BLOCK_SZ]
+
+    def _decoded(self) -> Iterator[str]:
+        """
+        Yields the decoded text block by block, up to `max_chars` characters.
+        Undecodable bytes are replaced.
+        """
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        remaining = self.max_chars
+
+        def pieces():
+            for block in self._blocks():
+                yield decoder.decode(block)
+            yield decoder.decode(b"", final=True)
+
+        for text in pieces():
+            if remaining is not None:
+                if len(text) > remaining:
+                    if remaining:
+                        yield text[:remaining]
+                    self._truncated = True
+                    return
+                remaining -= len(text)
+            if text:
+                yield text
+        self._truncated = False
+
+    @property
+    def truncated(self) -> bool:
+        """
+        Whether the file has more than `max_chars` characters.
+        """
+        if self._truncated is None:
+            for _ in self._decoded():
+                pass
+        return self._truncated
+
+    def read(self) -> str:
+        """
+        Returns the text of the file, up to `max_chars` characters.
+        """
+        return "".join(self._decoded())
+
+    def chunks(self, chunk_size: int, chunk_overlap: int=0) -> Iterator[str]:
+        """
+        Lazily splits the text of the file, up to `max_chars` characters, into
+        chunks of at most `chunk_size` characters. Chunks end at a paragraph,
+        line or word boundary where possible, and consecutive chunks share up
+        to `chunk_overlap` characters. Whitespace-only chunks are skipped.
+
+        Raises:
+            ValueError: If `chunk_overlap` is not less than half of `chunk_size`.
+        """
+        if not 0 <= chunk_overlap < chunk_size // 2:
+            raise ValueError("`chunk_overlap` must be less than half of `chunk_size`")
+        buffer = ""
+        for text in self._decoded():
+            buffer += text
+            while len(buffer) > chunk_size:
+                cut = _split_point(buffer, chunk_size)
+                chunk = buffer[:cut]
+                if chunk.strip():
+                    yield chunk
+                start = cut - chunk_overlap
+                newline = buffer.find("\n", start, cut)
+                buffer = buffer[newline + 1 if newline != -1 else start:]
+        if buffer.strip():
+            yield buffer
+
+    def token_chunks(self, max_tokens: int, overlap_tokens: int=0, model: str=DEFAULT_MODEL) -> Iterator[str]:
+        """
+        Lazily splits the text of the file, up to `max_chars` characters, into
+        chunks of at most `max_tokens` tokens of `model` that end between
+        blocks of code where possible (see `tokens.split_tokens`).
+
+        Raises:
+            ValueError: If `overlap_tokens` is not less than half of `max_tokens`.
+        """
+        return split_tokens(self._decoded(), max_tokens, overlap_tokens, model=model)
+
+    def blob_sha(self) -> str:
+        """
+        Returns the git blob SHA of the whole file. It is computed once.
+        """
+        if self._blob_sha is None:
+            sha = hashlib.sha1(b"blob %d\0" % self.size)
+            for block in self._blocks():
+                sha.update(block)
+            self._blob_sha = sha.hexdigest()
+        return self._blob_sha
@@ -0,0 +1,280 @@
+"""
+Content search over a workspace backed by a trigram index.
+
+Every text file is indexed by the set of (lowercased) three-character
+substrings it contains. A regular expression is searched by first
+extracting the literal strings any match must contain, intersecting the
+posting lists of their trigrams to find candidate files, and only then
+running the regular expression over the candidates, as codesearch does.
+"""
+
+
+# Standard lib
+from typing import Dict, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass
+from array import array
+import os
+import re
+import threading
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# Local
+from chaingpt.api.path_index import PathIndex, glob_to_regex
+
+
+NGRAM_SIZE = 3
+# Files larger than this are not indexed or searched
+MAX_FILE_SZ = 1024 * 1024
+# Files with a NUL byte in their first block are treated as binary
+BINARY_SNIFF_SZ = 8000
+MAX_SNIPPET_SZ = 200
+
+_REPEATS = tuple(op for op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+                               getattr(sre_parse, "POSSESSIVE_REPEAT", None)) if op is not None)
+
+# A query is `None` (any file may match), a literal string, or an
+# ("and" | "or", [queries]) tuple
+Query = Union[None, str, Tuple[str, list]]
+
+
+@dataclass(frozen=True)
+class GrepMatch:
+    """
+    A line matching a content search.
+
+    path (str): The file path, relative to the top-level of the repository.
+    line_number (int): The 1-based line number.
+    line (str): The matching line, truncated to `MAX_SNIPPET_SZ` characters.
+    """
+    path: str
+    line_number: int
+    line: str
+
+
+def _sequence_query(items) -> Query:
+    clauses = []
+    run = ""
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run += chr(av)
+            continue
+        if op is sre_parse.AT:
+            # Anchors do not consume characters
+            continue
+        if len(run) >= NGRAM_SIZE:
+            clauses.append(run.lower())
+        run = ""
+
+        query = None
+        if op is sre_parse.SUBPATTERN:
+            query = _sequence_query(av[-1])
+        elif op is sre_parse.BRANCH:
+            branches = [_sequence_query(b) for b in av[1]]
+            if all(b is not None for b in branches):
+                query = ("or", branches)
+        elif op in _REPEATS and av[0] >= 1:
+            query = _sequence_query(av[2])
+        if query is not None:
+            clauses.append(query)
+
+    if len(run) >= NGRAM_SIZE:
+        clauses.append(run.lower())
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else ("and", clauses)
+
+
+def literal_query(pattern: str) -> Query:
+    """
+    Extracts the literal strings any match of the regular expression
+    `pattern` must contain, e.g. `("and", ["open", ("or", ["read", "write"])])`
+    for `open\\((read|write)`. Returns `None` if no literal of at least
+    `NGRAM_SIZE` characters is required.
+
+    Raises:
+        ValueError: If `pattern` is not a valid regular expression.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression: {e}")
+    return _sequence_query(list(parsed))
+
+
+def _is_binary(data: bytes) -> bool:
+    return b"\0" in data[:BINARY_SNIFF_SZ]
+
+
+class GrepIndex:
+    """
+    A trigram index over the text files of a `PathIndex`. The index is
+    rebuilt whenever the path index changes.
+    """
+    def __init__(self, paths: PathIndex, max_file_sz: int=MAX_FILE_SZ):
+        self.root = paths.root
+        self.max_file_sz = max_file_sz
+        self._paths = paths
+        self._lock = threading.Lock()
+        self._files: List[str] = []
+        self._postings = {}
+        self._generation = None
+
+    def _read(self, path: str) -> Optional[str]:
+        """
+        Returns the contents of a text file, or `None` for binary, oversized
+        or missing files.
+        """
+        full_path = os.path.join(self.root, path)
+        try:
+            if os.path.getsize(full_path) > self.max_file_sz:
+                return None
+            with open(full_path, "rb") as f:
+                data = f.read()
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            return None
+        if _is_binary(data):
+            return None
+        return data.decode("utf-8", errors="replace")
+
+    def refresh(self):
+        """
+        Builds the index if it does not reflect the current working copy.
+        """
+        self._paths.refresh()
+        with self._lock:
+            if self._generation == self._paths.generation:
+                return
+            generation = self._paths.generation
+            files = []
+            postings = {}
+            for path in self._paths.files():
+                text = self._read(path)
+                if text is None:
+                    continue
+                file_id = len(files)
+                files.append(path)
+                text = text.lower()
+                for ngram in {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}:
+                    posting = postings.get(ngram)
+                    if posting is None:
+                        posting = postings[ngram] = array("I")
+                    posting.append(file_id)
+            self._files = files
+            self._postings = postings
+            self._generation = generation
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def _literal_candidates(self, literal: str) -> Set[int]:
+        postings = []
+        for i in range(len(literal) - NGRAM_SIZE + 1):
+            posting = self._postings.get(literal[i:i + NGRAM_SIZE])
+            if posting is None:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return candidates
+
+    def _candidates(self, query: Query) -> Optional[Set[int]]:
+        """
+        Returns the ids of the files that may match `query`, or `None` for every file.
+        """
+        if query is None:
+            return None
+        if isinstance(query, str):
+            return self._literal_candidates(query)
+        kind, clauses = query
+        if kind == "or":
+            candidates = set()
+            for clause in clauses:
+                matches = self._candidates(clause)
+                if matches is None:
+                    return None
+                candidates |= matches
+            return candidates
+        candidates = None
+        for clause in clauses:
+            matches = self._candidates(clause)
+            if matches is None:
+                continue
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                break
+        return candidates
+
+    def term_counts(self, terms: List[str], path_glob: str=None) -> Dict[str, int]:
+        """
+        Counts how many of `terms` every indexed file may contain, judging by
+        its trigrams alone, so no file is read. Matching is case-insensitive
+        and terms shorter than a trigram are ignored.
+
+        Args:
+            terms (List[str]): The terms to look for.
+            path_glob (str, optional): Only count files matching this glob pattern.
+
+        Returns:
+            The number of terms found, by path. Files without any are left out.
+        """
+        path_regex = glob_to_regex(path_glob) if path_glob else None
+        self.refresh()
+        counts = {}
+        with self._lock:
+            for term in {t.lower() for t in terms if len(t) >= NGRAM_SIZE}:
+                for file_id in self._literal_candidates(term):
+                    counts[file_id] = counts.get(file_id, 0) + 1
+            files = self._files
+        return {files[i]: n for i, n in counts.items()
+                if path_regex is None or path_regex.fullmatch(files[i])}
+
+    def grep(self, pattern: str, path_glob: str=None, max_results: int=100) -> List[GrepMatch]:
+        """
+        Searches the indexed files for lines matching a regular expression.
+
+        Args:
+            pattern (str): A Python regular expression.
+            path_glob (str, optional): Only search files matching this glob pattern.
+            max_results (int, optional): The maximum number of lines to return.
+
+        Returns:
+            A `List` of `GrepMatch` objects ordered by path and line number.
+
+        Raises:
+            ValueError: If `pattern` is not a valid regular expression.
+        """
+        try:
+            regex = re.compile(pattern, re.MULTILINE)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+        query = literal_query(pattern)
+        path_regex = glob_to_regex(path_glob) if path_glob else None
+
+        self.refresh()
+        with self._lock:
+            files = self._files
+            candidates = self._candidates(query)
+        file_ids = range(len(files)) if candidates is None else sorted(candidates)
+
+        matches = []
+        for file_id in file_ids:
+            path = files[file_id]
+            if path_regex is not None and not path_regex.fullmatch(path):
+                continue
+            text = self._read(path)
+            if text is None or not regex.search(text):
+                continue
+            for line_number, line in enumerate(text.splitlines(), 1):
+                if regex.search(line):
+                    matches.append(GrepMatch(path, line_number, line.strip()[:MAX_SNIPPET_SZ]))
+                    if len(matches) >= max_results:
+                        return matches
+        return matches
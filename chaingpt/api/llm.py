@@ -1,22 +1,45 @@
 # Standard lib
+from typing import List, Tuple, Union, Iterable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 from operator import itemgetter
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import threading
+import itertools
 
 # 3rd party
 from tqdm import tqdm
 import openai
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_core.caches import BaseCache
 from langchain_community.callbacks import get_openai_callback
 
 # Local
+from chaingpt.api.retrieval import ChunkPrefilter, PREFILTER
+from chaingpt.api.tokens import count_tokens, split_tokens, chunk_budget
 from chaingpt.utils import config
 
 
 openai.api_key = config.config["secrets"]["openai_api_key"]
 LLM_MODEL = config.config["llm"]["file_qa_model"]
+# Bump when a prompt changes so cached answers from older prompts are not reused
+PROMPT_VERSION = 1
+MAP_REDUCE_CONFIG = config.config["llm"]["map_reduce"]
+# "tree" takes notes from every chunk concurrently and merges them in a tree;
+# "refine" updates a single running summary chunk by chunk
+MAP_REDUCE_MODES = ("tree", "refine")
+MAP_REDUCE_MODE = MAP_REDUCE_CONFIG.get("mode", "tree")
+# LLM calls made at once
+MAP_REDUCE_CONCURRENCY = MAP_REDUCE_CONFIG.get("max_concurrency", 8)
+# Notes merged per LLM call
+MAP_REDUCE_FAN_IN = MAP_REDUCE_CONFIG.get("fan_in", 8)
+# LLM requests in flight at once across the process, however calls are nested
+MAX_CONCURRENT_CALLS = config.config["llm"].get("max_concurrent_calls", 8)
+MULTI_FILE_CONFIG = config.config["llm"].get("multi_file") or {}
+# Files answered from in a single prompt
+MAX_FILES_PER_PROMPT = MULTI_FILE_CONFIG.get("max_files_per_prompt", 20)
 
 
 # Used to summarize of file chunk
@@ -54,7 +77,30 @@ read_summary_prompt = """
     </summary>
     """
 
-llm = ChatOpenAI(model=LLM_MODEL, temperature=0)
+_call_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CALLS)
+
+
+class _BoundedChatOpenAI(ChatOpenAI):
+    """
+    A `ChatOpenAI` that takes one of `MAX_CONCURRENT_CALLS` slots shared by the
+    whole process for every request, so concurrent files, chunks and merges
+    cannot multiply the load on the API. Cached completions need no slot.
+    """
+    def _generate(self, *args, **kwargs):
+        with _call_slots:
+            return super()._generate(*args, **kwargs)
+
+
+llm = _BoundedChatOpenAI(model=LLM_MODEL, temperature=0)
+
+
+def use_response_cache(cache: Optional[BaseCache]):
+    """
+    Makes every chain of this module answer repeated prompts from `cache`.
+    `None` stops caching.
+    """
+    llm.cache = cache
+
 
 summarize_chunk_chain = ({
     "file_path": itemgetter("file_path"),
@@ -85,50 +131,112 @@ class LLMResponse():
     model (str): The model used.
     input_tokens (str): The number of input tokens sent.
     output_tokens (str): The number of output token generated.
+    cached (bool): Whether the response was served from a cache without calling the LLM.
+    truncated (bool): Whether only the beginning of the analyzed file was used.
+    sources (Dict[str, str]): What every analyzed file says about the question, by path,
+        when several files were analyzed. Files without relevant information map to `NOT_RELEVANT`.
+    skipped_chunks (int): The chunks dropped by the prefilter without an LLM call, summed over
+        the analyzed files.
     """
     output: str
     model: str
     input_tokens: int
     output_tokens: int
+    cached: bool = False
+    truncated: bool = False
+    sources: Dict[str, str] = field(default_factory=dict)
+    skipped_chunks: int = 0
+
+
+# The default of `prefilter` arguments: `PREFILTER`, looked up when called.
+# Passing `None` instead disables prefiltering.
+_CONFIGURED_PREFILTER = object()
+
+
+def split_text(text: str, chunk_size: int=None, chunk_overlap: int=200) -> List[str]:
+    """
+    Splits `text` into the chunks analyzed by `text_qa_map_reduce`. Sizes are
+    in tokens; chunks fill the context of `LLM_MODEL` by default.
+    """
+    return list(split_tokens([text], chunk_size or chunk_budget(LLM_MODEL), chunk_overlap, model=LLM_MODEL))
 
 
-def text_qa_map_reduce(question: str, text: str,
+def text_qa_map_reduce(question: str, text: Union[str, Iterable[str]],
                        file_path: str="unknown",
-                       chunk_size: int=10000,
-                       chunk_overlap: int=500) -> LLMResponse:
+                       chunk_size: int=None,
+                       chunk_overlap: int=200,
+                       mode: str=MAP_REDUCE_MODE,
+                       max_concurrency: int=MAP_REDUCE_CONCURRENCY,
+                       fan_in: int=MAP_REDUCE_FAN_IN,
+                       prefilter: Optional[ChunkPrefilter]=_CONFIGURED_PREFILTER) -> LLMResponse:
     """
     Uses an LLM to analyze a body of text according to a question. Text
-    is split into chunks and analyzed using in-place map reduce.
+    is split into chunks and analyzed with one of two methods:
+
+    - `tree`: notes relevant to the question are taken from every chunk
+      concurrently, then merged `fan_in` at a time, a level of the tree at
+      a time (see `reduce_notes`). Latency grows with the log of the
+      number of chunks.
+    - `refine`: a running summary is updated with every chunk in turn.
+      Latency grows with the number of chunks.
 
     Args:
         question (str): The question to ask.
-        text (str): The text to analyze.
+        text (Union[str, Iterable[str]]): The text to analyze, or its chunks. In
+            `refine` mode chunks are consumed one at a time, so they can be read lazily.
         file_path (str, optional): The file path that the text originates from. Provides the LLM with additional context.
-        chunk_size (int, optional): The chunk size to use when splitting the text.
-        chunk_overlap (int, optional): The size of the overlap between chunks.
+        chunk_size (int, optional): The tokens per chunk when splitting the text. Defaults
+            to as many as fit in the context of `LLM_MODEL`.
+        chunk_overlap (int, optional): The tokens shared by consecutive chunks.
+        mode (str, optional): `tree` or `refine`.
+        max_concurrency (int, optional): The maximum number of concurrent LLM calls in `tree` mode.
+        fan_in (int, optional): The number of notes merged per LLM call in `tree` mode.
+        prefilter (ChunkPrefilter, optional): Drops the chunks irrelevant to the question
+            before they are analyzed. Defaults to `PREFILTER`, from `llm.prefilter` in the config;
+            `None` analyzes every chunk.
     
     Returns:
-        An `LLMResponse` object containing the response from the LLM.
+        An `LLMResponse` object containing the response from the LLM. It reports the
+        chunks dropped by the prefilter as `skipped_chunks`.
     
     Raises:
-        ValueError: If the `chunk_size` is not smaller than the length of `text`.
+        ValueError: If `text` is a string of no more than `chunk_size` tokens, or `mode` is unknown.
     """
-    if len(text) <= chunk_size:
-        raise ValueError(f"The length of `text` must be greater than `chunk_size`. {len(text)} is not > {chunk_size}")
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size,
-                                              chunk_overlap=chunk_overlap)
-    docs = splitter.split_text(text)
+    if mode not in MAP_REDUCE_MODES:
+        raise ValueError(f"`mode` must be one of {', '.join(MAP_REDUCE_MODES)}")
+    if isinstance(text, str):
+        chunk_size = chunk_size or chunk_budget(LLM_MODEL)
+        size = count_tokens(text, LLM_MODEL)
+        if size <= chunk_size:
+            raise ValueError(f"The tokens of `text` must be more than `chunk_size`. {size} is not > {chunk_size}")
+        docs = split_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    else:
+        docs = text
+    if prefilter is _CONFIGURED_PREFILTER:
+        prefilter = PREFILTER
+    stats = None
+    if prefilter is not None:
+        docs, stats = prefilter.filter(question, docs)
     
     with get_openai_callback() as cb:
-        summary = "[No summary (This is the first chunk) - Replace me]"
-        for doc in tqdm(docs, desc="Processing large file in chunks"):
-            inputs = {
+        if mode == "tree":
+            notes = extract_notes_chain.batch([{
                 "file_path": file_path,
                 "question": question,
-                "chunk": doc,
-                "summary": summary
-            }
-            summary = summarize_chunk_chain.invoke(inputs)
+                "chunk": doc
+            } for doc in docs], config={"max_concurrency": max_concurrency})
+            summary = reduce_notes(question, notes, file_path=file_path, fan_in=fan_in,
+                                   max_concurrency=max_concurrency) or NO_INFORMATION
+        else:
+            summary = "[No summary (This is the first chunk) - Replace me]"
+            for doc in tqdm(docs, desc="Processing large file in chunks"):
+                inputs = {
+                    "file_path": file_path,
+                    "question": question,
+                    "chunk": doc,
+                    "summary": summary
+                }
+                summary = summarize_chunk_chain.invoke(inputs)
     
         output = read_summary_chain.invoke({
             "file_path": file_path,
@@ -139,14 +247,223 @@ def text_qa_map_reduce(question: str, text: str,
         return LLMResponse(output=output,
                            model=LLM_MODEL,
                            input_tokens=cb.prompt_tokens,
-                           output_tokens=cb.completion_tokens)
+                           output_tokens=cb.completion_tokens,
+                           skipped_chunks=stats.skipped if stats else 0)
 
 
-"""
-TODO:The following prompts and chains are akin to the above but simply stuff the entire
-file into the prompt (no chunking). These prompts and chains need to be wrapped under one object
-and support one OR many chunks so we don't have to manage two implementations.
+# Used to extract the notes relevant to a question from a part of a very large file
+extract_notes_prompt = """
+    You are scanning a very large file from a GitHub repository located at the path {file_path}
+    part by part in order to answer the question '{question}'. Extract from the part below only
+    the information relevant to the question, as concise notes that keep exact names, values and
+    line contents where they matter. If the part contains no relevant information, respond with
+    only NONE.
+
+    <part>
+    {chunk}
+    </part>
+    """
+
+# Used to merge the notes extracted from consecutive parts of a file
+combine_notes_prompt = """
+    You are scanning a large file from a GitHub repository located at the path {file_path}
+    in order to answer the question '{question}'. Below are notes taken from consecutive parts
+    of the file, in file order. Combine them into a single set of concise notes relevant to
+    the question, removing duplicates but keeping exact names and values. Respond with only
+    the combined notes.
+
+    {notes}
+    """
+
+# Marks a part of a file without relevant information
+NO_NOTES = "NONE"
+# Stands in for the notes when no part of a file was relevant
+NO_INFORMATION = "[No relevant information was found]"
+
+extract_notes_chain = ({
+    "file_path": itemgetter("file_path"),
+    "question": itemgetter("question"),
+    "chunk": itemgetter("chunk")}
+    | PromptTemplate.from_template(extract_notes_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+combine_notes_chain = ({
+    "file_path": itemgetter("file_path"),
+    "question": itemgetter("question"),
+    "notes": lambda x: "\n\n".join(f"<notes>\n{n}\n</notes>" for n in x["notes"])}
+    | PromptTemplate.from_template(combine_notes_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+
+def _has_notes(notes: str) -> bool:
+    notes = notes.strip()
+    return bool(notes) and notes.upper() != NO_NOTES
+
+
+def reduce_notes(question: str, notes: List[str], file_path: str="unknown",
+                 fan_in: int=MAP_REDUCE_FAN_IN, max_concurrency: int=MAP_REDUCE_CONCURRENCY) -> str:
+    """
+    Uses an LLM to merge notes taken from consecutive parts of a file into
+    one. Notes are merged `fan_in` at a time, concurrently, until a single
+    note is left, so it takes about log(len(notes)) rounds of calls.
+
+    Args:
+        question (str): The question the notes are relevant to.
+        notes (List[str]): The notes, in file order. Notes marked `NO_NOTES` are dropped.
+        file_path (str, optional): The file path that the notes were taken from. Provides the LLM with additional context.
+        fan_in (int, optional): The number of notes merged per LLM call.
+        max_concurrency (int, optional): The maximum number of concurrent LLM calls.
+
+    Returns:
+        The merged notes, or an empty string if there are none.
+
+    Raises:
+        ValueError: If `fan_in` is less than 2.
+    """
+    if fan_in < 2:
+        raise ValueError("`fan_in` must be >= 2")
+    notes = [n.strip() for n in notes if _has_notes(n)]
+    while len(notes) > 1:
+        groups = [notes[i:i + fan_in] for i in range(0, len(notes), fan_in)]
+        merged = iter(combine_notes_chain.batch([{
+            "file_path": file_path,
+            "question": question,
+            "notes": g
+        } for g in groups if len(g) > 1], config={"max_concurrency": max_concurrency}))
+        notes = [next(merged).strip() if len(g) > 1 else g[0] for g in groups]
+    return notes[0] if notes else ""
+
+
+class NotesTree:
+    """
+    Merges notes in a tree of fan-in `fan_in` as they arrive: every
+    `fan_in` notes on a level are combined into one note on the level
+    above. At most `fan_in - 1` notes wait on each level, so no prompt
+    grows with the number of notes and memory grows only logarithmically.
+    """
+    def __init__(self, question: str, file_path: str, fan_in: int=8, max_concurrency: int=MAP_REDUCE_CONCURRENCY):
+        if fan_in < 2:
+            raise ValueError("`fan_in` must be >= 2")
+        self.question = question
+        self.file_path = file_path
+        self.fan_in = fan_in
+        self.max_concurrency = max_concurrency
+        self._levels: List[List[str]] = [[]]
+
+    def _combine(self, notes: List[str]) -> str:
+        return combine_notes_chain.invoke({
+            "file_path": self.file_path,
+            "question": self.question,
+            "notes": notes
+        }).strip()
+
+    def add(self, notes: str):
+        """
+        Adds the notes of the next part of the file. Notes marked `NO_NOTES`
+        are dropped.
+        """
+        if not _has_notes(notes):
+            return
+        notes = notes.strip()
+        level = 0
+        while True:
+            if level == len(self._levels):
+                self._levels.append([])
+            self._levels[level].append(notes)
+            if len(self._levels[level]) < self.fan_in:
+                return
+            notes = self._combine(self._levels[level])
+            self._levels[level] = []
+            level += 1
+
+    def result(self) -> str:
+        """
+        Combines the remaining notes into one, or returns an empty string if
+        there are none. Higher levels hold earlier parts of the file.
+        """
+        notes = [n for level in reversed(self._levels) for n in level]
+        return reduce_notes(self.question, notes, file_path=self.file_path,
+                            fan_in=self.fan_in, max_concurrency=self.max_concurrency)
+
+
+def text_qa_tree(question: str, chunks: Iterable[str],
+                 file_path: str="unknown",
+                 fan_in: int=8,
+                 token_budget: int=None,
+                 max_concurrency: int=MAP_REDUCE_CONCURRENCY,
+                 prefilter: Optional[ChunkPrefilter]=_CONFIGURED_PREFILTER) -> LLMResponse:
+    """
+    Uses an LLM to answer a question about a file of any size. The notes
+    relevant to the question are extracted from every chunk and merged in
+    a tree (see `NotesTree`), so no single prompt grows with the size of
+    the file.
 
+    Args:
+        question (str): The question to ask.
+        chunks (Iterable[str]): The chunks of the file, in order. At most
+            `max_concurrency` are read ahead, so they can be read lazily.
+        file_path (str, optional): The file path that the chunks originate from. Provides the LLM with additional context.
+        fan_in (int, optional): The number of notes merged by each call.
+        token_budget (int, optional): Stop reading chunks once about this many tokens
+            were used. The rest of the file is not analyzed.
+        max_concurrency (int, optional): The number of chunks analyzed at once.
+        prefilter (ChunkPrefilter, optional): Drops the chunks irrelevant to the question
+            before they are analyzed. Chunks it drops do not count against `token_budget`.
+            Defaults to `PREFILTER`, from `llm.prefilter` in the config; `None` analyzes every chunk.
+
+    Returns:
+        An `LLMResponse` object containing the response from the LLM. It is
+        `truncated` if the token budget ran out before the end of the file, and
+        reports the chunks dropped by the prefilter as `skipped_chunks`.
+    """
+    tree = NotesTree(question, file_path, fan_in=fan_in, max_concurrency=max_concurrency)
+    chunks = tqdm(chunks, desc="Processing large file in a tree")
+    if prefilter is _CONFIGURED_PREFILTER:
+        prefilter = PREFILTER
+    stats = None
+    if prefilter is not None:
+        chunks, stats = prefilter.filter(question, chunks)
+    chunks = iter(chunks)
+    truncated = False
+    with get_openai_callback() as cb:
+        while not truncated:
+            window = []
+            cost = cb.prompt_tokens + cb.completion_tokens
+            for chunk in chunks:
+                cost += count_tokens(chunk, LLM_MODEL)
+                if token_budget is not None and cost > token_budget:
+                    truncated = True
+                    break
+                window.append(chunk)
+                if len(window) == max_concurrency:
+                    break
+            if not window:
+                break
+            for notes in extract_notes_chain.batch([{
+                "file_path": file_path,
+                "question": question,
+                "chunk": chunk
+            } for chunk in window], config={"max_concurrency": max_concurrency}):
+                tree.add(notes)
+
+        output = read_summary_chain.invoke({
+            "file_path": file_path,
+            "question": question,
+            "summary": tree.result() or NO_INFORMATION
+        })
+
+        return LLMResponse(output=output,
+                           model=LLM_MODEL,
+                           input_tokens=cb.prompt_tokens,
+                           output_tokens=cb.completion_tokens,
+                           truncated=truncated,
+                           skipped_chunks=stats.skipped if stats else 0)
+
+"""
 TODO: Consider returning LangChain objects instead of LLMResponse
 """
 
@@ -188,7 +505,7 @@ def text_qa(question: str, text: str,
     inputs = {
         "file_path": file_path,
         "question": question,
-        "content": text
+        "content": [text]
     }
 
     with get_openai_callback() as cb:
@@ -197,3 +514,464 @@ def text_qa(question: str, text: str,
                            model=LLM_MODEL,
                            input_tokens=cb.prompt_tokens,
                            output_tokens=cb.completion_tokens)
+
+
+
+# Marks a file without information relevant to the question
+NOT_RELEVANT = "NOT RELEVANT"
+
+
+# Used to answer a question from several whole files at once
+multi_qa_prompt = """
+    You are scanning files from a GitHub repository to answer the question '{question}'.
+    Use only the files below.
+
+    {files}
+
+    First, for every file, write a line `FILE: <path>` followed by what the file says about the
+    question, or `NOT RELEVANT` if it says nothing about it. Then write a line `ANSWER:` followed
+    by the answer to the question, naming the files it comes from. If the files do not contain
+    enough information, say so.
+    """
+
+
+multi_qa_chain = ({
+    "question": itemgetter("question"),
+    "files": lambda x: "\n\n".join(_render_file(p, t) for p, t in x["files"])}
+    | PromptTemplate.from_template(multi_qa_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+
+# Used to answer a question from what several files say about it
+merge_answers_prompt = """
+    You are answering the question '{question}' about a GitHub repository. Its files were
+    analyzed separately, and what each of them says about the question is given below.
+    Combine this into a single answer, naming the files it comes from. Ignore files that
+    say nothing about the question. If there is not enough information, say so.
+
+    {sources}
+    """
+
+
+merge_answers_chain = ({
+    "question": itemgetter("question"),
+    "sources": lambda x: "\n\n".join(f"{p}:\n{n}" for p, n in x["sources"].items())}
+    | PromptTemplate.from_template(merge_answers_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+
+def text_qa_merge(question: str, sources: Dict[str, str]) -> LLMResponse:
+    """
+    Uses an LLM to combine what several files say about a question into one answer.
+
+    Args:
+        question (str): The question to answer.
+        sources (Dict[str, str]): What every file says about the question, by path.
+
+    Returns:
+        An `LLMResponse` object containing the answer.
+    """
+    with get_openai_callback() as cb:
+        output = merge_answers_chain.invoke({"question": question, "sources": sources})
+        return LLMResponse(output=output,
+                           model=LLM_MODEL,
+                           input_tokens=cb.prompt_tokens,
+                           output_tokens=cb.completion_tokens,
+                           sources=dict(sources))
+
+
+def _render_file(path: str, text: str) -> str:
+    return f"<file path=\"{path}\">\n{text}\n</file>"
+
+
+def _parse_multi_answer(output: str, paths: List[str]) -> Tuple[str, Dict[str, str]]:
+    """
+    Splits the output of `multi_qa_chain` into the answer and what every file
+    says. Files the output does not mention are `NOT_RELEVANT`; output without
+    an `ANSWER:` line is the answer as a whole.
+    """
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in output.splitlines():
+        label = line.strip().strip("*#").strip()
+        if label.upper().startswith("FILE:"):
+            current = label[5:].strip().strip("`*").strip()
+            sections[current] = []
+        elif label.upper().startswith("ANSWER:"):
+            current = None
+            sections[None] = [label[7:].strip()]
+        elif current in sections or (current is None and None in sections):
+            sections[current].append(line)
+    answer = "\n".join(sections[None]).strip() if None in sections else output.strip()
+    sources = {}
+    for path in paths:
+        notes = "\n".join(sections.get(path, [])).strip()
+        sources[path] = notes if notes and NOT_RELEVANT not in notes.upper() else NOT_RELEVANT
+    return answer, sources
+
+
+class QAEngine:
+    """
+    Answers a question about one or many files. Files are packed whole into as
+    few prompts as the token budget allows (first-fit decreasing), and only
+    files too large for a prompt of their own are analyzed in chunks (see
+    `answer_chunks`). Prompts run concurrently; when there is more than
+    one, what they found is merged into a single answer by one more call.
+
+    max_tokens (int, optional): The tokens of file text per prompt. Defaults to
+        as many as fit in the context of `LLM_MODEL`.
+    chunk_overlap (int, optional): The tokens shared by consecutive chunks of large files.
+    max_files (int, optional): The most files per prompt.
+    max_concurrency (int, optional): The most LLM calls made at once.
+    """
+    def __init__(self, max_tokens: int=None, chunk_overlap: int=200,
+                 max_files: int=MAX_FILES_PER_PROMPT, max_concurrency: int=MAP_REDUCE_CONCURRENCY):
+        self.max_tokens = max_tokens or chunk_budget(LLM_MODEL)
+        self.chunk_overlap = chunk_overlap
+        self.max_files = max_files
+        self.max_concurrency = max_concurrency
+
+    def pack(self, files: List[Tuple[str, str]]) -> Tuple[List[List[int]], List[int]]:
+        """
+        Groups files into prompts.
+
+        Args:
+            files (List[Tuple[str, str]]): `(path, text)` pairs.
+
+        Returns:
+            A Tuple of the prompts, each a list of indices into `files` in order,
+            and the indices of the files too large for a prompt of their own.
+        """
+        sizes = [count_tokens(_render_file(p, t), LLM_MODEL) for p, t in files]
+        oversized = [i for i, size in enumerate(sizes) if size > self.max_tokens]
+        bins: List[List[int]] = []
+        loads: List[int] = []
+        for i in sorted(set(range(len(files))) - set(oversized), key=lambda i: (-sizes[i], i)):
+            for b, load in enumerate(loads):
+                if load + sizes[i] <= self.max_tokens and len(bins[b]) < self.max_files:
+                    bins[b].append(i)
+                    loads[b] += sizes[i]
+                    break
+            else:
+                bins.append([i])
+                loads.append(sizes[i])
+        return [sorted(b) for b in bins], oversized
+
+    def _ask(self, question: str, files: List[Tuple[str, str]]) -> Tuple[str, Dict[str, str]]:
+        if len(files) == 1:
+            path, text = files[0]
+            output = qa_chain.invoke({"file_path": path, "question": question, "content": [text]})
+            return output, {path: output}
+        output = multi_qa_chain.invoke({"question": question, "files": files})
+        return _parse_multi_answer(output, [p for p, _ in files])
+
+    def answer_chunks(self, question: str, file_path: str, chunks: Iterable[str],
+                      prefilter: Optional[ChunkPrefilter]=_CONFIGURED_PREFILTER) -> LLMResponse:
+        """
+        Uses an LLM to answer a question about one file already split into chunks.
+        A file of one chunk is answered in a single call, and a file of many via
+        map-reduce (see `text_qa_map_reduce`). Chunks are consumed lazily.
+
+        Args:
+            question (str): The question to ask.
+            file_path (str): The file the chunks originate from.
+            chunks (Iterable[str]): The chunks of the file, in order.
+            prefilter (ChunkPrefilter, optional): Passed to `text_qa_map_reduce`.
+
+        Returns:
+            An `LLMResponse` object containing the answer.
+        """
+        chunks = iter(chunks)
+        first = next(chunks, "")
+        second = next(chunks, None)
+        if second is None:
+            return text_qa(question, first, file_path=file_path)
+        return text_qa_map_reduce(question, itertools.chain([first, second], chunks),
+                                  file_path=file_path, max_concurrency=self.max_concurrency,
+                                  prefilter=prefilter)
+
+    def answer(self, question: str, files: Union[Tuple[str, str], List[Tuple[str, str]]]) -> LLMResponse:
+        """
+        Uses an LLM to answer a question about one or many files.
+
+        Args:
+            question (str): The question to ask.
+            files (Union[Tuple[str, str], List[Tuple[str, str]]]): A `(path, text)` pair, or a list of them.
+
+        Returns:
+            An `LLMResponse` object containing the answer, with what every file says about
+            the question in `sources`.
+
+        Raises:
+            ValueError: If `files` is empty.
+        """
+        if isinstance(files, tuple):
+            files = [files]
+        if not files:
+            raise ValueError("`files` must not be empty")
+        bins, oversized = self.pack(files)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(len(oversized), self.max_concurrency))) as pool:
+            large = [pool.submit(self.answer_chunks, question, files[i][0],
+                                 split_text(files[i][1], chunk_size=self.max_tokens, chunk_overlap=self.chunk_overlap))
+                     for i in oversized]
+            with get_openai_callback() as cb:
+                asked = RunnableLambda(lambda b: self._ask(question, [files[i] for i in b])).batch(
+                    bins, config={"max_concurrency": self.max_concurrency}) if bins else []
+            large = [f.result() for f in large]
+
+        answers = [a for a, _ in asked] + [r.output for r in large]
+        found = {}
+        for _, sources in asked:
+            found.update(sources)
+        found.update({files[i][0]: r.output for i, r in zip(oversized, large)})
+        sources = {p: found[p] for p, _ in files}
+        relevant = {p: n for p, n in sources.items() if n != NOT_RELEVANT}
+        if len(answers) == 1:
+            merged = LLMResponse(output=answers[0], model=LLM_MODEL, input_tokens=0, output_tokens=0)
+        elif not relevant:
+            merged = LLMResponse(output="There is not enough information in the files to provide an answer.",
+                                 model=LLM_MODEL, input_tokens=0, output_tokens=0)
+        else:
+            merged = text_qa_merge(question, relevant)
+
+        return LLMResponse(output=merged.output,
+                           model=LLM_MODEL,
+                           input_tokens=cb.prompt_tokens + merged.input_tokens + sum(r.input_tokens for r in large),
+                           output_tokens=cb.completion_tokens + merged.output_tokens + sum(r.output_tokens for r in large),
+                           sources=sources,
+                           skipped_chunks=sum(r.skipped_chunks for r in large))
+
+
+# Used to answer a question from the chunks of a large file most relevant to it
+excerpts_qa_prompt = """
+    You are scanning the contents of a large file from a GitHub repository located at
+    the path {file_path}. You are trying to answer the question '{question}'. The excerpts of
+    the file most relevant to the question are given below, in the order they appear in the file.
+    Use only these excerpts. If they do not contain any information relevant to the question,
+    reply that there is not enough information in the file to provide an answer.
+
+    {excerpts}
+    """
+
+
+excerpts_qa_chain = ({
+    "file_path": itemgetter("file_path"),
+    "question": itemgetter("question"),
+    "excerpts": lambda x: "\n\n".join(f"<excerpt>\n{e}\n</excerpt>" for e in x["excerpts"])}
+    | PromptTemplate.from_template(excerpts_qa_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+
+def text_qa_excerpts(question: str, excerpts: List[str],
+                     file_path: str="unknown") -> LLMResponse:
+    """
+    Uses an LLM to answer a question from selected excerpts of a file
+    in a single call.
+
+    Args:
+        question (str): The question to ask.
+        excerpts (List[str]): The excerpts to analyze, in file order.
+        file_path (str, optional): The file path that the excerpts originate from. Provides the LLM with additional context.
+
+    Returns:
+        An `LLMResponse` object containing the response from the LLM.
+    """
+    inputs = {
+        "file_path": file_path,
+        "question": question,
+        "excerpts": excerpts
+    }
+
+    with get_openai_callback() as cb:
+        output = excerpts_qa_chain.invoke(inputs)
+        return LLMResponse(output=output,
+                           model=LLM_MODEL,
+                           input_tokens=cb.prompt_tokens,
+                           output_tokens=cb.completion_tokens)
+
+
+# Used to summarize a chunk of a large file independently of any question
+digest_chunk_prompt = """
+    You are building a reference digest of a large file from a GitHub repository located at
+    the path {file_path}. Summarize the chunk of the file provided below in a few sentences:
+    what it defines or configures, its notable functions, types and constants, and their behavior.
+    Be factual and concise. Respond with only the summary.
+
+    <chunk>
+    {chunk}
+    </chunk>
+    """
+
+# Used to describe a large file as a whole from the summaries of its chunks
+digest_file_prompt = """
+    You are building a reference digest of a large file from a GitHub repository located at
+    the path {file_path}. Summaries of each chunk of the file, in order, are given below.
+    Respond with only a JSON object with two keys: "purpose", one or two sentences describing
+    what the file is for, and "key_config", a list of short strings naming the configuration
+    keys, environment variables, flags and constants the file defines or reads, with their defaults.
+
+    <summaries>
+    {summaries}
+    </summaries>
+    """
+
+# Used to answer a question from a file's digest and its most relevant chunks
+digest_qa_prompt = """
+    You are answering the question '{question}' about a large file from a GitHub repository
+    located at the path {file_path}. A digest of the whole file is given below, followed by
+    the excerpts of the file most relevant to the question, if any. Prefer the excerpts for
+    details. If neither contains information relevant to the question, reply that there is
+    not enough information in the file to provide an answer.
+
+    <digest>
+    {digest}
+    </digest>
+
+    {excerpts}
+    """
+
+digest_chunk_chain = ({
+    "file_path": itemgetter("file_path"),
+    "chunk": itemgetter("chunk")}
+    | PromptTemplate.from_template(digest_chunk_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+digest_file_chain = ({
+    "file_path": itemgetter("file_path"),
+    "summaries": lambda x: "\n\n".join(x["summaries"])}
+    | PromptTemplate.from_template(digest_file_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+digest_qa_chain = ({
+    "file_path": itemgetter("file_path"),
+    "question": itemgetter("question"),
+    "digest": itemgetter("digest"),
+    "excerpts": lambda x: "\n\n".join(f"<excerpt>\n{e}\n</excerpt>" for e in x["excerpts"])}
+    | PromptTemplate.from_template(digest_qa_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+
+def summarize_file(chunks: List[str], file_path: str="unknown") -> Tuple[List[str], str, LLMResponse]:
+    """
+    Uses an LLM to build the question-independent parts of a file digest.
+    Chunks are summarized concurrently, then described as a whole.
+
+    Args:
+        chunks (List[str]): The chunks of the file, in order.
+        file_path (str, optional): The file path that the chunks originate from. Provides the LLM with additional context.
+
+    Returns:
+        A Tuple of the chunk summaries, the raw output describing the whole
+        file (expected to be JSON) and an `LLMResponse` accounting for the tokens used.
+    """
+    with get_openai_callback() as cb:
+        summaries = digest_chunk_chain.batch([{"file_path": file_path, "chunk": c} for c in chunks])
+        output = digest_file_chain.invoke({"file_path": file_path, "summaries": summaries})
+        return summaries, output, LLMResponse(output=output,
+                                              model=LLM_MODEL,
+                                              input_tokens=cb.prompt_tokens,
+                                              output_tokens=cb.completion_tokens)
+
+
+def text_qa_digest(question: str, digest: str, excerpts: List[str],
+                   file_path: str="unknown") -> LLMResponse:
+    """
+    Uses an LLM to answer a question from a file digest and selected excerpts
+    of the file in a single call.
+
+    Args:
+        question (str): The question to ask.
+        digest (str): The rendered file digest.
+        excerpts (List[str]): Relevant excerpts of the file, in file order. May be empty.
+        file_path (str, optional): The file path that the digest describes. Provides the LLM with additional context.
+
+    Returns:
+        An `LLMResponse` object containing the response from the LLM.
+    """
+    inputs = {
+        "file_path": file_path,
+        "question": question,
+        "digest": digest,
+        "excerpts": excerpts
+    }
+
+    with get_openai_callback() as cb:
+        output = digest_qa_chain.invoke(inputs)
+        return LLMResponse(output=output,
+                           model=LLM_MODEL,
+                           input_tokens=cb.prompt_tokens,
+                           output_tokens=cb.completion_tokens)
+
+
+# Used to summarize a directory from its key files and subdirectory summaries
+summarize_directory_prompt = """
+    You are building an overview of a GitHub repository, one directory at a time from the
+    deepest directories up. Describe in at most three sentences what the directory {dir_path}
+    contains and what it is for, naming its main components and entry points. Rely on the
+    key files and subdirectory summaries below. Respond with only the description.
+
+    <listing>
+    {listing}
+    </listing>
+
+    <key_files>
+    {files}
+    </key_files>
+
+    <subdirectories>
+    {children}
+    </subdirectories>
+    """
+
+summarize_directory_chain = ({
+    "dir_path": itemgetter("dir_path"),
+    "listing": itemgetter("listing"),
+    "files": lambda x: "\n\n".join(f"<file path=\"{p}\">\n{t}\n</file>" for p, t in x["files"]),
+    "children": lambda x: "\n".join(f"{p}/: {s}" for p, s in x["children"])}
+    | PromptTemplate.from_template(summarize_directory_prompt)
+    | llm
+    | StrOutputParser()
+)
+
+
+def summarize_directory(dir_path: str, listing: str, files: List[Tuple[str, str]],
+                        children: List[Tuple[str, str]]) -> LLMResponse:
+    """
+    Uses an LLM to summarize a directory of a repository.
+
+    Args:
+        dir_path (str): The directory path, relative to the top-level of the repository.
+        listing (str): The names of the entries in the directory.
+        files (List[Tuple[str, str]]): `(path, contents)` pairs of the directory's key
+            files, such as READMEs, manifests and entry points. Contents may be truncated.
+        children (List[Tuple[str, str]]): `(path, summary)` pairs of its subdirectories.
+
+    Returns:
+        An `LLMResponse` object containing the summary.
+    """
+    inputs = {
+        "dir_path": dir_path or "/",
+        "listing": listing,
+        "files": files,
+        "children": children
+    }
+
+    with get_openai_callback() as cb:
+        output = summarize_directory_chain.invoke(inputs)
+        return LLMResponse(output=output.strip(),
+                           model=LLM_MODEL,
+                           input_tokens=cb.prompt_tokens,
+                           output_tokens=cb.completion_tokens)
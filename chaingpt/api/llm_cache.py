@@ -0,0 +1,189 @@
+"""
+A persistent cache of LLM completions, shared by every chat model.
+
+Completions are keyed by a hash of the model, its parameters and the
+rendered messages, so any identical prompt, whether a chunk of a file or
+a step of the agent, is only paid for once across runs. The cache plugs
+into LangChain through the `cache` field of the chat models.
+
+The cache can also record the completions of a session and replay them:
+in `replay` mode every prompt must be answered from the recording, so a
+recorded session re-runs deterministically and offline.
+"""
+
+
+# Standard lib
+from typing import Optional, Any, Sequence
+import os
+import json
+import time
+import hashlib
+
+# 3rd party
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+# Local
+from chaingpt.utils import config
+from chaingpt.utils.sqlite_store import SQLiteStore, DefaultStore
+
+
+RESPONSE_CACHE_CONFIG = config.config["llm"].get("response_cache") or {}
+RESPONSE_CACHE_ENABLED = RESPONSE_CACHE_CONFIG.get("enabled", True)
+RESPONSE_CACHE_PATH = RESPONSE_CACHE_CONFIG.get("path") or \
+    os.path.join(os.path.dirname(config.CONFIG_FILE_NAME), "llm_cache.sqlite")
+MAX_SIZE_MB = RESPONSE_CACHE_CONFIG.get("max_size_mb", 200)
+# "cache", "record" or "replay"
+CACHE_MODES = ("cache", "record", "replay")
+CACHE_MODE = RESPONSE_CACHE_CONFIG.get("mode", "cache")
+RECORDING_PATH = RESPONSE_CACHE_CONFIG.get("recording_path") or \
+    os.path.join(os.path.dirname(config.CONFIG_FILE_NAME), "llm_recording.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    generations TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+)
+"""
+
+
+class ReplayMissError(RuntimeError):
+    """
+    Raised in `replay` mode for a prompt missing from the recording.
+    """
+
+
+def completion_key(prompt: str, llm_string: str) -> str:
+    """
+    Returns the cache key of a completion.
+
+    Args:
+        prompt (str): The rendered messages, serialized.
+        llm_string (str): The model and its parameters, serialized.
+    """
+    material = json.dumps([llm_string, prompt])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _dump(generations: Sequence[Generation]) -> str:
+    data = []
+    for generation in generations:
+        if isinstance(generation, ChatGeneration):
+            data.append({"message": message_to_dict(generation.message), "info": generation.generation_info})
+        else:
+            data.append({"text": generation.text, "info": generation.generation_info})
+    return json.dumps(data)
+
+
+def _load(data: str) -> list:
+    generations = []
+    for item in json.loads(data):
+        if "message" in item:
+            message = messages_from_dict([item["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=item["info"]))
+        else:
+            generations.append(Generation(text=item["text"], generation_info=item["info"]))
+    return generations
+
+
+class LLMCache(SQLiteStore, BaseCache):
+    """
+    An SQLite-backed LangChain cache of completions, safe to share between
+    threads and processes. The least recently used completions are evicted
+    once the stored completions exceed `max_size_mb`.
+
+    path (str): The SQLite database.
+    max_size_mb (float, optional): The size budget. `None` never evicts.
+    replay (bool, optional): Raise `ReplayMissError` instead of missing, so
+        no prompt reaches the LLM.
+    """
+    TABLE = "completions"
+    SCHEMA = _SCHEMA
+    SIZE = "size"
+
+    def __init__(self, path: str=RESPONSE_CACHE_PATH, max_size_mb: Optional[float]=MAX_SIZE_MB,
+                 replay: bool=False):
+        super().__init__(path, max_size_mb=max_size_mb)
+        self.replay = replay
+
+    def __repr__(self) -> str:
+        # Chat models serialize their cache into the `llm_string` of every
+        # prompt. The default repr holds the object's address, which would
+        # give every run, and every replay, different completion keys.
+        return f"{type(self).__name__}()"
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[list]:
+        """
+        Returns the stored generations of a prompt, or `None`.
+
+        Raises:
+            ReplayMissError: If replaying and the prompt was not recorded.
+        """
+        key = completion_key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT generations FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                if self.replay:
+                    raise ReplayMissError(f"No completion recorded in {self.path} for a prompt; "
+                                          "record the session again")
+                return None
+            self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return _load(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]):
+        """
+        Stores the generations of a prompt and evicts completions over the size budget.
+        """
+        data = _dump(return_val)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)",
+                (completion_key(prompt, llm_string), data, len(data.encode("utf-8")), time.time()))
+            self._evict()
+
+    def clear(self, **kwargs: Any):
+        """
+        Removes every completion. The hit and miss counters are kept.
+        """
+        super().clear()
+
+
+def _create_default() -> LLMCache:
+    if CACHE_MODE == "cache":
+        return LLMCache()
+    cache = LLMCache(RECORDING_PATH, max_size_mb=None, replay=CACHE_MODE == "replay")
+    if CACHE_MODE == "record":
+        cache.clear()
+    return cache
+
+
+_default_cache = DefaultStore(_create_default)
+
+
+def recording() -> bool:
+    """
+    Returns `True` if this session is recorded or replayed. Such sessions
+    must make every LLM call, so nothing is answered from the other stores.
+    """
+    return RESPONSE_CACHE_ENABLED and CACHE_MODE in ("record", "replay")
+
+
+def default_cache() -> Optional[LLMCache]:
+    """
+    Returns the cache configured by `llm.response_cache`, or `None` if it is
+    disabled. In `record` mode it is a new recording at `recording_path`,
+    and in `replay` mode that recording, which is never evicted from.
+
+    Raises:
+        ValueError: If the configured mode is unknown.
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if CACHE_MODE not in CACHE_MODES:
+        raise ValueError(f"`llm.response_cache.mode` must be one of {', '.join(CACHE_MODES)}")
+    return _default_cache.get()
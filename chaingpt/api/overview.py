@@ -0,0 +1,367 @@
+"""
+A hierarchical overview of a repository.
+
+Directories are summarized bottom-up: every directory is described by an
+LLM from its README, manifests and entry points plus the summaries of its
+subdirectories, so the top-level summary describes the whole project.
+Which directories get an LLM call is planned up front, shallowest first,
+within a token budget; the others are described by their listing alone.
+Overviews are persisted per commit SHA, so later sessions on the same
+commit load them instead of rebuilding them.
+"""
+
+
+# Standard lib
+from typing import List, Dict, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import os
+import json
+import threading
+
+# 3rd party
+from sh import git, ErrorReturnCode
+
+# Local
+from chaingpt.api.llm import summarize_directory, LLM_MODEL, PROMPT_VERSION
+from chaingpt.api.path_index import PathIndex
+from chaingpt.api.retrieval import estimate_tokens
+from chaingpt.utils import config
+
+
+OVERVIEW_FORMAT = 1
+OVERVIEW_CONFIG = (config.config.get("workspace") or {}).get("overview") or {}
+OVERVIEW_ENABLED = OVERVIEW_CONFIG.get("enabled", True)
+# Directories summarized concurrently
+MAX_WORKERS = OVERVIEW_CONFIG.get("max_workers", 4)
+# Estimated tokens spent on a whole overview
+TOKEN_BUDGET = OVERVIEW_CONFIG.get("token_budget", 50000)
+# Deeper directories are only listed in their ancestor's summary
+MAX_DEPTH = OVERVIEW_CONFIG.get("max_depth", 3)
+OVERVIEW_CACHE_DIR = os.path.join(config.config["github_repository_cache"]["repository_dir"], "overviews")
+
+# Characters read from each key file
+KEY_FILE_SZ = 3000
+# Key files read per directory
+MAX_KEY_FILES = 4
+# Entries named in a directory listing
+MAX_LISTING = 40
+# Estimated tokens of the prompt itself and of a single summary
+PROMPT_TOKENS = 300
+SUMMARY_TOKENS = 100
+
+# Files that describe a directory, most informative first
+KEY_FILES = [
+    "readme.md", "readme.rst", "readme.txt", "readme",
+    "go.mod", "package.json", "pyproject.toml", "setup.py", "setup.cfg", "cargo.toml",
+    "pom.xml", "build.gradle", "gemfile", "requirements.txt", "makefile", "dockerfile",
+    "main.go", "main.py", "__main__.py", "app.py", "cli.py", "index.js", "index.ts",
+    "main.rs", "lib.rs", "__init__.py",
+]
+_KEY_FILE_RANK = {name: rank for rank, name in enumerate(KEY_FILES)}
+
+
+@dataclass
+class _Directory:
+    files: List[str] = field(default_factory=list)
+    subdirs: Set[str] = field(default_factory=set)
+    file_count: int = 0
+
+
+def _depth(path: str) -> int:
+    return path.count("/") + 1 if path else 0
+
+
+def _join(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+def key_files(names: List[str]) -> List[str]:
+    """
+    Returns the READMEs, manifests and entry points among `names`, most
+    informative first.
+    """
+    found = [n for n in names if n.lower() in _KEY_FILE_RANK]
+    return sorted(found, key=lambda n: _KEY_FILE_RANK[n.lower()])[:MAX_KEY_FILES]
+
+
+def directory_tree(files: List[str]) -> Dict[str, _Directory]:
+    """
+    Groups file paths by directory. The top-level directory is `""`.
+    """
+    dirs = {"": _Directory()}
+    for path in files:
+        parent, _, name = path.rpartition("/")
+        dirs.setdefault(parent, _Directory()).files.append(name)
+        ancestor = parent
+        while True:
+            dirs.setdefault(ancestor, _Directory()).file_count += 1
+            if not ancestor:
+                break
+            grandparent, _, child = ancestor.rpartition("/")
+            dirs.setdefault(grandparent, _Directory()).subdirs.add(child)
+            ancestor = grandparent
+    return dirs
+
+
+class RepoOverview:
+    """
+    Summaries of the directories of a git working copy, built on a
+    background thread. Summaries become available as they are built,
+    deepest directories first.
+    """
+    def __init__(self, repo_dir: str, paths: PathIndex, cache_dir: Optional[str]=OVERVIEW_CACHE_DIR,
+                 max_workers: int=MAX_WORKERS, token_budget: int=TOKEN_BUDGET, max_depth: int=MAX_DEPTH):
+        self.repo_dir = repo_dir
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.token_budget = token_budget
+        self.max_depth = max_depth
+        self.tokens_used = 0
+        self.total = 0
+        self._paths = paths
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._started = False
+        self._summaries: Dict[str, str] = {}
+        self._complete = True
+
+    def _git(self, *args) -> str:
+        return str(git("-C", self.repo_dir, *args, _tty_out=False))
+
+    def _settings(self) -> list:
+        return [LLM_MODEL, PROMPT_VERSION, self.max_depth, self.token_budget]
+
+    def _cache_path(self, commit: str) -> str:
+        return os.path.join(self.cache_dir, f"{commit}.json")
+
+    def _load(self, commit: str) -> bool:
+        try:
+            with open(self._cache_path(commit), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if data.get("format") != OVERVIEW_FORMAT or data.get("settings") != self._settings():
+            return False
+        with self._lock:
+            self._summaries = data["summaries"]
+            self.total = len(self._summaries)
+        return True
+
+    def _save(self, commit: str):
+        data = {
+            "format": OVERVIEW_FORMAT,
+            "settings": self._settings(),
+            "summaries": self._summaries,
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(commit)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _read_head(self, path: str) -> str:
+        try:
+            with open(os.path.join(self.repo_dir, path), "rb") as f:
+                data = f.read(KEY_FILE_SZ)
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            return ""
+        if b"\0" in data:
+            return ""
+        return data.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def _listing(dirs: Dict[str, _Directory], path: str) -> str:
+        directory = dirs[path]
+        entries = []
+        for name in sorted(directory.subdirs):
+            count = dirs[_join(path, name)].file_count
+            entries.append(f"{name}/ ({count} file{'' if count == 1 else 's'})")
+        entries += sorted(directory.files)
+        listing = ", ".join(entries[:MAX_LISTING])
+        if len(entries) > MAX_LISTING:
+            listing += f" and {len(entries) - MAX_LISTING} more"
+        return listing
+
+    def _summarizable(self, path: str) -> bool:
+        return _depth(path) <= self.max_depth and not any(p.startswith(".") for p in path.split("/") if p)
+
+    def _plan(self, dirs: Dict[str, _Directory], candidates: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Picks the directories worth an LLM call, shallowest first, until the
+        token budget is spent. Directories without key files or summarized
+        subdirectories are left to their listing. Key files missing from the
+        working copy mark the overview incomplete, so it is not persisted.
+
+        Returns:
+            The key files of every planned directory, by directory.
+        """
+        candidate_set = set(candidates)
+        planned = {}
+        budget = self.token_budget
+        for path in sorted(candidates, key=lambda p: (_depth(p), p)):
+            directory = dirs[path]
+            children = [c for c in directory.subdirs if _join(path, c) in candidate_set]
+            files = []
+            for name in key_files(directory.files):
+                file_path = _join(path, name)
+                if not os.path.exists(os.path.join(self.repo_dir, file_path)):
+                    # Outside a sparse checkout: a full checkout would plan differently
+                    self._complete = False
+                    continue
+                files.append((file_path, self._read_head(file_path)))
+            files = [(p, t) for p, t in files if t.strip()]
+            if not files and not children:
+                continue
+            cost = PROMPT_TOKENS + SUMMARY_TOKENS * (len(children) + 1) + \
+                estimate_tokens(self._listing(dirs, path) + "".join(t for _, t in files))
+            if cost > budget:
+                continue
+            budget -= cost
+            planned[path] = files
+        return planned
+
+    def _summarize(self, dirs: Dict[str, _Directory], path: str,
+                   planned: Dict[str, List[Tuple[str, str]]]) -> str:
+        directory = dirs[path]
+        listing = self._listing(dirs, path)
+        if path in planned:
+            with self._lock:
+                children = [(_join(path, c), self._summaries[_join(path, c)])
+                            for c in sorted(directory.subdirs) if _join(path, c) in self._summaries]
+            try:
+                response = summarize_directory(path, listing, planned[path], children)
+                with self._lock:
+                    self.tokens_used += response.input_tokens + response.output_tokens
+                return response.output
+            except Exception:
+                self._complete = False
+        return f"Contains {listing}."
+
+    def _build(self):
+        dirs = directory_tree(self._paths.files())
+        candidates = [p for p in dirs if self._summarizable(p)]
+        planned = self._plan(dirs, candidates)
+        self.total = len(candidates)
+        levels = {}
+        for path in candidates:
+            levels.setdefault(_depth(path), []).append(path)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for depth in sorted(levels, reverse=True):
+                level = sorted(levels[depth])
+                summaries = pool.map(lambda p: self._summarize(dirs, p, planned), level)
+                for path, summary in zip(level, summaries):
+                    with self._lock:
+                        self._summaries[path] = summary
+
+    def refresh(self):
+        """
+        Loads the overview of the checked out commit, building and persisting
+        it if no other session has yet. Overviews built without every key file
+        (e.g. in a sparse checkout) are not persisted. Without a `cache_dir`,
+        the overview is always built and never persisted.
+        """
+        self._started = True
+        with self._build_lock:
+            if self._ready.is_set():
+                return
+            try:
+                commit = None
+                if self.cache_dir is not None:
+                    try:
+                        commit = self._git("rev-parse", "HEAD").strip()
+                    except ErrorReturnCode:
+                        pass
+                if commit is None or not self._load(commit):
+                    self._paths.refresh()
+                    self._build()
+                    if commit is not None and self._complete:
+                        self._save(commit)
+            finally:
+                self._ready.set()
+
+    def start(self):
+        """
+        Builds the overview on a daemon thread. Errors are ignored: whatever
+        was summarized before the error remains available.
+        """
+        def build():
+            try:
+                self.refresh()
+            except Exception:
+                pass
+        self._started = True
+        threading.Thread(target=build, name="repo-overview", daemon=True).start()
+
+    def started(self) -> bool:
+        """
+        Returns `True` once the overview started building or loading. It is
+        never started if overviews are disabled.
+        """
+        return self._started
+
+    def ready(self) -> bool:
+        """
+        Returns `True` once the overview finished building or loading.
+        """
+        return self._ready.is_set()
+
+    def wait(self, timeout: float=None) -> bool:
+        """
+        Waits up to `timeout` seconds (forever if `None`) for the overview.
+        Returns `True` if it is ready.
+        """
+        return self._ready.wait(timeout)
+
+    @property
+    def progress(self) -> float:
+        """
+        The fraction of directories summarized so far.
+        """
+        if self.ready():
+            return 1.0
+        with self._lock:
+            return len(self._summaries) / self.total if self.total else 0.0
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        Returns the summary of a directory, or `None` if there is none (yet).
+        """
+        with self._lock:
+            return self._summaries.get(path)
+
+    def render(self, path: str="", depth: int=1, max_chars: int=None) -> str:
+        """
+        Formats the summaries of a directory and its subdirectories as an
+        indented outline.
+
+        Args:
+            path (str, optional): The directory, relative to the top-level of the repository.
+            depth (int, optional): The levels of subdirectories to include.
+            max_chars (int, optional): Truncate the outline to about this many characters.
+
+        Returns:
+            The outline, or an empty string if `path` has no summary yet.
+        """
+        with self._lock:
+            summaries = dict(self._summaries)
+        if path not in summaries:
+            return ""
+        base = _depth(path)
+        prefix = path + "/" if path else ""
+        lines = []
+        size = 0
+        for d in sorted(summaries, key=lambda d: d.split("/")):
+            if d != path and not d.startswith(prefix):
+                continue
+            if _depth(d) - base > depth:
+                continue
+            line = "  " * (_depth(d) - base) + (f"{d}/" if d else "./") + ": " + summaries[d]
+            if max_chars is not None and lines and size + len(line) > max_chars:
+                lines.append("...")
+                break
+            lines.append(line)
+            size += len(line) + 1
+        return "\n".join(lines)
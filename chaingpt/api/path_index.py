@@ -0,0 +1,214 @@
+# Standard lib
+from typing import List, Tuple
+import os
+import re
+import bisect
+import threading
+
+# 3rd party
+from sh import git
+
+# Local
+from chaingpt.utils.cache import LRUCache
+
+
+# Characters that make a glob path component a wildcard
+_WILDCARD_RE = re.compile(r"[*?\[]")
+
+
+def _translate_glob_part(part: str) -> str:
+    """
+    Translates a single path component of a glob pattern into a regular expression.
+    """
+    regex = ""
+    # Like `glob`, wildcards at the start of a name do not match hidden files
+    if part[:1] in ("*", "?", "["):
+        regex += r"(?!\.)"
+    i = 0
+    while i < len(part):
+        c = part[i]
+        i += 1
+        if c == "*":
+            regex += "[^/]*"
+        elif c == "?":
+            regex += "[^/]"
+        elif c == "[":
+            end = part.find("]", i + 1 if part[i:i + 1] in ("!", "]") else i)
+            if end == -1:
+                regex += re.escape(c)
+                continue
+            body = part[i:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            regex += f"[{body}]"
+            i = end + 1
+        else:
+            regex += re.escape(c)
+    return regex
+
+
+def _glob_parts(pattern: str) -> List[str]:
+    return [p for p in pattern.strip("/").split("/") if p not in ("", ".")]
+
+
+def glob_to_regex(pattern: str) -> re.Pattern:
+    """
+    Translates a glob pattern relative to the top-level of the repository
+    into a regular expression with the semantics of `glob.glob(recursive=True)`:
+    `*` and `?` do not cross directories, and a `**` component matches any
+    number of directories.
+    """
+    parts = _glob_parts(pattern)
+    regex = ""
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        if part == "**":
+            regex += r"(?:[^./][^/]*(?:/[^./][^/]*)*)?" if last else r"(?:[^./][^/]*/)*"
+        else:
+            regex += _translate_glob_part(part) + ("" if last else "/")
+    return re.compile(regex)
+
+
+def literal_prefix(pattern: str) -> str:
+    """
+    Returns the leading directories of `pattern` that contain no wildcards,
+    e.g. `src/api/` for `src/api/*.py`. Every match starts with it.
+    """
+    prefix = ""
+    for part in _glob_parts(pattern):
+        if _WILDCARD_RE.search(part):
+            break
+        prefix += part + "/"
+    return prefix
+
+
+class PathIndex:
+    """
+    An in-memory index of the files and directories in a git working copy,
+    built from `git ls-files` so `.git` and ignored paths such as
+    `node_modules` are never walked. Files outside a sparse checkout are
+    included. The index is rebuilt when the git index or any indexed
+    directory changes, so files created or deleted after the clone are
+    picked up by the next query.
+    """
+    def __init__(self, root: str, cache_size: int=64):
+        self.root = root
+        self._lock = threading.Lock()
+        self._paths: List[str] = []
+        self._path_set = frozenset()
+        self._dirs: List[str] = []
+        self._dir_set = frozenset()
+        self._files: List[str] = []
+        self._signature = None
+        self._results = LRUCache(cache_size)
+        # Incremented on every rebuild so dependent indexes can tell when to rebuild
+        self.generation = 0
+
+    def _list_files(self) -> List[str]:
+        """
+        Lists tracked and untracked files, including files outside a sparse
+        checkout but excluding tracked files deleted from the working copy.
+        """
+        output = str(git("-C", self.root, "ls-files", "-z", "-t", "--cached", "--deleted",
+                         "--others", "--exclude-standard", _tty_out=False))
+        files = {}
+        deleted = set()
+        for entry in output.split("\0")[:-1]:
+            # Each entry is a status tag and a path; `R` marks a deleted file
+            tag, path = entry[0], entry[2:]
+            if tag == "R":
+                deleted.add(path)
+            else:
+                files[path] = None
+        return [f for f in files if f not in deleted]
+
+    def _stat_signature(self, dirs) -> Tuple:
+        """
+        Returns a value that changes whenever a path is added to or removed
+        from the working copy: the mtimes of the git index and of every
+        directory that could contain a new path.
+        """
+        signature = []
+        for d in [".git/index", "", *dirs]:
+            try:
+                signature.append(os.stat(os.path.join(self.root, d)).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def refresh(self, force: bool=False):
+        """
+        Rebuilds the index if the working copy has changed since it was built.
+        """
+        with self._lock:
+            if not force and self._signature is not None \
+                    and self._stat_signature(self._dirs) == self._signature:
+                return
+            files = self._list_files()
+            dirs = set()
+            for f in files:
+                parent = os.path.dirname(f)
+                while parent and parent not in dirs:
+                    dirs.add(parent)
+                    parent = os.path.dirname(parent)
+            self._files = sorted(files)
+            self._paths = sorted(dirs.union(files))
+            self._path_set = frozenset(self._paths)
+            self._dirs = sorted(dirs)
+            self._dir_set = frozenset(dirs)
+            self._signature = self._stat_signature(self._dirs)
+            self._results.clear()
+            self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def files(self) -> List[str]:
+        """
+        Returns every indexed file, sorted.
+        """
+        return self._files
+
+    def is_dir(self, path: str) -> bool:
+        return path in self._dir_set
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._path_set
+
+    def search(self, pattern: str) -> Tuple[List[str], List[str]]:
+        """
+        Matches `pattern` against every indexed path.
+
+        Args:
+            pattern (str): A glob pattern relative to the top-level of the repository.
+
+        Returns:
+            A Tuple of the sorted matching directories and the sorted matching files.
+        """
+        self.refresh()
+        cached = self._results.get(pattern)
+        if cached is not None:
+            return cached
+
+        dirs = []
+        files = []
+        if not _WILDCARD_RE.search(pattern):
+            # A pattern without wildcards names a single path
+            path = "/".join(_glob_parts(pattern))
+            if path in self._path_set:
+                (dirs if path in self._dir_set else files).append(path)
+        else:
+            regex = glob_to_regex(pattern)
+            prefix = literal_prefix(pattern)
+            paths = self._paths
+            # Only the paths under the literal prefix can match
+            for i in range(bisect.bisect_left(paths, prefix), len(paths)):
+                path = paths[i]
+                if not path.startswith(prefix):
+                    break
+                if regex.fullmatch(path):
+                    (dirs if path in self._dir_set else files).append(path)
+
+        result = (dirs, files)
+        self._results.put(pattern, result)
+        return result
@@ -0,0 +1,252 @@
+# Standard lib
+from typing import Optional, List, Tuple
+import os
+import re
+import fcntl
+import shutil
+import hashlib
+import threading
+from urllib.parse import urlsplit
+
+# 3rd party
+from sh import git, ErrorReturnCode
+
+# Local
+from chaingpt.utils import config
+
+
+REPOSITORY_DIR = config.config["github_repository_cache"]["repository_dir"]
+CACHE_ENABLED = config.config["github_repository_cache"].get("enabled", True)
+MAX_SIZE_MB = config.config["github_repository_cache"].get("max_size_mb", 10240)
+
+MIRRORS_NAME = "repositories"
+
+_SCP_URL_RE = re.compile(r"^(?P<user>[\w.-]+)@(?P<host>[\w.-]+):(?P<path>.+)$")
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a repository URL so different spellings of the same
+    repository share a cache entry. `git@github.com:user/repo.git`,
+    `https://GitHub.com/user/repo/` and `https://github.com/user/repo`
+    all normalize to `https://github.com/user/repo`. Local paths become
+    absolute `file://` URLs.
+    """
+    url = url.strip()
+    scp = _SCP_URL_RE.match(url)
+    if scp and "://" not in url:
+        url = f"https://{scp['host']}/{scp['path']}"
+    elif "://" not in url:
+        return "file://" + os.path.abspath(url).rstrip("/")
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme in ("ssh", "git", "http"):
+        scheme = "https"
+    if scheme == "file":
+        return "file://" + os.path.abspath(parts.path).rstrip("/")
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port not in (22, 80, 443):
+        host += f":{parts.port}"
+    path = parts.path.rstrip("/")
+    if path.endswith(".git"):
+        path = path[:-4]
+    return f"{scheme}://{host}{path}"
+
+
+def cache_key(url: str) -> str:
+    """
+    Returns the directory name of the cache entry for `url`: a readable
+    repository name followed by a hash of the normalized URL.
+    """
+    normalized = normalize_url(url)
+    name = re.sub(r"[^\w.-]", "_", os.path.basename(normalized)) or "repo"
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+    return f"{name}-{digest}"
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class CacheLease:
+    """
+    Marks a cached mirror as in use until `release` is called, which
+    protects it from eviction. Workspaces created from the mirror borrow
+    its objects and break if the mirror is removed underneath them.
+    """
+    def __init__(self, fd: int):
+        self._fd = fd
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+class RepositoryCache:
+    """
+    A cache of bare mirrors of remote repositories, shared by every
+    session on the host. The first session for a repository clones a
+    mirror; later sessions fetch into it and create their checkout with
+    `git clone --shared`, which borrows the mirror's objects instead of
+    copying them. The total size of the mirrors is kept under
+    `max_size_mb` by evicting the least recently used mirrors that no
+    session is using.
+
+    Two lock files guard each mirror: `<key>.lock` serializes clones and
+    fetches, and `<key>.users` is held shared by every session using the
+    mirror so eviction can tell when it is safe to remove.
+    """
+    def __init__(self, cache_dir: str=REPOSITORY_DIR, max_size_mb: int=MAX_SIZE_MB):
+        self.mirrors_dir = os.path.join(cache_dir, MIRRORS_NAME)
+        self.max_size = max_size_mb * 1024 * 1024
+        os.makedirs(self.mirrors_dir, exist_ok=True)
+
+    def _paths(self, key: str) -> Tuple[str, str, str]:
+        base = os.path.join(self.mirrors_dir, key)
+        return base + ".git", base + ".lock", base + ".users"
+
+    def mirror_path(self, url: str) -> str:
+        """
+        Returns where the mirror for `url` is (or would be) stored.
+        """
+        return self._paths(cache_key(url))[0]
+
+    def _update_mirror(self, url: str, mirror: str):
+        """
+        Clones the mirror or fetches the latest refs into it. Must be
+        called with the mirror's update lock held.
+        """
+        if os.path.exists(mirror):
+            try:
+                git("--git-dir", mirror, "fetch", "--quiet", "--prune", "origin")
+                return
+            except ErrorReturnCode:
+                # A broken mirror (e.g. an interrupted clone) is recloned
+                shutil.rmtree(mirror, ignore_errors=True)
+
+        try:
+            git.clone("--quiet", "--mirror", url, mirror)
+        except ErrorReturnCode:
+            shutil.rmtree(mirror, ignore_errors=True)
+            raise
+        # Objects of rewritten history may still be borrowed by live
+        # workspaces, so never prune them automatically. Eviction bounds size.
+        git("--git-dir", mirror, "config", "gc.auto", "0")
+
+    def checkout(self, url: str, dest: str, clone_args: List[str]=None) -> CacheLease:
+        """
+        Creates a working copy of `url` at `dest`, backed by the cached mirror.
+
+        Args:
+            url (str): The repository URL.
+            dest (str): The directory to create the working copy in.
+            clone_args (List[str], optional): Extra arguments for the local `git clone`.
+
+        Returns:
+            A `CacheLease` that must be released once `dest` is no longer used.
+
+        Raises:
+            ErrorReturnCode: If the repository cannot be cloned or fetched.
+        """
+        key = cache_key(url)
+        mirror, update_lock, users_lock = self._paths(key)
+        os.makedirs(self.mirrors_dir, exist_ok=True)
+
+        users_fd = os.open(users_lock, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(users_fd, fcntl.LOCK_SH)
+        lease = CacheLease(users_fd)
+        try:
+            update_fd = os.open(update_lock, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(update_fd, fcntl.LOCK_EX)
+                self._update_mirror(url, mirror)
+                git.clone("--quiet", "--shared", *(clone_args or []), mirror, dest)
+            finally:
+                os.close(update_fd)
+            git("-C", dest, "remote", "set-url", "origin", url)
+            # The mirror's mtime records when it was last used
+            os.utime(mirror)
+        except BaseException:
+            lease.release()
+            raise
+
+        self.evict()
+        return lease
+
+    def _entries(self) -> List[Tuple[str, float, int]]:
+        """
+        Returns `(key, last_used, size)` for every cached mirror.
+        """
+        entries = []
+        if not os.path.isdir(self.mirrors_dir):
+            return entries
+        for name in os.listdir(self.mirrors_dir):
+            if not name.endswith(".git"):
+                continue
+            path = os.path.join(self.mirrors_dir, name)
+            try:
+                last_used = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((name[:-4], last_used, _dir_size(path)))
+        return entries
+
+    def size(self) -> int:
+        """
+        Returns the total size of the cached mirrors in bytes.
+        """
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self) -> List[str]:
+        """
+        Removes the least recently used mirrors that are not in use until
+        the cache fits its size budget.
+
+        Returns:
+            The keys of the evicted mirrors.
+        """
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        evicted = []
+        for key, _, size in entries:
+            if total <= self.max_size:
+                break
+            mirror, update_lock, users_lock = self._paths(key)
+            fd = os.open(users_lock, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # In use by a live workspace
+                os.close(fd)
+                continue
+            try:
+                shutil.rmtree(mirror, ignore_errors=True)
+                total -= size
+                evicted.append(key)
+            finally:
+                os.close(fd)
+        return evicted
+
+
+_default_cache: Optional[RepositoryCache] = None
+
+
+def default_cache() -> RepositoryCache:
+    """
+    Returns the host-wide cache configured by `github_repository_cache`.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = RepositoryCache()
+    return _default_cache
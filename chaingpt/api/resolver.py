@@ -0,0 +1,127 @@
+# Standard lib
+from typing import List, Iterable, Dict, Optional, FrozenSet, Tuple
+from dataclasses import dataclass
+import threading
+
+# Local
+from chaingpt.api.catalog import CatalogPackage
+from chaingpt.api.apkindex import dependency_name, version_key
+
+
+@dataclass(frozen=True)
+class WolfiResolution:
+    """
+    The result of resolving a list of Wolfi dependencies.
+
+    packages (List[str]): Every package that would be installed, sorted by name.
+    installed_size (int): The total installed size in bytes. Packages with an
+                          unknown size count as 0.
+    unresolved (List[str]): Requested or transitive dependencies that no
+                            package provides.
+    """
+    packages: List[str]
+    installed_size: int
+    unresolved: List[str]
+
+
+class DependencyResolver:
+    """
+    Computes the transitive runtime dependency closure of Wolfi packages.
+    Dependencies may name a package or anything a package provides
+    (e.g. `so:libc.so.6` or `cmd:git`). Closures are memoized per package.
+    """
+    def __init__(self, packages: Iterable[CatalogPackage]):
+        self._packages = {p.name: p for p in packages}
+        self._providers = self._index_providers(self._packages.values())
+        self._closures = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index_providers(packages: Iterable[CatalogPackage]) -> Dict[str, str]:
+        """
+        Maps every provided name to the package that provides it. When
+        several packages provide a name, the newest one wins, mirroring apk.
+        """
+        candidates = {}
+        for p in packages:
+            for provided in p.provides:
+                candidates.setdefault(dependency_name(provided), []).append(p)
+        providers = {name: max(ps, key=lambda p: (version_key(p.version), p.name)).name
+                     for name, ps in candidates.items()}
+        # A real package always wins over a virtual name
+        providers.update({name: name for name in {p.name for p in packages}})
+        return providers
+
+    def provider(self, dep: str) -> Optional[str]:
+        """
+        Returns the name of the package satisfying `dep`, or `None`.
+        """
+        return self._providers.get(dependency_name(dep.strip()))
+
+    def _closure(self, name: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+        """
+        Returns the packages installed by `name` (including itself) and
+        any dependencies that could not be resolved along the way.
+        """
+        with self._lock:
+            if name in self._closures:
+                return self._closures[name]
+
+        installed = set()
+        unresolved = set()
+        stack = [name]
+        while stack:
+            current = stack.pop()
+            if current in installed:
+                continue
+            with self._lock:
+                memo = self._closures.get(current)
+            if memo is not None:
+                installed |= memo[0]
+                unresolved |= memo[1]
+                continue
+            installed.add(current)
+            for dep in self._packages[current].depends:
+                if dep.startswith("!"):
+                    # Conflicts are not installed
+                    continue
+                provider = self.provider(dep)
+                if provider is None:
+                    unresolved.add(dependency_name(dep))
+                elif provider not in installed:
+                    stack.append(provider)
+
+        result = (frozenset(installed), frozenset(unresolved))
+        with self._lock:
+            self._closures[name] = result
+        return result
+
+    def resolve(self, deps: List[str]) -> WolfiResolution:
+        """
+        Resolves `deps` to the full set of packages that would be installed.
+
+        Args:
+            deps (List[str]): Package names or provided names, optionally with
+                              version constraints. Empty entries are ignored.
+
+        Returns:
+            A `WolfiResolution`.
+        """
+        installed = set()
+        unresolved = set()
+        for dep in deps:
+            dep = dep.strip()
+            if not dep:
+                continue
+            provider = self.provider(dep)
+            if provider is None:
+                unresolved.add(dep)
+                continue
+            closure, missing = self._closure(provider)
+            installed |= closure
+            unresolved |= missing
+
+        size = sum(self._packages[name].installed_size for name in installed)
+        return WolfiResolution(packages=sorted(installed),
+                               installed_size=size,
+                               unresolved=sorted(unresolved))
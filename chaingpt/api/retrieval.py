@@ -0,0 +1,349 @@
+"""
+Lexical retrieval over the chunks of a file.
+
+Chunks are ranked against a question with BM25 so `fileqa` can send only
+the relevant parts of a large file to the LLM. Indexes are cached by the
+git blob SHA of the file, so a file is only indexed once per content.
+
+When a file is scanned chunk by chunk instead, a prefilter scores the
+chunks against the question as they stream past and drops those unlikely
+to be relevant before they reach the LLM.
+"""
+
+
+# Standard lib
+from typing import Callable, Dict, List, Optional, Tuple, Iterable, Iterator
+from collections import Counter
+from dataclasses import dataclass
+import itertools
+import math
+import re
+import zlib
+
+# Local
+from chaingpt.utils import config
+from chaingpt.utils.cache import LRUCache
+
+
+RETRIEVAL_CONFIG = config.config["llm"].get("retrieval") or {}
+RETRIEVAL_ENABLED = RETRIEVAL_CONFIG.get("enabled", True)
+TOP_K = RETRIEVAL_CONFIG.get("top_k", 3)
+NEIGHBORS = RETRIEVAL_CONFIG.get("neighbors", 1)
+TOKEN_BUDGET = RETRIEVAL_CONFIG.get("token_budget", 6000)
+# Questions whose best chunk scores lower than this fall back to a full scan
+MIN_SCORE = RETRIEVAL_CONFIG.get("min_score", 1.0)
+INDEX_CACHE_SIZE = RETRIEVAL_CONFIG.get("index_cache_size", 128)
+PREFILTER_CONFIG = config.config["llm"].get("prefilter") or {}
+PREFILTER_ENABLED = PREFILTER_CONFIG.get("enabled", True)
+PREFILTER_SCORER = PREFILTER_CONFIG.get("scorer", "keyword")
+PREFILTER_MIN_SCORE = PREFILTER_CONFIG.get("min_score", 0.2)
+# The best scoring share of every window of chunks is kept whatever its score
+PREFILTER_MIN_KEEP = PREFILTER_CONFIG.get("min_keep", 0.1)
+PREFILTER_WINDOW = PREFILTER_CONFIG.get("window", 8)
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_SUBWORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# Question words that say nothing about where the answer is
+STOPWORDS = frozenset("""
+a an and are as at be by can do does file for from how i in is it its of on or
+that the this to was what when where which who why will with should would could
+there their they them you your me my we our any all not no so if then than
+""".split())
+
+# Buckets terms are hashed into by the `hashing` prefilter scorer
+HASH_FEATURES = 2 ** 18
+
+_index_cache = LRUCache(INDEX_CACHE_SIZE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase terms. Identifiers are kept whole and also
+    split into their camelCase and snake_case parts, so `parseHTTPHeader`
+    matches questions about "headers".
+    """
+    terms = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        terms.append(lower)
+        parts = [p.lower() for part in word.split("_") for p in _SUBWORD_RE.findall(part)]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def _query_terms(question: str) -> List[str]:
+    return list(dict.fromkeys(t for t in tokenize(question) if t not in STOPWORDS))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimates the number of LLM tokens in `text`.
+    """
+    return len(text) // 4 + 1
+
+
+class ChunkIndex:
+    """
+    A BM25 index over the chunks of a single file. Only term counts are
+    kept, not the chunks themselves, so chunks can be streamed in.
+    """
+    def __init__(self, chunks: Iterable[str]):
+        self._term_freqs = []
+        # Estimated LLM tokens of every chunk
+        self.tokens = []
+        for chunk in chunks:
+            self._term_freqs.append(Counter(tokenize(chunk)))
+            self.tokens.append(estimate_tokens(chunk))
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        n = len(self._term_freqs)
+        self._avg_length = (sum(self._lengths) / n) if n else 0
+        doc_freqs = Counter()
+        for tf in self._term_freqs:
+            doc_freqs.update(tf.keys())
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def __len__(self) -> int:
+        return len(self._term_freqs)
+
+    def scores(self, question: str) -> List[float]:
+        """
+        Returns the BM25 score of every chunk for `question`.
+        """
+        terms = [t for t in _query_terms(question) if t in self._idf]
+        scores = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            norm = K1 * (1 - B + B * length / self._avg_length) if self._avg_length else K1
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (K1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+    def rank(self, question: str) -> List[Tuple[int, float]]:
+        """
+        Returns `(chunk index, score)` pairs for the chunks matching
+        `question`, best first.
+        """
+        ranked = [(i, s) for i, s in enumerate(self.scores(question)) if s > 0]
+        ranked.sort(key=lambda r: (-r[1], r[0]))
+        return ranked
+
+
+def chunk_index(blob_sha: str, chunks: Iterable[str], chunk_size: int, chunk_overlap: int) -> ChunkIndex:
+    """
+    Returns the index for a file's chunks, building it on first use.
+    Indexes are cached by blob SHA and chunking settings; `chunks` is only
+    consumed when the index is built.
+    """
+    key = (blob_sha, chunk_size, chunk_overlap)
+    index = _index_cache.get(key)
+    if index is None:
+        index = ChunkIndex(chunks)
+        _index_cache.put(key, index)
+    return index
+
+
+def select_chunks(index: ChunkIndex, question: str, top_k: int=TOP_K, neighbors: int=NEIGHBORS,
+                  token_budget: int=TOKEN_BUDGET, min_score: float=MIN_SCORE) -> Optional[List[int]]:
+    """
+    Picks the chunks worth sending to the LLM: the `top_k` best ranked
+    chunks, each with up to `neighbors` chunks on either side for context,
+    until `token_budget` is spent.
+
+    Args:
+        index (ChunkIndex): The file's chunk index.
+        question (str): The question to rank chunks against.
+        top_k (int, optional): The number of best ranked chunks to include.
+        neighbors (int, optional): The number of adjacent chunks to include around each.
+        token_budget (int, optional): The maximum estimated tokens of the selection.
+        min_score (float, optional): The minimum score of the best chunk.
+
+    Returns:
+        The selected chunk indexes in file order, or `None` if retrieval is
+        not confident enough and the whole file should be scanned.
+    """
+    ranked = index.rank(question)
+    if not ranked or ranked[0][1] < min_score:
+        return None
+
+    selected = set()
+    used = 0
+
+    def add(i: int) -> bool:
+        nonlocal used
+        if i in selected or not 0 <= i < len(index):
+            return True
+        cost = index.tokens[i]
+        if used + cost > token_budget:
+            return False
+        selected.add(i)
+        used += cost
+        return True
+
+    for i, _ in ranked[:top_k]:
+        if not add(i):
+            break
+        for distance in range(1, neighbors + 1):
+            add(i - distance)
+            add(i + distance)
+
+    if not selected:
+        return None
+    return sorted(selected)
+
+
+def keyword_scores(question: str, chunks: List[str]) -> List[float]:
+    """
+    Scores chunks by the share of the question's terms they contain, from
+    0 to 1. Every chunk scores 1 if the question has no terms.
+    """
+    terms = set(_query_terms(question))
+    if not terms:
+        return [1.0] * len(chunks)
+    return [len(terms.intersection(tokenize(chunk))) / len(terms) for chunk in chunks]
+
+
+def bm25_scores(question: str, chunks: List[str]) -> List[float]:
+    """
+    Scores chunks with BM25, with term statistics taken from `chunks`
+    alone. Every chunk scores 1 if the question has no terms.
+    """
+    if not _query_terms(question):
+        return [1.0] * len(chunks)
+    return ChunkIndex(chunks).scores(question)
+
+
+def _hashed(terms: List[str]) -> Dict[int, float]:
+    """
+    Returns the L2-normalized, sublinear term frequency vector of `terms`
+    with the terms hashed into `HASH_FEATURES` buckets.
+    """
+    counts = Counter(zlib.crc32(term.encode()) % HASH_FEATURES for term in terms)
+    vector = {h: 1 + math.log(n) for h, n in counts.items()}
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {h: v / norm for h, v in vector.items()}
+
+
+def hashing_scores(question: str, chunks: List[str]) -> List[float]:
+    """
+    Scores chunks by the cosine similarity of their hashed term frequencies
+    with the question's, from 0 to 1. Every chunk scores 1 if the question
+    has no terms.
+    """
+    terms = _query_terms(question)
+    if not terms:
+        return [1.0] * len(chunks)
+    query = _hashed(terms)
+    scores = []
+    for chunk in chunks:
+        vector = _hashed([t for t in tokenize(chunk) if t not in STOPWORDS])
+        scores.append(sum(v * vector.get(h, 0.0) for h, v in query.items()))
+    return scores
+
+
+# Prefilter scorers by name. A scorer returns the score of every chunk of a
+# window for a question; higher is more relevant.
+SCORERS: Dict[str, Callable[[str, List[str]], List[float]]] = {
+    "keyword": keyword_scores,
+    "bm25": bm25_scores,
+    "hashing": hashing_scores,
+}
+
+
+@dataclass
+class PrefilterStats:
+    """
+    What a prefilter did with the chunks of a file, updated as they are read.
+
+    seen (int): The chunks read.
+    skipped (int): The chunks dropped.
+    """
+    seen: int = 0
+    skipped: int = 0
+
+
+class ChunkPrefilter:
+    """
+    Drops the chunks of a file unlikely to be relevant to a question before
+    they are sent to an LLM. Chunks are read and scored `window` at a time,
+    so they can be read lazily; the chunks scoring at least `min_score` are
+    kept, and so are the best scoring `min_keep` of every window whatever
+    their score, so at least one chunk of every window reaches the LLM.
+
+    scorer (str): The name of the scorer in `SCORERS`.
+    min_score (float): The score a chunk needs to be kept.
+    min_keep (float): The share of every window kept regardless of score.
+    window (int): The chunks scored together.
+
+    Raises:
+        ValueError: If `scorer` is unknown, `min_keep` is not in (0, 1] or `window` is less than 1.
+    """
+    def __init__(self, scorer: str=PREFILTER_SCORER, min_score: float=PREFILTER_MIN_SCORE,
+                 min_keep: float=PREFILTER_MIN_KEEP, window: int=PREFILTER_WINDOW):
+        if scorer not in SCORERS:
+            raise ValueError(f"`scorer` must be one of {', '.join(SCORERS)}")
+        if not 0 < min_keep <= 1:
+            raise ValueError("`min_keep` must be more than 0 and at most 1")
+        if window < 1:
+            raise ValueError("`window` must be at least 1")
+        self.scorer = scorer
+        self.min_score = min_score
+        self.min_keep = min_keep
+        self.window = window
+
+    def settings(self) -> list:
+        """
+        Returns the settings that decide which chunks are kept.
+        """
+        return [self.scorer, self.min_score, self.min_keep, self.window]
+
+    def filter(self, question: str, chunks: Iterable[str]) -> Tuple[Iterator[str], PrefilterStats]:
+        """
+        Lazily drops the chunks irrelevant to `question`. Every chunk is kept
+        without being scored if the question has no terms.
+
+        Returns:
+            An iterator over the kept chunks in file order, and the stats of
+            the chunks read from it so far.
+        """
+        stats = PrefilterStats()
+        score = SCORERS[self.scorer]
+
+        def unfiltered() -> Iterator[str]:
+            for chunk in chunks:
+                stats.seen += 1
+                yield chunk
+
+        def kept() -> Iterator[str]:
+            it = iter(chunks)
+            while True:
+                window = list(itertools.islice(it, self.window))
+                if not window:
+                    return
+                scores = score(question, window)
+                keep = {i for i, s in enumerate(scores) if s >= self.min_score}
+                floor = math.ceil(self.min_keep * len(window))
+                for i in sorted(range(len(window)), key=lambda i: -scores[i]):
+                    if len(keep) >= floor:
+                        break
+                    keep.add(i)
+                stats.seen += len(window)
+                stats.skipped += len(window) - len(keep)
+                for i in sorted(keep):
+                    yield window[i]
+
+        if not _query_terms(question):
+            return unfiltered(), stats
+        return kept(), stats
+
+
+# The prefilter applied when files are scanned chunk by chunk, if enabled
+PREFILTER = ChunkPrefilter() if PREFILTER_ENABLED else None
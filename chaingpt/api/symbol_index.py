@@ -0,0 +1,379 @@
+"""
+Symbol definitions and references for a workspace.
+
+Python files are parsed with `ast`. Go, JavaScript/TypeScript, Rust and
+Java definitions are found with regular expressions. References are the
+textual occurrences of a defined name outside its definition. Indexes are
+persisted per commit SHA, so every later session on the same commit loads
+the index instead of rebuilding it.
+"""
+
+
+# Standard lib
+from typing import List, Dict, Optional, Tuple, Iterator
+from dataclasses import dataclass
+import os
+import re
+import ast
+import json
+import threading
+
+# 3rd party
+from sh import git, ErrorReturnCode
+
+# Local
+from chaingpt.utils import config
+
+
+INDEX_FORMAT = 1
+SYMBOL_CACHE_DIR = os.path.join(config.config["github_repository_cache"]["repository_dir"], "symbols")
+# Larger files are not indexed
+MAX_FILE_SZ = 1024 * 1024
+# References stored per name
+MAX_REFERENCES = 500
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_]\w*")
+
+# Words that look like method names to the regex extractors
+_KEYWORDS = frozenset({"if", "for", "while", "switch", "catch", "return", "new", "else",
+                       "do", "try", "function", "super", "this", "throw", "typeof", "await"})
+
+_JS_EXTRACTORS = [
+    (re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(\w+)"), "function"),
+    (re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(\w+)"), "class"),
+    (re.compile(r"^\s*(?:export\s+)?(?:interface|type|enum)\s+(\w+)"), "type"),
+    (re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?"
+                r"(?:function\b|\([^)]*\)\s*=>|\w+\s*=>)"), "function"),
+    (re.compile(r"^\s+(?:(?:static|async|get|set|public|private|protected)\s+)*(\w+)\s*\([^)]*\)\s*\{"), "method"),
+]
+
+# File extension -> [(definition regex, kind)]. The first group is the name.
+EXTRACTORS = {
+    ".go": [
+        (re.compile(r"^func\s+\([^)]*\)\s*(\w+)"), "method"),
+        (re.compile(r"^func\s+(\w+)"), "function"),
+        (re.compile(r"^\s*type\s+(\w+)\s+(?:struct|interface)\b"), "class"),
+        (re.compile(r"^\s*type\s+(\w+)\b"), "type"),
+        (re.compile(r"^(?:const|var)\s+(\w+)"), "variable"),
+    ],
+    ".rs": [
+        (re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:const\s+)?(?:async\s+)?(?:unsafe\s+)?"
+                    r"(?:extern\s+\"[^\"]*\"\s+)?fn\s+(\w+)"), "function"),
+        (re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|union|trait)\s+(\w+)"), "class"),
+        (re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?type\s+(\w+)"), "type"),
+        (re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:const|static)\s+(?:mut\s+)?(\w+)"), "variable"),
+        (re.compile(r"^\s*macro_rules!\s*(\w+)"), "macro"),
+        (re.compile(r"^\s*(?:pub(?:\([^)]*\))?\s+)?mod\s+(\w+)"), "module"),
+    ],
+    ".java": [
+        (re.compile(r"^\s*(?:(?:public|protected|private|static|final|abstract|sealed|non-sealed)\s+)*"
+                    r"(?:class|interface|enum|record|@interface)\s+(\w+)"), "class"),
+        (re.compile(r"^\s*(?:(?:public|protected|private|static|final|abstract|synchronized|native|default)\s+)*"
+                    r"(?:<[^>]*>\s+)?[\w.<>\[\], ?]+\s+(\w+)\s*\([^;]*$"), "method"),
+    ],
+    ".js": _JS_EXTRACTORS,
+    ".jsx": _JS_EXTRACTORS,
+    ".mjs": _JS_EXTRACTORS,
+    ".cjs": _JS_EXTRACTORS,
+    ".ts": _JS_EXTRACTORS,
+    ".tsx": _JS_EXTRACTORS,
+}
+
+SUPPORTED_EXTENSIONS = frozenset(EXTRACTORS) | {".py"}
+
+
+@dataclass(frozen=True)
+class Symbol:
+    """
+    A symbol definition.
+
+    name (str): The unqualified name, e.g. `fileqa`.
+    qualname (str): The name qualified by its enclosing classes, e.g. `Workspace.fileqa`.
+    kind (str): `class`, `function`, `method`, `type`, `variable`, `macro` or `module`.
+    path (str): The file path, relative to the top-level of the repository.
+    line_number (int): The 1-based line of the definition.
+    """
+    name: str
+    qualname: str
+    kind: str
+    path: str
+    line_number: int
+
+
+@dataclass(frozen=True)
+class SymbolReference:
+    """
+    A line that mentions a symbol outside its definition.
+    """
+    path: str
+    line_number: int
+    line: str
+
+
+@dataclass(frozen=True)
+class SymbolLookup:
+    """
+    The result of looking up a symbol.
+
+    definitions (List[Symbol]): Every definition with the requested name.
+    references (List[SymbolReference]): Lines mentioning the name, up to the requested limit.
+    total_references (int): The number of known references.
+    """
+    definitions: List[Symbol]
+    references: List[SymbolReference]
+    total_references: int
+
+
+class _PythonVisitor(ast.NodeVisitor):
+    def __init__(self, path: str):
+        self.path = path
+        self.scope: List[str] = []
+        self.in_class: List[bool] = [False]
+        self.definitions: List[Symbol] = []
+        self.names: List[Tuple[str, int]] = []
+
+    def _define(self, name: str, kind: str, line_number: int):
+        qualname = ".".join(self.scope + [name])
+        self.definitions.append(Symbol(name, qualname, kind, self.path, line_number))
+
+    def _visit_scope(self, node, kind: str, is_class: bool):
+        self._define(node.name, kind, node.lineno)
+        self.scope.append(node.name)
+        self.in_class.append(is_class)
+        self.generic_visit(node)
+        self.in_class.pop()
+        self.scope.pop()
+
+    def visit_ClassDef(self, node):
+        self._visit_scope(node, "class", True)
+
+    def visit_FunctionDef(self, node):
+        self._visit_scope(node, "method" if self.in_class[-1] else "function", False)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Assign(self, node):
+        # Module and class level constants and attributes
+        if len(self.in_class) == 1 or self.in_class[-1]:
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    self._define(target.id, "variable", node.lineno)
+        self.generic_visit(node)
+
+    def visit_Name(self, node):
+        self.names.append((node.id, node.lineno))
+
+    def visit_Attribute(self, node):
+        self.names.append((node.attr, getattr(node, "end_lineno", node.lineno)))
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            self.names.append((alias.name, node.lineno))
+
+
+def _python_symbols(path: str, text: str) -> Tuple[List[Symbol], List[Tuple[str, int]]]:
+    """
+    Returns the definitions in a Python file and every `(name, line)` it uses.
+    Files that do not parse fall back to plain identifier matching.
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return [], list(_identifiers(text))
+    visitor = _PythonVisitor(path)
+    visitor.visit(tree)
+    return visitor.definitions, visitor.names
+
+
+def _regex_symbols(path: str, text: str, extractors) -> List[Symbol]:
+    definitions = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        for regex, kind in extractors:
+            match = regex.match(line)
+            if match and match.group(1) not in _KEYWORDS:
+                definitions.append(Symbol(match.group(1), match.group(1), kind, path, line_number))
+                break
+    return definitions
+
+
+def _identifiers(text: str) -> Iterator[Tuple[str, int]]:
+    for line_number, line in enumerate(text.splitlines(), 1):
+        for name in set(_IDENTIFIER_RE.findall(line)):
+            yield name, line_number
+
+
+def extract_symbols(path: str, text: str) -> Tuple[List[Symbol], List[Tuple[str, int]]]:
+    """
+    Extracts the definitions in a file and the `(name, line)` pairs of the
+    identifiers it uses.
+
+    Args:
+        path (str): The file path. Its extension selects the extractor.
+        text (str): The file contents.
+
+    Returns:
+        A Tuple of the `Symbol` definitions and the identifier uses.
+    """
+    ext = os.path.splitext(path)[1]
+    if ext == ".py":
+        return _python_symbols(path, text)
+    extractors = EXTRACTORS.get(ext)
+    if extractors is None:
+        return [], []
+    return _regex_symbols(path, text, extractors), list(_identifiers(text))
+
+
+class SymbolIndex:
+    """
+    Maps symbol names to their definitions and references across the
+    files tracked in a git working copy. The index reflects the commit
+    checked out when it was built.
+    """
+    def __init__(self, repo_dir: str, cache_dir: str=SYMBOL_CACHE_DIR):
+        self.repo_dir = repo_dir
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._built = False
+        self._definitions: Dict[str, List[Symbol]] = {}
+        self._references: Dict[str, List[Tuple[str, int]]] = {}
+
+    def _git(self, *args) -> str:
+        return str(git("-C", self.repo_dir, *args, _tty_out=False))
+
+    def _cache_path(self, commit: str) -> str:
+        return os.path.join(self.cache_dir, f"{commit}.json")
+
+    def _load(self, commit: str) -> bool:
+        try:
+            with open(self._cache_path(commit), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if data.get("format") != INDEX_FORMAT:
+            return False
+        paths = data["paths"]
+        definitions = {}
+        for name, qualname, kind, path, line_number in data["definitions"]:
+            definitions.setdefault(name, []).append(Symbol(name, qualname, kind, paths[path], line_number))
+        self._definitions = definitions
+        self._references = {name: [(paths[p], n) for p, n in refs]
+                            for name, refs in data["references"].items()}
+        return True
+
+    def _save(self, commit: str):
+        paths = sorted({s.path for defs in self._definitions.values() for s in defs}
+                       | {p for refs in self._references.values() for p, _ in refs})
+        ids = {p: i for i, p in enumerate(paths)}
+        data = {
+            "format": INDEX_FORMAT,
+            "paths": paths,
+            "definitions": [[s.name, s.qualname, s.kind, ids[s.path], s.line_number]
+                            for defs in self._definitions.values() for s in defs],
+            "references": {name: [[ids[p], n] for p, n in refs]
+                           for name, refs in self._references.items()},
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(commit)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _read(self, path: str) -> Optional[str]:
+        full_path = os.path.join(self.repo_dir, path)
+        try:
+            if os.path.getsize(full_path) > MAX_FILE_SZ:
+                return None
+            with open(full_path, "rb") as f:
+                data = f.read()
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            return None
+        return data.decode("utf-8", errors="replace")
+
+    def _index(self) -> bool:
+        """
+        Indexes the tracked files. Returns `False` if some supported files
+        were missing from the working copy (e.g. outside a sparse checkout).
+        """
+        files = self._git("ls-files", "-z").split("\0")[:-1]
+        complete = True
+        definitions = {}
+        uses = []
+        for path in files:
+            if os.path.splitext(path)[1] not in SUPPORTED_EXTENSIONS:
+                continue
+            text = self._read(path)
+            if text is None:
+                complete = complete and os.path.exists(os.path.join(self.repo_dir, path))
+                continue
+            defs, names = extract_symbols(path, text)
+            for symbol in defs:
+                definitions.setdefault(symbol.name, []).append(symbol)
+            uses.append((path, names))
+
+        # Only names defined in the repository are worth tracking
+        defined_at = {(s.path, s.line_number, s.name) for defs in definitions.values() for s in defs}
+        references = {}
+        for path, names in uses:
+            for name, line_number in names:
+                if name not in definitions or (path, line_number, name) in defined_at:
+                    continue
+                refs = references.setdefault(name, [])
+                if len(refs) < MAX_REFERENCES and (not refs or refs[-1] != (path, line_number)):
+                    refs.append((path, line_number))
+        for refs in references.values():
+            refs.sort()
+        self._definitions = definitions
+        self._references = references
+        return complete
+
+    def refresh(self):
+        """
+        Loads the index for the checked out commit, building and persisting it
+        if no other session has yet.
+        """
+        with self._lock:
+            if self._built:
+                return
+            try:
+                commit = self._git("rev-parse", "HEAD").strip()
+            except ErrorReturnCode:
+                commit = None
+            if commit is None or not self._load(commit):
+                complete = self._index()
+                if commit is not None and complete:
+                    self._save(commit)
+            self._built = True
+
+    def find(self, name: str, max_references: int=50) -> SymbolLookup:
+        """
+        Looks up the definitions and references of a symbol.
+
+        Args:
+            name (str): An unqualified (`fileqa`) or qualified (`Workspace.fileqa`) name.
+            max_references (int, optional): The maximum number of references to return.
+
+        Returns:
+            A `SymbolLookup`.
+        """
+        self.refresh()
+        short_name = name.rsplit(".", 1)[-1]
+        definitions = self._definitions.get(short_name, [])
+        if short_name != name:
+            definitions = [s for s in definitions
+                           if s.qualname == name or s.qualname.endswith("." + name)]
+        refs = self._references.get(short_name, [])
+
+        lines = {}
+        references = []
+        for path, line_number in refs[:max_references]:
+            if path not in lines:
+                text = self._read(path)
+                lines[path] = text.splitlines() if text is not None else []
+            file_lines = lines[path]
+            line = file_lines[line_number - 1].strip() if line_number <= len(file_lines) else ""
+            references.append(SymbolReference(path, line_number, line))
+        return SymbolLookup(definitions=sorted(definitions, key=lambda s: (s.path, s.line_number)),
+                            references=references,
+                            total_references=len(refs))
@@ -0,0 +1,252 @@
+"""
+Token counting and context budgets for the models that answer questions
+about files.
+
+Tokens are counted with tiktoken when it is installed and its encodings
+can be loaded, and estimated at about four characters per token
+otherwise. Files are cut into chunks sized in tokens to fill a model's
+context window, less its output limit and the prompt, and chunks end at
+code structure (the start of a top-level definition or block) where
+possible.
+"""
+
+
+# Standard lib
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+import itertools
+import re
+
+# Local
+from chaingpt.utils import config
+
+
+LLM_CONFIG = config.config["llm"]
+# "tiktoken" or "approximate"
+TOKENIZER = LLM_CONFIG.get("tokenizer", "tiktoken")
+DEFAULT_MODEL = LLM_CONFIG["file_qa_model"]
+
+# Tokens set aside for the prompt around a chunk: the instructions, the
+# question and, when refining, the running summary
+PROMPT_RESERVE = 1000
+# Chunks are never sized smaller than this, however small the model
+MIN_CHUNK_TOKENS = 256
+# Characters of a line without line breaks held in memory at once
+MAX_LINE_SZ = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    """
+    The token limits of a model.
+
+    context (int): The context window, prompt and output together.
+    output (int): The most tokens the model generates in one response.
+    """
+    context: int
+    output: int
+
+
+# Matched by the longest model name prefix
+MODEL_LIMITS: Dict[str, ModelLimits] = {
+    "gpt-3.5-turbo": ModelLimits(16385, 4096),
+    "gpt-3.5-turbo-0613": ModelLimits(4096, 4096),
+    "gpt-3.5-turbo-16k": ModelLimits(16385, 4096),
+    "gpt-4": ModelLimits(8192, 4096),
+    "gpt-4-32k": ModelLimits(32768, 4096),
+    "gpt-4-turbo": ModelLimits(128000, 4096),
+    "gpt-4-0125-preview": ModelLimits(128000, 4096),
+    "gpt-4-1106-preview": ModelLimits(128000, 4096),
+    "gpt-4-vision-preview": ModelLimits(128000, 4096),
+    "gpt-4o": ModelLimits(128000, 4096),
+    "gpt-4o-mini": ModelLimits(128000, 16384),
+}
+MODEL_LIMITS.update({name: ModelLimits(limits["context"], limits["output"])
+                     for name, limits in (LLM_CONFIG.get("models") or {}).items()})
+# Unknown models are assumed to be small
+DEFAULT_LIMITS = ModelLimits(4096, 1024)
+
+# Lines that continue the block before them rather than start a new one
+_CONTINUATION_RE = re.compile(r"[})\]]|(?:else|elif|except|finally|catch|end)\b")
+
+
+def model_limits(model: str=DEFAULT_MODEL) -> ModelLimits:
+    """
+    Returns the token limits of `model`, from `llm.models` in the config or
+    the built-in table.
+    """
+    matches = [name for name in MODEL_LIMITS if model.startswith(name)]
+    if not matches:
+        return DEFAULT_LIMITS
+    return MODEL_LIMITS[max(matches, key=len)]
+
+
+def chunk_budget(model: str=DEFAULT_MODEL, reserve: int=PROMPT_RESERVE) -> int:
+    """
+    Returns the tokens of file text that fit in a single prompt to `model`
+    next to a prompt of `reserve` tokens and a full-length response.
+    """
+    limits = model_limits(model)
+    return max(limits.context - limits.output - reserve, MIN_CHUNK_TOKENS)
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """
+    Returns the tiktoken encoding of `model`, or `None` if tiktoken is not
+    installed or its encodings cannot be loaded (they are downloaded on
+    first use).
+    """
+    if TOKENIZER != "tiktoken":
+        return None
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str=DEFAULT_MODEL) -> int:
+    """
+    Returns the number of tokens `model` sees in `text`.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _lines(texts: Iterable[str]) -> Iterator[str]:
+    """
+    Yields the lines of the concatenation of `texts`, with their line
+    breaks. Lines longer than `MAX_LINE_SZ` are yielded in pieces.
+    """
+    buffer = ""
+    for text in texts:
+        lines = (buffer + text).split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line + "\n"
+        while len(buffer) > MAX_LINE_SZ:
+            yield buffer[:MAX_LINE_SZ]
+            buffer = buffer[MAX_LINE_SZ:]
+    if buffer:
+        yield buffer
+
+
+def _indent(line: str) -> int:
+    line = line.expandtabs(4)
+    return len(line) - len(line.lstrip())
+
+
+def _cut_rank(line: str, previous: Optional[str]) -> Optional[int]:
+    """
+    Ranks a chunk boundary before `line`: the lower the rank, the closer to
+    the top level of the code. Returns `None` if `line` continues the block
+    before it.
+
+    A line starts a new block if it follows a blank line, or if it is less
+    indented than the line before it (e.g. a definition after the body of
+    the previous one).
+    """
+    if previous is None or not line.strip():
+        return None
+    if _CONTINUATION_RE.match(line.lstrip()):
+        return None
+    if not previous.strip() or _indent(line) < _indent(previous):
+        return _indent(line)
+    return None
+
+
+def split_tokens(texts: Iterable[str], max_tokens: int, overlap_tokens: int=0,
+                 model: str=DEFAULT_MODEL, count: Callable[[str], int]=None) -> Iterator[str]:
+    """
+    Lazily splits text into chunks of at most `max_tokens` tokens. Chunks are
+    cut in their second half at the start of the least indented block, so
+    they end between top-level functions and classes where possible. Chunks
+    cut inside a block share up to `overlap_tokens` tokens of whole lines with
+    the next chunk. Whitespace-only chunks are skipped.
+
+    Args:
+        texts (Iterable[str]): The text to split, in pieces of any size.
+        max_tokens (int): The most tokens per chunk.
+        overlap_tokens (int, optional): The most tokens shared by consecutive chunks.
+        model (str, optional): The model whose tokenizer counts the tokens.
+        count (Callable[[str], int], optional): Counts the tokens of a string
+            instead of `model`'s tokenizer.
+
+    Returns:
+        An iterator over the chunks.
+
+    Raises:
+        ValueError: If `overlap_tokens` is not less than half of `max_tokens`.
+    """
+    if not 0 <= overlap_tokens < max_tokens // 2:
+        raise ValueError("`overlap_tokens` must be less than half of `max_tokens`")
+    if count is None:
+        count = lambda text: count_tokens(text, model)
+
+    def pieces(line: str, n: int) -> Iterator[Tuple[str, int]]:
+        # Halves lines too long for a chunk until they fit
+        if n <= max_tokens or len(line) == 1:
+            yield line, n
+            return
+        half = len(line) // 2
+        for piece in (line[:half], line[half:]):
+            yield from pieces(piece, count(piece))
+
+    chunk: List[str] = []
+    counts: List[int] = []
+    total = 0
+    # (index in chunk, rank) of the places the chunk may be cut
+    cuts: List[Tuple[int, int]] = []
+    # Lines at the start of chunk repeated from the previous chunk
+    overlap = 0
+    previous = None
+
+    for line in _lines(texts):
+        rank = _cut_rank(line, previous)
+        previous = line
+        for piece, n in pieces(line, count(line)):
+            while chunk and total + n > max_tokens:
+                if len(chunk) == overlap:
+                    # The overlap leaves no room for the next line
+                    chunk, counts, cuts, overlap, total = [], [], [], 0, 0
+                    break
+                prefix = list(itertools.accumulate(counts))
+                eligible = [(r, i) for i, r in cuts if i > overlap and prefix[i - 1] >= max_tokens // 2]
+                if eligible:
+                    cut_rank, cut = min(eligible, key=lambda c: (c[0], -c[1]))
+                else:
+                    cut_rank, cut = None, len(chunk)
+                text = "".join(chunk[:cut])
+                if text.strip():
+                    yield text
+                # Chunks cut at the top level need no context from the one before
+                shared = shared_tokens = 0
+                if overlap_tokens and cut_rank != 0:
+                    while shared < cut and shared_tokens + counts[cut - shared - 1] <= overlap_tokens:
+                        shared_tokens += counts[cut - shared - 1]
+                        shared += 1
+                start = cut - shared
+                chunk, counts = chunk[start:], counts[start:]
+                cuts = [(i - start, r) for i, r in cuts if i > cut]
+                overlap = shared
+                total = sum(counts)
+            if rank is not None and chunk:
+                cuts.append((len(chunk), rank))
+            rank = None
+            chunk.append(piece)
+            counts.append(n)
+            total += n
+
+    text = "".join(chunk)
+    if len(chunk) > overlap and text.strip():
+        yield text
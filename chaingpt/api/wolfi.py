@@ -1,129 +1,712 @@
 # Standard lib
-from typing import List
+from typing import List, Optional, Tuple, Iterator, Dict, Callable
 import os
+import multiprocessing
 import shutil
+import json
+import threading
+import tarfile
+import http.client
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
 
 # 3rd party
 from whoosh.index import create_in, open_dir
-from whoosh.fields import Schema, TEXT
+from whoosh.fields import Schema, TEXT, ID, STORED
 from whoosh.qparser import QueryParser
 from whoosh.query import Or
-from sh import git
+from sh import git, ErrorReturnCode
 import yaml
 import tqdm
 
 # Local
+from chaingpt.api.catalog import WolfiCatalog, CatalogPackage
+from chaingpt.api.apkindex import open_apkindex, parse_apkindex, newest
+from chaingpt.api.resolver import DependencyResolver, WolfiResolution
 from chaingpt.utils import config
+from chaingpt.utils.cache import LRUCache
 
 
 GIT_TOKEN = config.config["secrets"]["github_personal_access_token"]
 OS_DIR = config.config["wolfi_database"]["os_dir"]
 OS_NAME = "wolfi-os"
+OS_URL = config.config["wolfi_database"].get("os_url", "https://github.com/wolfi-dev/os.git")
 
 INDEX_DIR = config.config["wolfi_database"]["index_dir"]
 INDEX_NAME = "wolfi-index"
+CATALOG_NAME = "wolfi-catalog.bin"
+
+# Where package data comes from: "git" indexes the melange recipes of a
+# wolfi-dev/os checkout, "apkindex" indexes the binary packages listed in
+# an APKINDEX.tar.gz (a URL or a local path).
+SOURCE_GIT = "git"
+SOURCE_APKINDEX = "apkindex"
+SOURCE = config.config["wolfi_database"].get("source", SOURCE_GIT)
+APKINDEX_URL = config.config["wolfi_database"].get(
+    "apkindex_url", "https://packages.wolfi.dev/os/x86_64/APKINDEX.tar.gz")
 
 REBUILD_AT_START = config.config["wolfi_database"]["rebuild_at_start"]
+INCREMENTAL_REFRESH = config.config["wolfi_database"].get("incremental_refresh", True)
+
+# Serve simple searches from the compact catalog snapshot instead of whoosh
+USE_CATALOG = config.config["wolfi_database"].get("use_catalog", True)
+CATALOG_MMAP = config.config["wolfi_database"].get("catalog_mmap", True)
+
+# Number of normalized keywords whose search results are kept in memory
+SEARCH_CACHE_SIZE = config.config["wolfi_database"].get("search_cache_size", 256)
+
+# Number of processes used to parse melange files during a full build
+BUILD_WORKERS = config.config["wolfi_database"].get("build_workers") or os.cpu_count() or 1
+
+# Smaller builds (e.g. incremental refreshes) are not worth a process pool
+PARALLEL_BUILD_MIN_FILES = 256
+
+# Prefer the libyaml based loader when pyyaml was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Written next to the whoosh index. Records which commit of the Wolfi
+# checkout the index reflects so a refresh only has to touch changed files.
+MANIFEST_NAME = "manifest.json"
+
+# Bump whenever the index schema changes. A manifest with a different
+# format forces a full rebuild instead of an incremental refresh.
+INDEX_FORMAT = 4
+
+
+# Query operators that must keep their case when normalizing keywords
+_QUERY_OPERATORS = {"AND", "OR", "NOT", "ANDNOT", "ANDMAYBE"}
+
+# Characters with a meaning in the whoosh query language
+_QUERY_SYNTAX = set('*?"\'()[]{}:^~')
 
 
-@dataclass
+@dataclass(frozen=True)
 class WolfiPackageResult:
     name: str
     description: str
+    version: str = ""
+
+
+def _package_block(text: str) -> Optional[str]:
+    """
+    Returns the top-level `package:` mapping of a melange file as YAML text
+    so it can be parsed without the (much larger) pipeline and test sections.
+    Returns `None` if the file has no `package:` section.
+    """
+    lines = text.splitlines(keepends=True)
+    for start, line in enumerate(lines):
+        if line.startswith("package:"):
+            break
+    else:
+        return None
+
+    end = start + 1
+    while end < len(lines):
+        line = lines[end]
+        # The block ends at the next top-level key or document marker
+        if line[:1] not in ("", " ", "\t", "\n", "\r", "#"):
+            break
+        end += 1
+    return "".join(lines[start:end])
+
+
+def _parse_package_file(file_path: str) -> Optional[CatalogPackage]:
+    """
+    Reads a melange YAML file and returns its package.
+    Returns `None` if the file does not describe a package.
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    # TODO: Why do some YAMLs not have a package section ?!
+    block = _package_block(text)
+    if block is None:
+        return None
+    try:
+        data = yaml.load(block, Loader=_YAML_LOADER)
+    except yaml.YAMLError:
+        # The package section refers to something outside of itself
+        # (e.g. an anchor). Fall back to parsing the whole file.
+        data = yaml.load(text, Loader=_YAML_LOADER)
+
+    if not isinstance(data, dict) or not isinstance(data.get("package"), dict):
+        return None
+
+    # TODO: Gracefully handle missing fields
+    package = data["package"]
+    try:
+        name, desc = package["name"], package["description"]
+    except KeyError:
+        return None
+
+    version = ""
+    if package.get("version") is not None:
+        version = f"{package['version']}-r{package.get('epoch', 0)}"
+
+    # melange only lists explicit runtime dependencies. Shared library
+    # dependencies are discovered at build time and are only in the APKINDEX.
+    dependencies = package.get("dependencies") or {}
+    return CatalogPackage(name=str(name), description=str(desc), version=version,
+                          provides=tuple(str(d) for d in dependencies.get("provides") or ()),
+                          depends=tuple(str(d) for d in dependencies.get("runtime") or ()))
+
+
+def _parse_package_files(file_paths: List[str],
+                         workers: int=BUILD_WORKERS) -> Iterator[Optional[CatalogPackage]]:
+    """
+    Parses `file_paths` with `_parse_package_file` across a pool of `workers`
+    processes. Results are yielded in the order of `file_paths` as they become
+    available so the caller can stream them into a single index writer.
+
+    Workers are spawned rather than forked: the index is usually built from
+    `BackgroundWolfiClient`'s thread, and forking a threaded process can
+    deadlock the child on a lock held by another thread.
+    """
+    if workers <= 1 or len(file_paths) < PARALLEL_BUILD_MIN_FILES:
+        for file_path in file_paths:
+            yield _parse_package_file(file_path)
+        return
+
+    chunksize = max(1, len(file_paths) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from pool.map(_parse_package_file, file_paths, chunksize=chunksize)
+
+
+def _normalize_keyword(keyword: str) -> str:
+    """
+    Normalizes whitespace and case in `keyword` so equivalent searches
+    share a cache entry. Query operators are left untouched.
+    """
+    return " ".join(t if t in _QUERY_OPERATORS else t.lower()
+                    for t in keyword.split())
+
+
+def _is_simple_query(keyword: str) -> bool:
+    """
+    Returns `True` if `keyword` uses no whoosh query syntax and can be
+    answered from the catalog.
+    """
+    if any(c in _QUERY_SYNTAX for c in keyword):
+        return False
+    return not any(t in _QUERY_OPERATORS for t in keyword.split())
+
+
+def _document(file_name: str, package: CatalogPackage) -> dict:
+    """
+    Returns the whoosh document fields for `package`.
+    """
+    return {
+        "file_name": file_name,
+        "package_name": package.name,
+        "package_desc": package.description,
+        "package_version": package.version,
+        "package_provides": package.provides,
+        "package_depends": package.depends,
+        "package_size": package.installed_size
+    }
+
+
+def _document_package(doc: dict) -> CatalogPackage:
+    """
+    Returns the package stored in a whoosh document.
+    """
+    return CatalogPackage(name=doc["package_name"],
+                          description=doc.get("package_desc", ""),
+                          version=doc.get("package_version", ""),
+                          provides=tuple(doc.get("package_provides", ())),
+                          depends=tuple(doc.get("package_depends", ())),
+                          installed_size=doc.get("package_size", 0))
+
+
+def _is_package_file(name: str) -> bool:
+    """
+    Returns `True` if `name` is a top-level melange file of the Wolfi checkout.
+    """
+    return name.endswith(".yaml") and "/" not in name
 
 
 class WolfiClient:
-    def __init__(self):
-        self.os_path = os.path.join(OS_DIR, OS_NAME)
-        self.index_path = os.path.join(INDEX_DIR, INDEX_NAME)
-        
-        if REBUILD_AT_START \
-                or (not os.path.exists(self.os_path)) \
+    def __init__(self, os_path: str=None, index_path: str=None,
+                 os_url: str=OS_URL, rebuild: bool=REBUILD_AT_START,
+                 incremental: bool=INCREMENTAL_REFRESH,
+                 cache_size: int=SEARCH_CACHE_SIZE,
+                 catalog_path: str=None, use_catalog: bool=USE_CATALOG,
+                 source: str=SOURCE, apkindex_url: str=APKINDEX_URL,
+                 progress: Callable[[float], None]=None):
+        if source not in (SOURCE_GIT, SOURCE_APKINDEX):
+            raise ValueError(f"Unknown Wolfi source {source}. Expected {SOURCE_GIT} or {SOURCE_APKINDEX}.")
+        self.source = source
+        self.apkindex_url = apkindex_url
+        # Reports build progress from 0 to 1. Replaces the tqdm progress bar.
+        self._progress = progress
+        self.os_path = os_path or os.path.join(OS_DIR, OS_NAME)
+        self.index_path = index_path or os.path.join(INDEX_DIR, INDEX_NAME)
+        self.catalog_path = catalog_path or os.path.join(os.path.dirname(self.index_path),
+                                                         CATALOG_NAME)
+        self.os_url = os_url
+
+        self._index = None
+        self._resolver = None
+        self._parsers = None
+        self._searcher = None
+        self._search_lock = threading.Lock()
+        self._cache = LRUCache(cache_size)
+
+        if (self.source == SOURCE_GIT and not os.path.exists(self.os_path)) \
                 or (not os.path.exists(self.index_path)):
             self._init_index()
-        else:
-            self.index = open_dir(self.index_path)
-    
+        elif rebuild and incremental:
+            self._refresh_index()
+        elif rebuild:
+            self._init_index()
+
+        self.catalog = self._load_catalog() if use_catalog else None
+
+    @property
+    def index(self):
+        """
+        The whoosh index. It is only opened when a search needs it.
+        """
+        if self._index is None:
+            self._index = open_dir(self.index_path)
+        return self._index
+
+    def _load_catalog(self) -> WolfiCatalog:
+        """
+        Loads the catalog snapshot, writing it from the index first if
+        it is missing or unreadable.
+        """
+        try:
+            return WolfiCatalog.load(self.catalog_path, use_mmap=CATALOG_MMAP)
+        except (FileNotFoundError, ValueError):
+            self._write_catalog()
+            return WolfiCatalog.load(self.catalog_path, use_mmap=CATALOG_MMAP)
+
+    def _write_catalog(self):
+        """
+        Writes a catalog snapshot of every package in the index.
+        """
+        with self.index.searcher() as searcher:
+            packages = [_document_package(d) for d in searcher.documents()]
+        WolfiCatalog.write(self.catalog_path, packages)
+
+    def _head(self) -> str:
+        """
+        Returns the commit SHA checked out in the Wolfi checkout.
+        """
+        return str(git("-C", self.os_path, "rev-parse", "HEAD", _tty_out=False)).strip()
+
+    def _read_manifest(self) -> Optional[dict]:
+        """
+        Returns the index manifest or `None` if it is missing, unreadable
+        or was written for a different index format.
+        """
+        path = os.path.join(self.index_path, MANIFEST_NAME)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get("format") != INDEX_FORMAT \
+                or manifest.get("source", SOURCE_GIT) != self.source:
+            return None
+        return manifest
+
+    def _write_manifest(self, head: str):
+        """
+        Records the indexed `head`: a commit SHA for the git source or the
+        validator of the downloaded index for the APKINDEX source.
+        """
+        path = os.path.join(self.index_path, MANIFEST_NAME)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"format": INDEX_FORMAT, "source": self.source, "head": head}, f)
+
+    def _track(self, iterable, total: Optional[int], desc: str):
+        """
+        Wraps `iterable` in a tqdm progress bar unless progress is
+        reported through a callback.
+        """
+        if self._progress is not None:
+            return iterable
+        return tqdm.tqdm(iterable, total=total, desc=desc)
+
+    def _report(self, fraction: float):
+        if self._progress is not None:
+            self._progress(fraction)
+
+    def _create_index(self):
+        """
+        Replaces the whoosh index with an empty one and returns a writer for it.
+        """
+        if os.path.exists(self.index_path):
+            shutil.rmtree(self.index_path)
+        os.makedirs(self.index_path)
+
+        schema = Schema(file_name=ID(stored=True, unique=True),
+                        package_name=TEXT(stored=True),
+                        package_desc=TEXT(stored=True),
+                        package_version=STORED,
+                        package_provides=STORED,
+                        package_depends=STORED,
+                        package_size=STORED)
+
+        self._index = create_in(self.index_path, schema)
+        return self.index.writer()
+
     def _init_index(self):
         """
         Initialize the whoosh index with all of Wolfi.
         """
-        # TODO: Extract clone and index functionality and write tests
+        if self.source == SOURCE_APKINDEX:
+            self._init_apkindex_index()
+            return
 
         # Clone Wolfi
         if os.path.exists(self.os_path):
             shutil.rmtree(self.os_path)
-        git.clone("https://github.com/wolfi-dev/os.git", self.os_path)
-        
+        git.clone(self.os_url, self.os_path)
+
         # Build index
-        if os.path.exists(self.index_path):
-            shutil.rmtree(self.index_path)
-        os.makedirs(self.index_path)
+        writer = self._create_index()
 
-        schema = Schema(package_name=TEXT(stored=True), package_desc=TEXT(stored=True))
+        # Parse all Wolfi files in parallel and stream them into the index
+        file_names = [n for n in os.listdir(self.os_path) if _is_package_file(n)]
+        file_paths = [os.path.join(self.os_path, n) for n in file_names]
+        packages = _parse_package_files(file_paths)
+        for i, (name, package) in enumerate(self._track(zip(file_names, packages), len(file_names),
+                                                        "Building local Wolfi package index")):
+            self._report(i / max(1, len(file_names)))
+            if package is None:
+                continue
+            writer.add_document(**_document(name, package))
+        writer.commit()
+        self._write_manifest(self._head())
+        self._write_catalog()
 
-        self.index = create_in(self.index_path, schema)
-        writer = self.index.writer()
+    def _init_apkindex_index(self):
+        """
+        Initialize the whoosh index with the newest version of every binary
+        package listed in the APKINDEX. The index is streamed straight from
+        its source; nothing but the whoosh index and catalog is written to disk.
+        """
+        packages, validator = self._read_apkindex(open_apkindex(self.apkindex_url))
+        self._write_apkindex_index(packages, validator)
 
-        # Loop through all Wolfi files and add them to the index
-        # TODO: Ugly code. Take out default use of tqdm
-        file_names = os.listdir(self.os_path)
-        for name in tqdm.tqdm(file_names, desc="Building local Wolfi package index"):
-            if name.endswith(".yaml"):
-                file_path = os.path.join(self.os_path, name)
-                with open(file_path, "r", encoding="utf-8") as f:
-                    data = yaml.safe_load(f)
-
-                    # TODO: Why do some YAMLs not have a package section ?!
-                    if "package" not in data.keys():
-                        continue
-                    
-                    # TODO: Gracefully handle missing fields
-                    try:
-                        package_name = data["package"]["name"]
-                        package_desc = data["package"]["description"]
-                    except KeyError:
-                        continue
-
-                    writer.add_document(package_name=package_name, package_desc=package_desc)
+    def _read_apkindex(self, opened: Tuple) -> Tuple[List[CatalogPackage], str]:
+        """
+        Reads the newest version of every package from an opened APKINDEX.
+        The whole index is parsed before returning, so a failed download
+        never leaves a partially written index behind.
+
+        Args:
+            opened (Tuple): A `(fileobj, validator)` tuple from `open_apkindex`.
+
+        Returns:
+            A `(packages, validator)` tuple.
+        """
+        stream, validator = opened
+        with stream:
+            records = self._track(parse_apkindex(stream), None, "Reading Wolfi APKINDEX")
+            packages = newest(records)
+        return packages, validator
+
+    def _write_apkindex_index(self, packages: List[CatalogPackage], validator: str):
+        """
+        Replaces the whoosh index and catalog with `packages`.
+        """
+        writer = self._create_index()
+        for package in packages:
+            writer.add_document(**_document(package.name, package))
         writer.commit()
+        self._write_manifest(validator)
+        self._write_catalog()
+
+    def _refresh_apkindex_index(self, manifest: dict):
+        """
+        Rebuilds the index if the APKINDEX changed since it was indexed.
+        """
+        try:
+            opened = open_apkindex(self.apkindex_url, validator=manifest["head"])
+            if opened is None:
+                return
+            packages, validator = self._read_apkindex(opened)
+        except (ValueError, OSError, EOFError, tarfile.TarError, http.client.HTTPException):
+            # Offline, the server is unavailable or the download was cut
+            # short. Keep the existing index.
+            return
+        self._write_apkindex_index(packages, validator)
+
+    def _refresh_index(self):
+        """
+        Fetches the latest Wolfi commit into the existing checkout and
+        only reindexes the melange files that were added, modified or
+        deleted since the commit recorded in the index manifest. Falls
+        back to a full rebuild when the manifest or the old commit is
+        unusable. For the APKINDEX source, the index is only rebuilt if
+        the APKINDEX changed.
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            self._init_index()
+            return
+        if self.source == SOURCE_APKINDEX:
+            self._refresh_apkindex_index(manifest)
+            return
+
+        old_head = manifest["head"]
+        try:
+            git("-C", self.os_path, "fetch", "--quiet", "origin", "HEAD")
+            git("-C", self.os_path, "reset", "--quiet", "--hard", "FETCH_HEAD")
+        except ErrorReturnCode:
+            # Offline or the remote is unavailable. The existing index is
+            # still valid for the checkout it was built from.
+            return
+
+        new_head = self._head()
+        if new_head == old_head:
+            return
+
+        try:
+            diff = str(git("-C", self.os_path, "diff", "--name-status",
+                           "--no-renames", old_head, new_head, _tty_out=False))
+        except ErrorReturnCode:
+            # The old commit is no longer reachable (e.g. a force push)
+            self._init_index()
+            return
+
+        writer = self.index.writer()
+        for line in diff.splitlines():
+            if not line.strip():
+                continue
+            status, name = line.split("\t", 1)
+            if not _is_package_file(name):
+                continue
+            package = None
+            if status != "D":
+                package = _parse_package_file(os.path.join(self.os_path, name))
+            if package is None:
+                writer.delete_by_term("file_name", name)
+                continue
+            writer.update_document(**_document(name, package))
+        writer.commit()
+        self._write_manifest(new_head)
+        self._write_catalog()
+
+    def _get_searcher(self):
+        """
+        Returns the long-lived searcher, reopening it only if the index
+        changed since it was opened. Cached results are dropped whenever
+        the searcher is refreshed.
+        """
+        if self._searcher is None:
+            self._searcher = self.index.searcher()
+            self._parsers = (QueryParser("package_name", self.index.schema),
+                             QueryParser("package_desc", self.index.schema))
+        elif not self._searcher.up_to_date():
+            self._searcher = self._searcher.refresh()
+            self._cache.clear()
+        return self._searcher
 
     def search(self, keyword) -> List[WolfiPackageResult]:
         """
-        Searches Wolfi for package names matching `keyword`.
+        Searches Wolfi for package names matching `keyword`. Simple keywords
+        are answered from the catalog snapshot; keywords using the whoosh
+        query language fall back to the index. Results for recently searched
+        keywords are served from an in-memory cache.
 
         Args:
             keyword: The keyword to search package names for.
-        
+
             Returns: A `List` of `WolfiPackageResult` objects.
-        
+
         Raises:
             TypeError: If keyword is not a `str`.
-
-
-        1) Clone wolfi
-        2) Index search files
-        3) perform the search
         """
         if not isinstance(keyword, str):
             raise TypeError("`keyword` must be a `str`.")
-        
-        with self.index.searcher() as searcher:
-            name_query = QueryParser("package_name", self.index.schema).parse(keyword)
-            desc_query = QueryParser("package_desc", self.index.schema).parse(keyword)
-            combined_query = Or([name_query, desc_query])
+
+        key = _normalize_keyword(keyword)
+        if self.catalog is not None and _is_simple_query(key):
+            cached = self._cache.get(key)
+            if cached is None:
+                cached = tuple(WolfiPackageResult(p.name, p.description, p.version)
+                               for p in self.catalog.search(key))
+                self._cache.put(key, cached)
+            return list(cached)
+
+        with self._search_lock:
+            searcher = self._get_searcher()
+            cached = self._cache.get(key)
+            if cached is not None:
+                return list(cached)
+
+            name_parser, desc_parser = self._parsers
+            combined_query = Or([name_parser.parse(key), desc_parser.parse(key)])
 
             # Perform the search
             results = searcher.search(combined_query)
-            
+
             output = []
             for r in results:
                 name = r["package_name"]
                 # TODO: Why aren't these keys guaranteed to be present in the result?
-                if "package_desc" in r.keys():
-                    desc = r["package_desc"]
-                else:
-                    desc = ""
-                output.append(WolfiPackageResult(name, desc))
+                desc = r.get("package_desc", "")
+                output.append(WolfiPackageResult(name, desc, r.get("package_version", "")))
+            self._cache.put(key, tuple(output))
             return output
+
+    def suggest(self, keyword, limit: int=10) -> List[WolfiPackageResult]:
+        """
+        Returns package names that nearly match `keyword`, for keywords
+        with typos or missing separators (e.g. `pyhton3`, `nodejs20`).
+        Closest matches come first and, among equally close names, newer
+        versions come first. Requires the catalog.
+
+        Args:
+            keyword: The possibly misspelled package name.
+            limit (int, optional): The maximum number of suggestions.
+
+        Returns:
+            A `List` of `WolfiPackageResult` objects.
+
+        Raises:
+            TypeError: If keyword is not a `str`.
+        """
+        if not isinstance(keyword, str):
+            raise TypeError("`keyword` must be a `str`.")
+        if self.catalog is None:
+            return []
+        return [WolfiPackageResult(p.name, p.description, p.version)
+                for p, _ in self.catalog.fuzzy(keyword, limit=limit)]
+
+    def _packages(self) -> List[CatalogPackage]:
+        """
+        Returns every indexed package, from the catalog if it is loaded.
+        """
+        if self.catalog is not None:
+            return list(self.catalog.packages())
+        with self.index.searcher() as searcher:
+            return [_document_package(d) for d in searcher.documents()]
+
+    def resolve(self, deps: List[str]) -> WolfiResolution:
+        """
+        Resolves `deps` to every package `apk add` would install, following
+        runtime dependencies and provided names (e.g. `so:libc.so.6`)
+        transitively. Use it to validate dependencies before starting a container.
+        Dependency data is most complete with the APKINDEX source.
+
+        Args:
+            deps (List[str]): The package names to resolve.
+
+        Returns:
+            A `WolfiResolution` with the install set, its total installed size
+            (if known) and any names that could not be resolved.
+
+        Raises:
+            TypeError: If `deps` is not a `List` of `str`.
+        """
+        if not isinstance(deps, list) or not all(isinstance(d, str) for d in deps):
+            raise TypeError("`deps` must be a `List` of `str`.")
+        if self._resolver is None:
+            self._resolver = DependencyResolver(self._packages())
+        return self._resolver.resolve(deps)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        Returns the hit/miss counters and size of the search result cache.
+        """
+        return self._cache.stats()
+
+    def close(self):
+        """
+        Closes the long-lived searcher and the catalog.
+        """
+        with self._search_lock:
+            if self._searcher is not None:
+                self._searcher.close()
+                self._searcher = None
+            if self.catalog is not None:
+                self.catalog.close()
+                self.catalog = None
+
+
+class BackgroundWolfiClient:
+    """
+    Builds or loads a `WolfiClient` on a background thread so the CLI
+    does not wait for the Wolfi index before the first prompt. Until the
+    client is ready, searches can be answered from the catalog snapshot
+    left behind by a previous run.
+
+    Accepts the same keyword arguments as `WolfiClient`.
+    """
+    def __init__(self, **kwargs):
+        self.progress = 0.0
+        self._client = None
+        self._error = None
+        self._ready = threading.Event()
+        self._snapshot = self._load_snapshot(kwargs)
+
+        self._thread = threading.Thread(target=self._build, kwargs=kwargs,
+                                        name="wolfi-index", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _load_snapshot(kwargs: dict) -> Optional[WolfiCatalog]:
+        """
+        Loads the catalog written by a previous run, if any. The background
+        build replaces the file atomically, so the mapping stays valid.
+        """
+        if not kwargs.get("use_catalog", USE_CATALOG):
+            return None
+        index_path = kwargs.get("index_path") or os.path.join(INDEX_DIR, INDEX_NAME)
+        catalog_path = kwargs.get("catalog_path") or os.path.join(os.path.dirname(index_path),
+                                                                  CATALOG_NAME)
+        try:
+            return WolfiCatalog.load(catalog_path, use_mmap=CATALOG_MMAP)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _set_progress(self, fraction: float):
+        self.progress = fraction
+
+    def _build(self, **kwargs):
+        try:
+            self._client = WolfiClient(progress=self._set_progress, **kwargs)
+            self.progress = 1.0
+        except Exception as e:
+            self._error = e
+        finally:
+            self._ready.set()
+
+    def ready(self) -> bool:
+        """
+        Returns `True` once the client finished building or loading.
+        """
+        return self._ready.is_set()
+
+    def get(self, timeout: float=None) -> Optional[WolfiClient]:
+        """
+        Waits up to `timeout` seconds (forever if `None`) for the client.
+
+        Returns:
+            The `WolfiClient`, or `None` if it is not ready yet.
+
+        Raises:
+            Exception: Whatever error the background build raised.
+        """
+        if not self._ready.wait(timeout):
+            return None
+        if self._error is not None:
+            raise self._error
+        return self._client
+
+    def search_snapshot(self, keyword: str) -> List[WolfiPackageResult]:
+        """
+        Searches the catalog from the previous run. Returns an empty
+        `List` if there is no snapshot.
+        """
+        if self._snapshot is None:
+            return []
+        return [WolfiPackageResult(p.name, p.description, p.version)
+                for p in self._snapshot.search(_normalize_keyword(keyword))]
@@ -1,20 +1,56 @@
 # Standard lib
-from typing import List, Tuple
+from typing import List, Tuple, Optional, Iterator, Callable
 import uuid
 import os
-import glob
+import re
+import shutil
+import weakref
+import threading
+import itertools
 
 # 3rd party
-from sh import git, ErrorReturnCode_128
+from sh import git, ErrorReturnCode
 
 # Local
-from chaingpt.api.llm import text_qa, text_qa_map_reduce, LLMResponse
+from chaingpt.api.llm import text_qa_excerpts, text_qa_digest, text_qa_tree, \
+    LLMResponse, QAEngine, LLM_MODEL, PROMPT_VERSION, MAP_REDUCE_MODE, MAP_REDUCE_FAN_IN
+from chaingpt.api import answer_cache
+from chaingpt.api import llm_cache
+from chaingpt.api import digest
+from chaingpt.api import fanout
+from chaingpt.api import retrieval
+from chaingpt.api.file_reader import FileReader
+from chaingpt.api.tokens import chunk_budget
+from chaingpt.api.repo_cache import RepositoryCache, CacheLease, CACHE_ENABLED, default_cache
+from chaingpt.api.path_index import PathIndex
+from chaingpt.api.grep_index import GrepIndex, GrepMatch
+from chaingpt.api.overview import RepoOverview, OVERVIEW_ENABLED, OVERVIEW_CACHE_DIR
+from chaingpt.api.symbol_index import SymbolIndex, SymbolLookup
 from chaingpt.utils import config
 
 
 MAX_FILE_SZ = config.config["llm"]["max_file_sz"]
+# Characters per chunk ranked by retrieval
 MAP_REDUCE_CHUNK_SZ = config.config["llm"]["map_reduce"]["chunk_sz"]
 MAP_REDUCE_CHUNK_OVERLAP = config.config["llm"]["map_reduce"]["chunk_overlap"]
+# Tokens per chunk sent to the LLM. Files that fit in one chunk are answered in a single call.
+MAP_REDUCE_CHUNK_TOKENS = config.config["llm"]["map_reduce"].get("chunk_tokens") or chunk_budget(LLM_MODEL)
+MAP_REDUCE_CHUNK_OVERLAP_TOKENS = config.config["llm"]["map_reduce"].get("chunk_overlap_tokens", 200)
+# Files longer than MAX_FILE_SZ are analyzed whole in a tree of notes instead of truncated
+HIERARCHICAL_CONFIG = config.config["llm"].get("hierarchical") or {}
+HIERARCHICAL_ENABLED = HIERARCHICAL_CONFIG.get("enabled", True)
+HIERARCHICAL_FAN_IN = HIERARCHICAL_CONFIG.get("fan_in", 8)
+HIERARCHICAL_TOKEN_BUDGET = HIERARCHICAL_CONFIG.get("token_budget", 200000)
+
+# Clone strategies for very large repositories
+CLONE_DEPTH = config.config["github_repository_cache"].get("clone_depth")
+CLONE_FILTER = config.config["github_repository_cache"].get("clone_filter")
+SPARSE_PATHS = config.config["github_repository_cache"].get("sparse_paths") or []
+
+WORKSPACE_CONFIG = config.config.get("workspace") or {}
+SEARCH_CACHE_SIZE = WORKSPACE_CONFIG.get("search_cache_size", 64)
+GREP_MAX_FILE_SZ = WORKSPACE_CONFIG.get("grep_max_file_sz", 1024 * 1024)
+GREP_MAX_RESULTS = WORKSPACE_CONFIG.get("grep_max_results", 50)
 
 
 def _random_parent_dir(prefix: str="/tmp") -> str:
@@ -52,12 +88,131 @@ def _repo_name(url: str) -> str:
     return repo
 
 
+def _fileqa_settings() -> dict:
+    """
+    Returns every setting besides the file and question that affects a `fileqa` answer.
+    """
+    return {
+        "model": LLM_MODEL,
+        "prompt_version": PROMPT_VERSION,
+        "max_file_sz": MAX_FILE_SZ,
+        "chunk_sz": MAP_REDUCE_CHUNK_SZ,
+        "chunk_overlap": MAP_REDUCE_CHUNK_OVERLAP,
+        "chunk_tokens": [MAP_REDUCE_CHUNK_TOKENS, MAP_REDUCE_CHUNK_OVERLAP_TOKENS],
+        "map_reduce": [MAP_REDUCE_MODE, MAP_REDUCE_FAN_IN],
+        "prefilter": _scan_prefilter().settings() if _scan_prefilter() else None,
+        "retrieval": [retrieval.RETRIEVAL_ENABLED, retrieval.TOP_K, retrieval.NEIGHBORS,
+                      retrieval.TOKEN_BUDGET, retrieval.MIN_SCORE],
+        "digest": digest.DIGEST_ENABLED,
+        "hierarchical": [HIERARCHICAL_ENABLED, HIERARCHICAL_FAN_IN, HIERARCHICAL_TOKEN_BUDGET],
+    }
+
+
+def _scan_prefilter() -> Optional[retrieval.ChunkPrefilter]:
+    """
+    Returns the prefilter applied when every chunk of a file is scanned. When
+    retrieval is enabled the scan is its fallback for questions no chunk
+    matched, so it keeps every chunk: the prefilter would judge them by the
+    same lexical signal.
+    """
+    return None if retrieval.RETRIEVAL_ENABLED else retrieval.PREFILTER
+
+
+def _refresh_in_background(index):
+    """
+    Builds `index` on a daemon thread. Errors are ignored here: the index
+    is refreshed again when it is first queried, which raises them.
+    """
+    def refresh():
+        try:
+            index.refresh()
+        except Exception:
+            pass
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def _cleanup(parent_dir: str, lease: Optional[CacheLease]):
+    """
+    Removes a workspace directory and releases its hold on the clone cache.
+    """
+    shutil.rmtree(parent_dir, ignore_errors=True)
+    if lease is not None:
+        lease.release()
+
+
 class Workspace():
-    def __init__(self, url: str):
+    def __init__(self, url: str, cache: RepositoryCache=None, depth: int=CLONE_DEPTH,
+                 blob_filter: str=CLONE_FILTER, sparse_paths: List[str]=SPARSE_PATHS,
+                 answers: answer_cache.AnswerCache=None, digests: digest.DigestStore=None,
+                 overview: bool=OVERVIEW_ENABLED):
+        """
+        Clones `url` into a new workspace directory.
+
+        When LLM responses are recorded or replayed (`llm.response_cache.mode`),
+        the default answer cache, digest store and saved overviews are not used,
+        so every LLM call of the session is made and recorded.
+
+        Args:
+            url (str): The repository URL.
+            cache (RepositoryCache, optional): The clone cache to create the
+                workspace from. Defaults to the cache configured by
+                `github_repository_cache`, unless it is disabled.
+            depth (int, optional): Only clone the latest `depth` commits.
+            blob_filter (str, optional): A partial clone filter such as `blob:none`.
+                Filtered blobs are fetched from the remote when they are needed.
+            sparse_paths (List[str], optional): Only check out paths matching these
+                gitignore-style patterns. Other tracked files are still found by
+                `search` and are checked out when they are read.
+            answers (AnswerCache, optional): The cache of `fileqa` answers. Defaults
+                to the cache configured by `llm.answer_cache`, unless it is disabled.
+            digests (DigestStore, optional): The store of large file digests. Defaults
+                to the store configured by `llm.digest`, unless digests are disabled.
+            overview (bool, optional): Whether to summarize the repository's directories
+                in the background after cloning. See `repo_overview`.
+
+        Raises:
+            ValueError: If the repository cannot be cloned.
+        """
         self.url = url
+        self.depth = depth
+        self.blob_filter = blob_filter
+        self.sparse_paths = list(sparse_paths or [])
+        if cache is None and CACHE_ENABLED:
+            cache = default_cache()
+        # Mirrors hold the full history, so shallow and partial clones
+        # go straight to the remote
+        self._cache = cache if not (depth or blob_filter) else None
+        self._lease = None
+        recorded = llm_cache.recording()
+        if answers is None and not recorded:
+            answers = answer_cache.default_cache()
+        if digests is None and not recorded:
+            digests = digest.default_store()
+        self.answers = answers
+        self.digests = digests
+        self._pending_digests = set()
+        self._digest_lock = threading.Lock()
+        # Files are checked out one at a time when analyzed concurrently
+        self._checkout_lock = threading.Lock()
         self.parent_dir = _random_parent_dir()
         os.makedirs(self.parent_dir, exist_ok=False)
-        self._clone(url)
+        try:
+            self._clone(url)
+        except ValueError:
+            shutil.rmtree(self.parent_dir, ignore_errors=True)
+            raise
+        self._finalizer = weakref.finalize(self, _cleanup, self.parent_dir, self._lease)
+        self.paths = PathIndex(self.repo_dir, cache_size=SEARCH_CACHE_SIZE)
+        self.paths.refresh()
+        # Build the content and symbol indexes while the agent gets started
+        self.grep_index = GrepIndex(self.paths, max_file_sz=GREP_MAX_FILE_SZ)
+        self.symbols = SymbolIndex(self.repo_dir)
+        _refresh_in_background(self.grep_index)
+        _refresh_in_background(self.symbols)
+        self.overview = RepoOverview(self.repo_dir, self.paths,
+                                     cache_dir=None if recorded else OVERVIEW_CACHE_DIR)
+        if overview:
+            self.overview.start()
 
     def _clone(self, url: str):
         """
@@ -66,31 +221,155 @@ class Workspace():
         """
         _validate_git_url(url)
         self.repo_dir = os.path.join(self.parent_dir, _repo_name(url))
+        clone_args = []
+        if self.depth:
+            clone_args += ["--depth", str(self.depth)]
+        if self.blob_filter:
+            clone_args += [f"--filter={self.blob_filter}"]
+        if self.sparse_paths:
+            clone_args += ["--no-checkout"]
         try:
-            git.clone(url, self.repo_dir)
-        except ErrorReturnCode_128:
+            if self._cache is not None:
+                self._lease = self._cache.checkout(url, self.repo_dir, clone_args)
+            else:
+                git.clone(*clone_args, url, self.repo_dir)
+            if self.sparse_paths:
+                self._git("sparse-checkout", "set", "--no-cone", *self.sparse_paths)
+                self._git("checkout", "--quiet")
+        except ErrorReturnCode:
             raise ValueError(f"Error cloning {url}. Is the URL valid?")
 
+    def _git(self, *args) -> str:
+        """
+        Runs a git command in the repository and returns its output.
+        """
+        return str(git("-C", self.repo_dir, *args, _tty_out=False))
+
+    def _ensure_present(self, file_path: str):
+        """
+        Checks out `file_path` if it is tracked but outside the sparse
+        checkout. With a partial clone, git fetches the blob on demand.
+        """
+        if not self.sparse_paths or os.path.lexists(os.path.join(self.repo_dir, file_path)):
+            return
+        path = os.path.normpath(file_path)
+        self.paths.refresh()
+        if path not in self.paths or self.paths.is_dir(path):
+            return
+        pattern = "/" + re.sub(r"([\\*?\[!#])", r"\\\1", path)
+        with self._checkout_lock:
+            try:
+                self._git("sparse-checkout", "add", pattern)
+            except ErrorReturnCode as e:
+                raise ValueError(f"Error checking out {file_path}: {e.stderr.decode(errors='replace')}")
+
+    def close(self):
+        """
+        Deletes the workspace directory. The workspace is closed automatically
+        when it is garbage collected or the interpreter exits.
+        """
+        self._finalizer()
+
+    def _open(self, file_path: str, max_chars: int=None) -> FileReader:
+        """
+        Opens `file_path` for reading. The `file_path` is relative to the
+        top-level directory of the repository.
+        """
+        self._ensure_present(file_path)
+        return FileReader(os.path.join(self.repo_dir, file_path), max_chars=max_chars)
+
     def _read_n(self, n: int, file_path: str) -> str:
         """
         Reads `n` characters from `file_path`. The `file_path`
         is relative to the top-level directory of the repository.
         """
-        full_path = os.path.join(self.repo_dir, file_path)
-        with open(full_path, encoding="utf-8") as f:
-            return f.read(n)
+        return self._open(file_path, max_chars=n).read()
+
+    def blob_sha(self, file_path: str) -> str:
+        """
+        Returns the git blob SHA of the current contents of `file_path`,
+        which identifies them without asking git.
+        """
+        return self._open(file_path).blob_sha()
 
-    def fileqa(self, question: str, file_path: str) -> LLMResponse:
+    def _relevant_chunks(self, question: str, reader: FileReader) -> Optional[List[str]]:
+        """
+        Returns the chunks of the file most relevant to `question`, or `None`
+        if no chunk is clearly relevant. The file is streamed twice, once to
+        index it (unless it already is) and once to pick out the chunks.
+        """
+        key = reader.blob_sha()
+        if reader.truncated:
+            # Only the beginning of the file is chunked
+            key += f":{reader.max_chars}"
+        index = retrieval.chunk_index(key, reader.chunks(MAP_REDUCE_CHUNK_SZ, MAP_REDUCE_CHUNK_OVERLAP),
+                                      MAP_REDUCE_CHUNK_SZ, MAP_REDUCE_CHUNK_OVERLAP)
+        selected = retrieval.select_chunks(index, question)
+        if selected is None:
+            return None
+        wanted = set(selected)
+        chunks = reader.chunks(MAP_REDUCE_CHUNK_SZ, MAP_REDUCE_CHUNK_OVERLAP)
+        return [c for i, c in enumerate(itertools.islice(chunks, selected[-1] + 1)) if i in wanted]
+
+    def _llm_chunks(self, reader: FileReader) -> Iterator[str]:
+        """
+        Lazily splits the file into the chunks sent to the LLM one at a time.
+        """
+        return reader.token_chunks(MAP_REDUCE_CHUNK_TOKENS, MAP_REDUCE_CHUNK_OVERLAP_TOKENS, model=LLM_MODEL)
+
+    def _build_digest(self, key: str, file_path: str, reader: FileReader) -> digest.FileDigest:
+        chunks = list(self._llm_chunks(reader))
+        built = digest.build_digest(file_path, reader.read(), chunks)
+        self.digests.put(key, built)
+        return built
+
+    def _build_digest_in_background(self, key: str, file_path: str, reader: FileReader):
+        """
+        Builds and stores a digest on a daemon thread, unless one is already
+        being built. Failures are dropped; the next question retries.
+        """
+        with self._digest_lock:
+            if key in self._pending_digests:
+                return
+            self._pending_digests.add(key)
+
+        def build():
+            try:
+                self._build_digest(key, file_path, reader)
+            except Exception:
+                pass
+            finally:
+                with self._digest_lock:
+                    self._pending_digests.discard(key)
+        threading.Thread(target=build, daemon=True).start()
+
+    def _digest(self, file_path: str, reader: FileReader) -> Optional[digest.FileDigest]:
+        """
+        Returns the stored digest of `file_path`. A missing digest is built
+        before returning, or on a background thread (returning `None`) if
+        `llm.digest.background` is set.
+        """
+        key = digest.digest_key(reader.blob_sha(), MAP_REDUCE_CHUNK_TOKENS, MAP_REDUCE_CHUNK_OVERLAP_TOKENS)
+        found = self.digests.get(key)
+        if found is not None:
+            return found
+        if digest.DIGEST_BACKGROUND:
+            self._build_digest_in_background(key, file_path, reader)
+            return None
+        return self._build_digest(key, file_path, reader)
+
+    def fileqa(self, question: str, file_path: str, use_cache: bool=True) -> LLMResponse:
         """
         Analyzes the contents of `file_path` to answer the `question` using an LLM.
-        Files larger than `MAP_REDUCE_CHUNK_SIZE` characters are split into chunks and analyzed
-        via a refine method. Files larger than `MAX_FILE_SZ` are truncated to only the
-        first `MAX_FILE_SZ` characters.
+        Files up to `MAX_FILE_SZ` characters are answered by `_fileqa_head`, larger
+        ones by `_fileqa_whole`. Answers are cached by the file's blob SHA and the question.
 
         Args:
             question (str): The question to ask.
             file_path (str): The file to analyze. The path is relative to the
                              top-level directory of the repository.
+            use_cache (bool, optional): Whether to use the answer cache. When `False`,
+                                        the LLM is always called and nothing is stored.
         
         Returns:
             An `LLMResponse` containing the output from the LLM's analysis.
@@ -98,30 +377,185 @@ class Workspace():
         Raises:
             TypeError: If `question` or `file_path` are not strings.
             FileNotFoundError: If the file does not exist.
+            ValueError: If the file is binary.
         """
-        # TODO: Add a feature that returns if the file was truncated.
         if not isinstance(question, str):
             raise TypeError("`question` must be a string")
         if not isinstance(file_path, str):
             raise TypeError("`file_path` must be a string")
         
         _validate_path_name(file_path)
-        text = self._read_n(MAX_FILE_SZ, file_path)
-        if len(text) > MAP_REDUCE_CHUNK_SZ:
-            return text_qa_map_reduce(question, text, file_path=file_path,
-                                      chunk_size=MAP_REDUCE_CHUNK_SZ,
-                                      chunk_overlap=MAP_REDUCE_CHUNK_OVERLAP)
-        return text_qa(question, text, file_path=file_path)
+        reader = self._open(file_path, max_chars=MAX_FILE_SZ)
+        if reader.binary:
+            raise ValueError(f"{file_path} is a binary file")
+        cache = self.answers if use_cache else None
+        if cache is None:
+            response = self._fileqa(question, file_path, reader)
+        else:
+            key = answer_cache.cache_key(reader.blob_sha(), question, _fileqa_settings())
+            response = cache.get(key)
+            if response is None:
+                response = self._fileqa(question, file_path, reader)
+                cache.put(key, response)
+        return response
+
+    def _fileqa(self, question: str, file_path: str, reader: FileReader) -> LLMResponse:
+        """
+        Answers `question` about `file_path` without consulting the answer cache.
+        Files larger than `MAX_FILE_SZ` characters are truncated to their first
+        `MAX_FILE_SZ` characters if hierarchical analysis is disabled, which the
+        response reports as `truncated`.
+        """
+        if HIERARCHICAL_ENABLED and reader.truncated:
+            return self._fileqa_whole(question, file_path, FileReader(reader.path))
+        response = self._fileqa_head(question, file_path, reader)
+        response.truncated = reader.truncated
+        return response
+
+    def _fileqa_whole(self, question: str, file_path: str, reader: FileReader) -> LLMResponse:
+        """
+        Answers `question` about a file of any size from its most relevant
+        chunks, or if none is clearly relevant, from the notes of every chunk
+        merged in a tree (see `text_qa_tree`) until `HIERARCHICAL_TOKEN_BUDGET`
+        tokens were used.
+        """
+        if retrieval.RETRIEVAL_ENABLED:
+            excerpts = self._relevant_chunks(question, reader)
+            if excerpts is not None:
+                return text_qa_excerpts(question, excerpts, file_path=file_path)
+        return text_qa_tree(question, self._llm_chunks(reader),
+                            file_path=file_path,
+                            fan_in=HIERARCHICAL_FAN_IN,
+                            token_budget=HIERARCHICAL_TOKEN_BUDGET,
+                            prefilter=_scan_prefilter())
+
+    def _fileqa_head(self, question: str, file_path: str, reader: FileReader) -> LLMResponse:
+        """
+        Answers `question` from the first `MAX_FILE_SZ` characters of `file_path`.
+        Text that fits in one chunk of `MAP_REDUCE_CHUNK_TOKENS` tokens is answered
+        in a single call. Longer text is answered from its stored digest and its
+        most relevant chunks (ranked with BM25) when digests are enabled, otherwise
+        from the relevant chunks alone. If no chunk is clearly relevant, every chunk
+        is analyzed via map-reduce (see `QAEngine.answer_chunks`).
+        """
+        engine = self._qa_engine()
+        chunks = self._llm_chunks(reader)
+        first = next(chunks, "")
+        second = next(chunks, None)
+        if second is None:
+            return engine.answer_chunks(question, file_path, [first])
+
+        excerpts = self._relevant_chunks(question, reader) \
+            if retrieval.RETRIEVAL_ENABLED else None
+        found = self._digest(file_path, reader) if self.digests is not None else None
+        if found is not None:
+            return text_qa_digest(question, found.render(), excerpts or [], file_path=file_path)
+        if excerpts is not None:
+            return text_qa_excerpts(question, excerpts, file_path=file_path)
+        return engine.answer_chunks(question, file_path, itertools.chain([first, second], chunks),
+                                    prefilter=_scan_prefilter())
 
+    def _qa_engine(self) -> QAEngine:
+        """
+        Returns the engine answering from whole files and from chunks split for the LLM.
+        """
+        return QAEngine(max_tokens=MAP_REDUCE_CHUNK_TOKENS, chunk_overlap=MAP_REDUCE_CHUNK_OVERLAP_TOKENS)
+
+
+    def multi_fileqa(self, question: str, file_paths: List[str]) -> LLMResponse:
+        """
+        Analyzes several files at once to answer the `question` using an LLM.
+        Files are packed whole into as few prompts as fit in the context of the
+        model (see `QAEngine`), so a handful of small files costs a single call.
+        Files are read up to their first `MAX_FILE_SZ` characters.
+
+        Args:
+            question (str): The question to ask.
+            file_paths (List[str]): The files to analyze. Paths are relative to the
+                                    top-level directory of the repository.
+
+        Returns:
+            An `LLMResponse` containing the answer, with what every file says about
+            the question in `sources`.
+
+        Raises:
+            TypeError: If `question` is not a string or `file_paths` is not a list of strings.
+            FileNotFoundError: If a file does not exist.
+            ValueError: If `file_paths` is empty or a file is binary.
+        """
+        if not isinstance(question, str):
+            raise TypeError("`question` must be a string")
+        if not isinstance(file_paths, list) or not all(isinstance(p, str) for p in file_paths):
+            raise TypeError("`file_paths` must be a list of strings")
+        if not file_paths:
+            raise ValueError("`file_paths` must not be empty")
+
+        files = []
+        truncated = False
+        for file_path in dict.fromkeys(file_paths):
+            _validate_path_name(file_path)
+            reader = self._open(file_path, max_chars=MAX_FILE_SZ)
+            if reader.binary:
+                raise ValueError(f"{file_path} is a binary file")
+            files.append((file_path, reader.read()))
+            truncated = truncated or reader.truncated
+        response = self._qa_engine().answer(question, files)
+        response.truncated = truncated
+        return response
 
-    def search(self, path: str) -> Tuple[List[str], List[str]]:
+    def fanout_qa(self, question: str, glob: str="**", max_files: int=fanout.MAX_FILES,
+                  concurrency: int=fanout.CONCURRENCY, token_budget: int=fanout.TOKEN_BUDGET,
+                  on_result: Callable[[str, LLMResponse], None]=None) -> fanout.FanoutResult:
+        """
+        Answers `question` from every relevant file matching `glob` at once. Files
+        are prefiltered locally: those whose paths or contents contain none of the
+        question's terms are dropped, and the rest are ranked by how many they
+        contain. The `max_files` best are analyzed with `fileqa`, `concurrency` at a
+        time, until `token_budget` tokens were used, and their answers are combined
+        into one.
+
+        Args:
+            question (str): The question to ask.
+            glob (str, optional): Only consider files matching this glob pattern.
+            max_files (int, optional): The most files to analyze.
+            concurrency (int, optional): The most files analyzed at once.
+            token_budget (int, optional): No file is started once this many tokens were used.
+            on_result (Callable[[str, LLMResponse], None], optional): Called with every
+                file's answer as soon as it is received.
+
+        Returns:
+            A `FanoutResult`.
+
+        Raises:
+            TypeError: If `question` or `glob` are not strings.
+            ValueError: If `max_files` or `concurrency` are not positive.
+        """
+        if not isinstance(question, str):
+            raise TypeError("`question` must be a string")
+        if not isinstance(glob, str):
+            raise TypeError("`glob` must be a string")
+        if max_files < 1 or concurrency < 1:
+            raise ValueError("`max_files` and `concurrency` must be > 0")
+        _validate_path_name(glob)
+        _, files = self.paths.search(glob)
+        terms = fanout.question_terms(question)
+        counts = self.grep_index.term_counts(terms, path_glob=glob) if terms else {}
+        ranked = fanout.rank_files(terms, files, counts)
+        return fanout.fanout_qa(question, ranked[:max_files], lambda path: self.fileqa(question, path),
+                                concurrency=concurrency, token_budget=token_budget,
+                                on_result=on_result, candidates=len(ranked))
+
+    def search(self, path: str, offset: int=0, limit: int=None) -> Tuple[List[str], List[str]]:
         """
         Searches the repository for files and directories matching `path`, which
         may include wildcard characters. All paths are interpreted as relative to
-        the top-level directory of the repository.
+        the top-level directory of the repository. Results are sorted, directories
+        first, and can be paged through with `offset` and `limit`.
 
         Args:
             path (str): The path to search.
+            offset (int, optional): The number of results to skip.
+            limit (int, optional): The maximum number of results to return.
 
         Returns:
             A Tuple of two `List` objects. The first `List` contains the directory names.
@@ -129,17 +563,105 @@ class Workspace():
         
         Raises:
             TypeError: If `path` is not a string.
+            ValueError: If `offset` or `limit` is negative.
         """
         if not isinstance(path, str):
             raise TypeError("`path` must be a string")
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("`offset` and `limit` must be >= 0")
         _validate_path_name(path)
-        abs_path = os.path.join(self.repo_dir, path)
-        results = glob.glob(abs_path, recursive=True)
-        files = []
-        dirs = []
-        for r in results:
-            if os.path.isdir(r):
-                dirs.append(os.path.relpath(r, self.repo_dir))
-            else:
-                files.append(os.path.relpath(r, self.repo_dir))
-        return dirs, files
+        dirs, files = self.paths.search(path)
+        # Directories and files are paged through as one list
+        end = len(dirs) + len(files) if limit is None else offset + limit
+        page_dirs = dirs[offset:end]
+        page_files = files[max(offset - len(dirs), 0):max(end - len(dirs), 0)]
+        return page_dirs, page_files
+
+    def search_count(self, path: str) -> int:
+        """
+        Returns the total number of files and directories matching `path`.
+        """
+        if not isinstance(path, str):
+            raise TypeError("`path` must be a string")
+        _validate_path_name(path)
+        dirs, files = self.paths.search(path)
+        return len(dirs) + len(files)
+
+    def grep(self, pattern: str, path_glob: str=None, max_results: int=GREP_MAX_RESULTS) -> List[GrepMatch]:
+        """
+        Searches the contents of the repository's text files for lines matching
+        a regular expression. Candidate files are found through a trigram index,
+        so only files containing the pattern's literal strings are scanned.
+
+        Args:
+            pattern (str): A Python regular expression.
+            path_glob (str, optional): Only search files matching this glob pattern.
+            max_results (int, optional): The maximum number of lines to return.
+
+        Returns:
+            A `List` of `GrepMatch` objects ordered by path and line number.
+
+        Raises:
+            TypeError: If `pattern` or `path_glob` are not strings.
+            ValueError: If `pattern` is not a valid regular expression or
+                        `max_results` is not positive.
+        """
+        if not isinstance(pattern, str):
+            raise TypeError("`pattern` must be a string")
+        if path_glob is not None and not isinstance(path_glob, str):
+            raise TypeError("`path_glob` must be a string")
+        if max_results < 1:
+            raise ValueError("`max_results` must be > 0")
+        if path_glob is not None:
+            _validate_path_name(path_glob)
+        return self.grep_index.grep(pattern, path_glob=path_glob, max_results=max_results)
+
+    def find_symbol(self, name: str, max_references: int=50) -> SymbolLookup:
+        """
+        Finds where a class, function, method, type or constant is defined and
+        where it is referenced. Python files are parsed; Go, JavaScript/TypeScript,
+        Rust and Java definitions are matched with regular expressions.
+        References are textual mentions of the name outside its definition.
+
+        Args:
+            name (str): An unqualified (`fileqa`) or qualified (`Workspace.fileqa`) name.
+            max_references (int, optional): The maximum number of references to return.
+
+        Returns:
+            A `SymbolLookup`.
+
+        Raises:
+            TypeError: If `name` is not a string.
+        """
+        if not isinstance(name, str):
+            raise TypeError("`name` must be a string")
+        return self.symbols.find(name.strip(), max_references=max_references)
+
+    def repo_overview(self, path: str="", depth: int=2) -> str:
+        """
+        Returns the summaries of a directory and its subdirectories from the
+        repository overview, as an indented outline. Summaries are built in the
+        background after cloning, so the outline may be partial until
+        `self.overview` is ready.
+
+        Args:
+            path (str, optional): The directory, relative to the top-level of the repository.
+            depth (int, optional): The levels of subdirectories to include.
+
+        Returns:
+            The outline, or an empty string if `path` has no summary (yet).
+
+        Raises:
+            TypeError: If `path` is not a string.
+            ValueError: If `path` is not a directory in the repository.
+        """
+        if not isinstance(path, str):
+            raise TypeError("`path` must be a string")
+        path = path.strip().strip("/")
+        if path in ("", "."):
+            path = ""
+        else:
+            _validate_path_name(path)
+            if not self.paths.is_dir(path):
+                raise ValueError(f"{path} is not a directory in the repository")
+        return self.overview.render(path, depth=depth)
@@ -10,13 +10,18 @@ from langchain.memory import ConversationBufferMemory
 from langchain.callbacks.base import BaseCallbackHandler
 
 # Local
-from chaingpt.api.llm import LLMResponse
+from chaingpt.api.llm import LLMResponse, use_response_cache
+from chaingpt.api.llm_cache import default_cache, recording
+from chaingpt.api.wolfi import BackgroundWolfiClient
+from chaingpt.api.workspace import Workspace
 from chaingpt.cli.tools import get_tools
 from chaingpt.utils import config
 
 
 # TODO: Add configs for adjusting fields such as chunk size and chunk overlap
 LLM_MODEL = config.config["llm"]["agent_model"]
+# Characters of the repository overview included in the prompt
+PROMPT_OVERVIEW_CHARS = ((config.config.get("workspace") or {}).get("overview") or {}).get("prompt_chars", 2000)
 
 
 class ChainGPTAgent:
@@ -28,14 +33,31 @@ class ChainGPTAgent:
         def callback2(output: str):
             print(output, end="")
 
-        tools = get_tools(self.url, callback2)
-        llm = ChatOpenAI(temperature=0, model=LLM_MODEL)
+        # Opened here rather than on import, as record mode starts a new
+        # recording. Set before the workspace starts its background LLM calls.
+        responses = default_cache()
+        use_response_cache(responses)
+
+        # Start on the Wolfi index first so it builds while the repository clones
+        wolfi = BackgroundWolfiClient()
+        self.workspace = Workspace(self.url)
+        tools = get_tools(self.url, callback2, workspace=self.workspace, wolfi=wolfi)
+        llm = ChatOpenAI(temperature=0, model=LLM_MODEL, cache=responses)
+
+        # The overview grows while the session runs. A recorded session must
+        # render the same prompt when replayed, so it waits for the whole
+        # overview and renders it once.
+        repo_overview = self._repo_overview
+        if recording():
+            if self.workspace.overview.started():
+                self.workspace.overview.wait()
+            repo_overview = self._repo_overview()
 
         prompt = PromptTemplate.from_template("""
         As an AI expert and extremely intelligent engineering assistant focusing on the %s GitHub repository,
         your key role is to engage with engineers, offering precise and reliable
         information about repository-related issues. You are equipped with specialized
-        tools for searching file names, reading files, and executing shell scripts. Your responses should be concise yet thorough,
+        tools for reading an overview of the repository, searching file names, searching file contents, reading files, and executing shell scripts. Your responses should be concise yet thorough,
         backed by diligent verification using these tools. You are expected to research exhaustively
         and consider multiple perspectives before finalizing an answer, demonstrating your commitment
         to accuracy and detail in engineering problem-solving. When problem-solving, follow these special instructions:
@@ -50,15 +72,26 @@ class ChainGPTAgent:
         3) You may be asked to run commands that produce files in the repository. Take care that the files you produce do not clash with
            the names of other files/directories in the repo. I.e, be sure to perform adequate reconnaissance in the repository.
 
+        {repo_overview}
         {chat_history}
         Question: {input}
         {agent_scratchpad}
-        """ % self.url)
+        """ % self.url).partial(repo_overview=repo_overview)
 
         self.agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
         memory = ConversationBufferMemory(memory_key="chat_history")
         self.agent_executor = AgentExecutor(agent=self.agent, tools=tools, memory=memory)
 
 
+    def _repo_overview(self) -> str:
+        """
+        Returns the top of the repository overview for the prompt, once its
+        top-level summary has been built.
+        """
+        outline = self.workspace.overview.render(depth=1, max_chars=PROMPT_OVERVIEW_CHARS)
+        if not outline:
+            return ""
+        return "Overview of the repository (use the repo_overview tool for more detail):\n" + outline + "\n"
+
     def prompt(self, msg: str, callback: BaseCallbackHandler=None) -> Iterator[LLMResponse]:
         output = self.agent_executor.invoke({"input": msg}, config={"callbacks": [callback]})
@@ -11,12 +11,43 @@ def _display_file_qa(tool_input: str):
     print(Style.RESET_ALL, end="")
 
 
+def _display_multi_file_qa(tool_input: str):
+    paths = f"{Fore.BLUE}, {Fore.YELLOW}".join(tool_input["paths"])
+    print(emojize(":page_facing_up: " + Fore.BLUE + "Analyzing " + Fore.YELLOW + paths + Fore.BLUE + ": " + Fore.YELLOW + tool_input["question"]))
+    print(Style.RESET_ALL, end="")
+
+
+def _display_fanout_qa(tool_input: str):
+    path_glob = tool_input.get("path_glob") or "**"
+    print(emojize(":page_facing_up: " + Fore.BLUE + "Analyzing files matching " + Fore.YELLOW + path_glob + Fore.BLUE + ": " + Fore.YELLOW + tool_input["question"]))
+    print(Style.RESET_ALL, end="")
+
+
+def _display_repo_overview(tool_input: str):
+    path = tool_input.get("path") or "the repository"
+    print(emojize(":world_map: " + Fore.BLUE + "Reading the overview of " + Fore.YELLOW + path))
+    print(Style.RESET_ALL, end="")
+
+
 def _display_search_path(tool_input: str):
     print(emojize(":magnifying_glass_tilted_left: " + Fore.BLUE + "Searching paths matching " + Fore.YELLOW + tool_input["path"]))
     print(Style.RESET_ALL, end="")
 
 
 
+def _display_grep(tool_input: str):
+    path_glob = tool_input.get("path_glob") or "**"
+    print(emojize(":magnifying_glass_tilted_left: " + Fore.BLUE + "Searching " + Fore.YELLOW + path_glob + Fore.BLUE + " for " + Fore.YELLOW + tool_input["pattern"]))
+    print(Style.RESET_ALL, end="")
+
+
+
+def _display_find_symbol(tool_input: str):
+    print(emojize(":magnifying_glass_tilted_left: " + Fore.BLUE + "Finding symbol " + Fore.YELLOW + tool_input["name"]))
+    print(Style.RESET_ALL, end="")
+
+
+
 def _display_run_script(tool_input: str):
     deps_list = tool_input["deps"].replace(" ", "").split(",")
     deps = f"{Fore.BLUE}, {Fore.YELLOW}".join(deps_list)
@@ -34,8 +65,18 @@ def _display_wolfi_search(tool_input: str):
 def display_tool_call(tool_name: str, tool_input: Dict[str, str]):
     if tool_name == "file_qa":
         _display_file_qa(tool_input)
+    elif tool_name == "multi_file_qa":
+        _display_multi_file_qa(tool_input)
+    elif tool_name == "fanout_qa":
+        _display_fanout_qa(tool_input)
+    elif tool_name == "repo_overview":
+        _display_repo_overview(tool_input)
     elif tool_name == "search_path":
         _display_search_path(tool_input)
+    elif tool_name == "grep":
+        _display_grep(tool_input)
+    elif tool_name == "find_symbol":
+        _display_find_symbol(tool_input)
     elif tool_name == "run_script":
         _display_run_script(tool_input)
     elif tool_name == "wolfi_search":
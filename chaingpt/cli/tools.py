@@ -3,13 +3,33 @@ from typing import List
 
 # 3rd Party
 from langchain.tools import StructuredTool
+from sh import ErrorReturnCode
 
 # Local
 from chaingpt.api.workspace import Workspace
-from chaingpt.api.wolfi import WolfiClient
+from chaingpt.api import fanout
+from chaingpt.api.llm import NOT_RELEVANT
+from chaingpt.api.wolfi import BackgroundWolfiClient, SOURCE_APKINDEX
+from chaingpt.utils import config
 from chaingpt.api.system import SystemEnvironment
 
 
+# Seconds search_wolfi waits for a Wolfi index that is still being built
+WOLFI_WAIT_SECONDS = config.config["wolfi_database"].get("background_wait_seconds", 5)
+# Maximum number of paths search_path returns per call
+SEARCH_PAGE_SIZE = (config.config.get("workspace") or {}).get("search_page_size", 100)
+# Maximum number of lines grep returns per call
+GREP_MAX_RESULTS = (config.config.get("workspace") or {}).get("grep_max_results", 50)
+# Maximum number of references find_symbol returns per call
+SYMBOL_MAX_REFERENCES = (config.config.get("workspace") or {}).get("symbol_max_references", 30)
+# Maximum number of files multi_file_qa analyzes per call
+MULTI_FILE_QA_MAX_FILES = (config.config["llm"].get("multi_file") or {}).get("max_files", 20)
+# Characters of every file's answer fanout_qa shows
+FANOUT_ANSWER_SZ = 300
+# Seconds repo_overview waits for an overview that is still being built
+OVERVIEW_WAIT_SECONDS = ((config.config.get("workspace") or {}).get("overview") or {}).get("wait_seconds", 10)
+
+
 def _error(msg: str) -> str:
     return f"Error: {msg}"
 
@@ -22,29 +42,208 @@ def get_tool_file_qa(workspace: Workspace) -> StructuredTool:
         provides the answer.
         """
         try:
-            return workspace.fileqa(question, file_path)
-        except FileNotFoundError as e:
+            response = workspace.fileqa(question, file_path)
+        except (FileNotFoundError, ValueError) as e:
             return _error(str(e))
+        result = response.output
+        if response.truncated:
+            result += "\nNote: the file is too large to analyze fully, so only its beginning was analyzed."
+        if response.skipped_chunks:
+            result += f"\nNote: {response.skipped_chunks} parts of the file that do not mention the " \
+                      "question's keywords were skipped. Rephrase the question with the file's own terms " \
+                      "if the answer is incomplete."
+        return result
     
     return StructuredTool.from_function(file_qa)
 
 
+def get_tool_multi_file_qa(workspace: Workspace) -> StructuredTool:
+    def multi_file_qa(question: str, paths: List[str]) -> str:
+        """
+        Input a question and a list of file paths. File paths are relative to the
+        top-level of the GitHub repository. The function scans all of the files
+        with an LLM at once and answers from them, naming the files the answer
+        comes from. Prefer it over several file_qa calls when a question involves
+        a few small files, such as configuration files or manifests.
+        """
+        if len(paths) > MULTI_FILE_QA_MAX_FILES:
+            return _error(f"At most {MULTI_FILE_QA_MAX_FILES} files can be analyzed at once")
+        try:
+            response = workspace.multi_fileqa(question, paths)
+        except (FileNotFoundError, ValueError) as e:
+            return _error(str(e))
+        relevant = [f"- {p}: {n}" for p, n in response.sources.items() if n != NOT_RELEVANT]
+        result = response.output
+        if relevant:
+            result += "\nWhat each relevant file says:\n" + "\n".join(relevant)
+        if response.truncated:
+            result += "\nNote: some files are too large to analyze with other files, " \
+                      "so only their beginning was analyzed. Use file_qa for them."
+        return result
+
+    return StructuredTool.from_function(multi_file_qa)
+
+
+def get_tool_fanout_qa(callback: any, workspace: Workspace) -> StructuredTool:
+    def fanout_qa(question: str, path_glob: str="**", max_files: int=fanout.MAX_FILES,
+                  token_budget: int=fanout.TOKEN_BUDGET) -> str:
+        """
+        Input a question and a glob pattern such as services/**/*.yaml. Finds the
+        files matching the pattern that mention the question's keywords, scans
+        them all in parallel with an LLM and combines their answers. Use it for
+        questions about many files at once, such as "which services set a
+        custom timeout?", instead of calling file_qa on one file after another.
+        Lower max_files or token_budget to get a quicker, cheaper answer from the
+        most relevant files only.
+        """
+        max_files = min(max(max_files, 1), fanout.MAX_FILES)
+        token_budget = min(max(token_budget, 1), fanout.TOKEN_BUDGET)
+
+        def on_result(path, response):
+            # Streamed as every file finishes, before the answers are combined
+            callback(f"{path}: {' '.join(response.output.split())[:FANOUT_ANSWER_SZ]}\n")
+
+        try:
+            result = workspace.fanout_qa(question, glob=path_glob or "**", max_files=max_files,
+                                         token_budget=token_budget, on_result=on_result)
+        except ValueError as e:
+            return _error(str(e))
+        response = result.response
+        failures = ""
+        if result.failed:
+            failures = f"\nAnalyzing {len(result.failed)} files failed: " + \
+                       "; ".join(f"{p}: {e}" for p, e in result.failed.items())
+        if not response.sources:
+            if result.failed:
+                return _error(failures.strip())
+            return f"No files matching {path_glob} mention the question's keywords. " \
+                   "Try a broader glob or use grep."
+        answers = "\n".join(f"- {p}: {a[:FANOUT_ANSWER_SZ]}" for p, a in response.sources.items())
+        results = response.output + "\nAnswers per file:\n" + answers
+        results += f"\nAnalyzed {len(result.analyzed)} of {result.candidates} candidate files."
+        if result.budget_exhausted:
+            results += " The token budget ran out before the rest could be analyzed."
+        elif len(result.analyzed) < result.candidates:
+            results += " Narrow path_glob to analyze the others."
+        return results + failures
+
+    return StructuredTool.from_function(fanout_qa)
+
+
 def get_tool_search_path(workspace: Workspace) -> StructuredTool:
-    def search_path(path: str) -> str:
+    def search_path(path: str, offset: int=0, limit: int=SEARCH_PAGE_SIZE) -> str:
         """
         Efficiently search for files and directories using this tool,
         which allows you to specify a path and employ glob patterns
         for advanced queries. Searches begin at the top-level of the
         cloned repository. For example, to get all of the files in the top-level
-        directory, pass * to path.
+        directory, pass * to path. Results are sorted and paginated: if more
+        results exist, pass the suggested offset to get the next page.
         """
-        dirs, files = workspace.search(path)
-        return "Directories: [" + ", ".join(dirs) + "]\nFiles: [" + ", ".join(files) + "]"
+        limit = min(max(limit, 1), SEARCH_PAGE_SIZE)
+        try:
+            total = workspace.search_count(path)
+            dirs, files = workspace.search(path, offset=offset, limit=limit)
+        except ValueError as e:
+            return _error(str(e))
+        results = "Directories: [" + ", ".join(dirs) + "]\nFiles: [" + ", ".join(files) + "]"
+        shown = offset + len(dirs) + len(files)
+        if shown < total:
+            results += f"\nShowing results {offset + 1}-{shown} of {total}. " \
+                       f"Pass offset={shown} to see more."
+        return results
 
     return StructuredTool.from_function(search_path)
 
 
-def get_tool_run_script(callback: any) -> StructuredTool:
+def get_tool_grep(workspace: Workspace) -> StructuredTool:
+    def grep(pattern: str, path_glob: str="**", max_results: int=GREP_MAX_RESULTS) -> str:
+        """
+        Searches the contents of every text file in the repository for lines
+        matching a Python regular expression and returns them in
+        [path]:[line number]: [line] format. Use path_glob to restrict the
+        search to files matching a glob pattern, e.g. **/*.go. This is much
+        faster than file_qa for finding where something is used or defined.
+        """
+        max_results = min(max(max_results, 1), GREP_MAX_RESULTS)
+        try:
+            matches = workspace.grep(pattern, path_glob=path_glob or None, max_results=max_results)
+        except ValueError as e:
+            return _error(str(e))
+        if not matches:
+            return f"No lines match {pattern}"
+        results = "\n".join(f"{m.path}:{m.line_number}: {m.line}" for m in matches)
+        if len(matches) == max_results:
+            results += f"\nOnly the first {max_results} matches are shown. Narrow the pattern or path_glob."
+        return results
+
+    return StructuredTool.from_function(grep)
+
+
+def get_tool_find_symbol(workspace: Workspace) -> StructuredTool:
+    def find_symbol(name: str) -> str:
+        """
+        Finds where a class, function, method, type or constant is defined in the
+        repository and which lines reference it. Accepts plain names such as
+        fileqa or qualified names such as Workspace.fileqa. Supports Python, Go,
+        JavaScript/TypeScript, Rust and Java. Use it to answer questions like
+        "where is X defined and who calls it" without reading files one by one.
+        """
+        try:
+            lookup = workspace.find_symbol(name, max_references=SYMBOL_MAX_REFERENCES)
+        except (ErrorReturnCode, OSError) as e:
+            # The first lookup lists the repository with git and writes the symbol cache
+            return _error(str(e))
+        if not lookup.definitions and not lookup.references:
+            return f"No symbol named {name} was found. Try the grep tool instead."
+        results = "Definitions:\n"
+        for s in lookup.definitions:
+            results += f"{s.kind} {s.qualname} ({s.path}:{s.line_number})\n"
+        if not lookup.definitions:
+            results += "None found\n"
+        results += f"References ({lookup.total_references}):\n"
+        for r in lookup.references:
+            results += f"{r.path}:{r.line_number}: {r.line}\n"
+        if lookup.total_references > len(lookup.references):
+            results += f"Only the first {len(lookup.references)} references are shown.\n"
+        return results
+
+    return StructuredTool.from_function(find_symbol)
+
+
+def get_tool_repo_overview(workspace: Workspace) -> StructuredTool:
+    def repo_overview(path: str="") -> str:
+        """
+        Returns short summaries of a directory of the repository and of its
+        subdirectories, built from READMEs, manifests and entry points. Pass an
+        empty path for the whole project. Use it first for broad questions such as
+        "what does this project do" or "how is it organized", then drill down
+        with search_path, grep and file_qa.
+        """
+        if not workspace.overview.started():
+            return _error("The repository overview is disabled. Use search_path and file_qa instead.")
+        ready = workspace.overview.wait(OVERVIEW_WAIT_SECONDS)
+        try:
+            outline = workspace.repo_overview(path)
+        except ValueError as e:
+            return _error(str(e))
+        if not ready:
+            status = f"The repository overview is still being built ({workspace.overview.progress:.0%} done). "
+            if not outline:
+                return status + "Try again shortly, or use search_path and file_qa meanwhile."
+            return status + "Summaries built so far:\n" + outline
+        if not outline:
+            return f"No summary of {path} is available. Use search_path and file_qa instead."
+        return outline
+
+    return StructuredTool.from_function(repo_overview)
+
+
+def _format_size(n_bytes: int) -> str:
+    return f"{n_bytes / (1024 * 1024):.1f} MB"
+
+
+def get_tool_run_script(callback: any, wolfi: BackgroundWolfiClient=None) -> StructuredTool:
     def run_script(script: str, deps: str) -> str:
         """
         Executes the provided script in an isolated Wolfi environment.
@@ -66,6 +265,27 @@ def get_tool_run_script(callback: any) -> StructuredTool:
         deps_list = deps.split(",")
         deps_list = [d.strip(" \n") for d in deps_list]
 
+        # Catch unknown packages before paying for a container run. Only
+        # the APKINDEX source knows every subpackage and shared library, so
+        # with the git source unresolved names are reported but not fatal.
+        # Validation is skipped while the index is still being built, or if
+        # it could not be built.
+        try:
+            client = wolfi.get(timeout=0) if wolfi is not None else None
+        except Exception:
+            client = None
+        if client is not None:
+            resolution = client.resolve(deps_list)
+            if resolution.unresolved:
+                msg = f"No Wolfi package provides {', '.join(resolution.unresolved)}. " \
+                      "Use the search_wolfi tool to look up valid package names."
+                if client.source == SOURCE_APKINDEX:
+                    return _error(msg)
+                callback(f"Warning: {msg}\n")
+            if resolution.installed_size:
+                callback(f"Installing {len(resolution.packages)} packages "
+                         f"({_format_size(resolution.installed_size)})\n")
+
         env = SystemEnvironment()
 
         response = ""
@@ -78,7 +298,7 @@ def get_tool_run_script(callback: any) -> StructuredTool:
     return StructuredTool.from_function(run_script)
 
 
-def get_tool_wolfi_search(client: WolfiClient) -> StructuredTool:
+def get_tool_wolfi_search(wolfi: BackgroundWolfiClient) -> StructuredTool:
     def search_wolfi(keyword: str) -> str:
         """
         Searches Wolfi for packages that match the provided keyword.
@@ -91,10 +311,29 @@ def get_tool_wolfi_search(client: WolfiClient) -> StructuredTool:
         python-3.12: The Python 3.12 software library
 
         If the script depends on Python 3.10, you would pass "python-3.10" to deps, along with
-        any other packages you wish to include.
+        any other packages you wish to include. If nothing matches, the closest package
+        names are returned instead.
         """
+        try:
+            client = wolfi.get(timeout=WOLFI_WAIT_SECONDS)
+        except Exception as e:
+            return _error(f"The Wolfi package index could not be built: {e}")
+        if client is None:
+            results_str = f"The Wolfi package index is still being built ({wolfi.progress:.0%} done). "
+            results = wolfi.search_snapshot(keyword)
+            if not results:
+                return results_str + "Try again shortly."
+            results_str += "Results from the previous index, which may be out of date:\n"
+            for r in results:
+                results_str += f"{r.name}: {r.description}\n"
+            return results_str
+
         results = client.search(keyword)
         results_str = ""
+        if not results:
+            results = client.suggest(keyword)
+            if results:
+                results_str = f"No packages match {keyword}. Closest package names:\n"
         for r in results:
             results_str += f"{r.name}: {r.description}\n"
         return results_str
@@ -102,11 +341,19 @@ def get_tool_wolfi_search(client: WolfiClient) -> StructuredTool:
     return StructuredTool.from_function(search_wolfi)
 
 
-def get_tools(url: str, callback: any) -> List[StructuredTool]:
-    wk = Workspace(url)
+def get_tools(url: str, callback: any, workspace: Workspace=None,
+              wolfi: BackgroundWolfiClient=None) -> List[StructuredTool]:
+    # Start on the Wolfi index first so it builds while the repository clones
+    wolfi = wolfi if wolfi is not None else BackgroundWolfiClient()
+    wk = workspace if workspace is not None else Workspace(url)
     return [
+        get_tool_repo_overview(wk),
         get_tool_file_qa(wk),
+        get_tool_multi_file_qa(wk),
+        get_tool_fanout_qa(callback, wk),
         get_tool_search_path(wk),
-        get_tool_run_script(callback),
-        get_tool_wolfi_search(WolfiClient())
+        get_tool_grep(wk),
+        get_tool_find_symbol(wk),
+        get_tool_run_script(callback, wolfi),
+        get_tool_wolfi_search(wolfi)
     ]
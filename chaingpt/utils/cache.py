@@ -0,0 +1,73 @@
+# Standard lib
+from typing import Any, Dict, Hashable
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded mapping that evicts the least recently
+    used entry once `maxsize` entries are stored. Keeps hit and miss
+    counters so callers can report how effective the cache is.
+
+    maxsize (int): The maximum number of entries. A `maxsize` of 0 disables caching.
+    """
+    def __init__(self, maxsize: int=128):
+        if maxsize < 0:
+            raise ValueError("`maxsize` must be >= 0")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any=None) -> Any:
+        """
+        Returns the value stored for `key` and marks it as recently used.
+        Returns `default` and counts a miss if `key` is not cached.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Stores `value` for `key`, evicting the least recently used
+        entry if the cache is full.
+        """
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all entries. The hit and miss counters are kept.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters and the current size.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
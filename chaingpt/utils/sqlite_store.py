@@ -0,0 +1,123 @@
+# Standard lib
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    The base of the persistent stores kept in SQLite, safe to share between
+    threads and processes. Entries are rows of `TABLE`, with a `key` primary
+    key and an `accessed` time; the least recently used are evicted beyond
+    `max_entries` entries or `max_size_mb` of data.
+
+    Subclasses set `TABLE` and `SCHEMA`, and `SIZE`, the SQL expression of the
+    bytes of an entry, to enforce a size budget. They hold `_lock` while using
+    `_conn`, and count their lookups in `hits` and `misses`.
+
+    path (str): The SQLite database.
+    max_entries (int, optional): The most entries kept. `None` keeps any number.
+    max_size_mb (float, optional): The most data kept. `None` keeps any amount.
+    """
+    TABLE = ""
+    SCHEMA = ""
+    SIZE = "0"
+
+    def __init__(self, path: str, max_entries: Optional[int]=None, max_size_mb: Optional[float]=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_size = None if max_size_mb is None else int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(self.SCHEMA)
+
+    def _evict(self):
+        """
+        Evicts the least recently used entries over the budgets. Called with `_lock` held.
+        """
+        if self.max_entries is not None:
+            self._conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE key IN "
+                f"(SELECT key FROM {self.TABLE} ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+        if self.max_size is None:
+            return
+        size = self._size()
+        if size <= self.max_size:
+            return
+        rows = self._conn.execute(f"SELECT key, {self.SIZE} FROM {self.TABLE} ORDER BY accessed").fetchall()
+        evicted = []
+        for key, length in rows:
+            if size <= self.max_size:
+                break
+            evicted.append((key,))
+            size -= length
+        self._conn.executemany(f"DELETE FROM {self.TABLE} WHERE key = ?", evicted)
+
+    def _size(self) -> int:
+        return self._conn.execute(f"SELECT COALESCE(SUM({self.SIZE}), 0) FROM {self.TABLE}").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def __bool__(self) -> bool:
+        # An empty store is still a store
+        return True
+
+    def clear(self):
+        """
+        Removes every entry. The hit and miss counters are kept.
+        """
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.TABLE}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the hit and miss counters of this process, the hit rate,
+        the number of entries and the bytes of stored data.
+        """
+        entries = len(self)
+        with self._lock:
+            size = self._size()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "size": size
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+S = TypeVar("S", bound=SQLiteStore)
+
+
+class DefaultStore(Generic[S]):
+    """
+    A store shared by the whole process, created on first use.
+
+    factory (Callable[[], SQLiteStore]): Creates the store.
+    """
+    def __init__(self, factory: Callable[[], S]):
+        self._factory = factory
+        self._store: Optional[S] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> S:
+        """
+        Returns the store, creating it if this is the first use.
+        """
+        with self._lock:
+            if self._store is None:
+                self._store = self._factory()
+            return self._store
@@ -0,0 +1,118 @@
+"""
+Fixtures shared by every unit test module. Autouse fixtures here apply to
+all of them, so no test reads or writes the real stores in `~/.chaingpt`
+or summarizes a repository with the LLM in the background.
+"""
+
+
+# Standard lib
+import os
+
+# 3rd party
+import pytest
+from sh import git
+
+# Local
+from chaingpt.api import workspace, answer_cache, digest, overview
+from chaingpt.api.answer_cache import AnswerCache
+from chaingpt.api.digest import DigestStore
+from chaingpt.api.repo_cache import RepositoryCache
+from tests.api.unittests.utils import git_commit_files, melange_yaml, write_apkindex
+
+
+@pytest.fixture(autouse=True)
+def isolated_stores(tmp_path, monkeypatch):
+    """
+    Autouse fixture that points the default `fileqa` answer cache and digest
+    store at `tmp_path`, so workspaces under test never use the real ones.
+    """
+    answers = AnswerCache(os.path.join(tmp_path, "answers.sqlite"))
+    digests = DigestStore(os.path.join(tmp_path, "digests.sqlite"))
+    monkeypatch.setattr(answer_cache, "default_cache",
+                        lambda: answers if answer_cache.ANSWER_CACHE_ENABLED else None)
+    monkeypatch.setattr(digest, "default_store", lambda: digests if digest.DIGEST_ENABLED else None)
+    yield
+    answers.close()
+    digests.close()
+
+
+@pytest.fixture(autouse=True)
+def no_background_overview(monkeypatch):
+    """
+    Autouse fixture that keeps workspaces under test from summarizing their
+    repository with the LLM in the background. Tests can still build an
+    overview with `refresh`.
+    """
+    monkeypatch.setattr(overview.RepoOverview, "start", lambda self: None)
+
+
+@pytest.fixture
+def local_git_repo(tmp_path):
+    """
+    Fixture that creates a small local git repository to clone
+    workspaces from and returns its path.
+    """
+    repo_dir = os.path.join(tmp_path, "upstream", "project")
+    os.makedirs(repo_dir)
+    git("-C", repo_dir, "init", "--quiet")
+    git_commit_files(repo_dir, {
+        "README.md": "project",
+        "src/main.py": "def main():\n    pass\n",
+    }, message="initial")
+    return repo_dir
+
+
+@pytest.fixture
+def local_bare_repo(tmp_path, local_git_repo):
+    """
+    Fixture that serves `local_git_repo` with some extra history as a bare
+    repository and returns its `file://` URL. The repository allows
+    partial clones.
+    """
+    git_commit_files(local_git_repo, {"docs/guide.md": "guide", "src/util.py": "X = 1\n"})
+    git_commit_files(local_git_repo, {"src/util.py": "X = 2\n"})
+    bare = os.path.join(tmp_path, "served", "project.git")
+    git.clone("--quiet", "--bare", local_git_repo, bare)
+    git("-C", bare, "config", "uploadpack.allowFilter", "true")
+    git("-C", bare, "config", "uploadpack.allowAnySHA1InWant", "true")
+    return "file://" + bare
+
+
+@pytest.fixture
+def local_workspace(tmp_path, local_bare_repo):
+    """
+    Fixture that clones `local_bare_repo` into a workspace through a clone
+    cache in `tmp_path`, and closes the workspace afterwards.
+    """
+    cache = RepositoryCache(os.path.join(tmp_path, "cache"))
+    wk = workspace.Workspace(local_bare_repo, cache=cache)
+    yield wk
+    wk.close()
+
+
+@pytest.fixture
+def local_wolfi_repo(tmp_path):
+    """
+    Fixture that creates a local git repository laid out like
+    wolfi-dev/os and returns its path.
+    """
+    repo_dir = os.path.join(tmp_path, "wolfi-upstream")
+    os.makedirs(repo_dir)
+    git("-C", repo_dir, "init", "--quiet")
+    git_commit_files(repo_dir, {
+        "python-3.11.yaml": melange_yaml("python-3.11", "The Python 3.11 software library"),
+        "python-3.12.yaml": melange_yaml("python-3.12", "The Python 3.12 software library"),
+        "git.yaml": melange_yaml("git", "distributed version control system"),
+        "README.md": "Wolfi",
+    }, message="initial")
+    return repo_dir
+
+
+@pytest.fixture
+def local_apkindex(tmp_path):
+    """
+    Fixture that writes a small APKINDEX.tar.gz and returns its path.
+    """
+    path = os.path.join(tmp_path, "APKINDEX.tar.gz")
+    write_apkindex(path)
+    return path
@@ -0,0 +1,121 @@
+# Standard lib
+import os
+import time
+import sqlite3
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import answer_cache
+from chaingpt.api.llm import LLMResponse
+from tests.api.unittests.utils import llm_response
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = answer_cache.AnswerCache(os.path.join(tmp_path, "answers.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test__normalize_question():
+    """
+    Checks that case, whitespace and trailing punctuation are ignored.
+    """
+    assert answer_cache.normalize_question("  What  does\tmain DO?? ") == "what does main do"
+
+
+def test__cache_key__settings():
+    """
+    Checks that the key depends on the blob, the normalized question and the settings.
+    """
+    key = answer_cache.cache_key("abc", "What is X?", {"model": "a"})
+    assert key == answer_cache.cache_key("abc", "what is x", {"model": "a"})
+    assert key != answer_cache.cache_key("abd", "What is X?", {"model": "a"})
+    assert key != answer_cache.cache_key("abc", "What is Y?", {"model": "a"})
+    assert key != answer_cache.cache_key("abc", "What is X?", {"model": "b"})
+
+
+class TestAnswerCache:
+    def test__get__hit_and_miss(self, cache):
+        """
+        Checks that stored responses are returned as cached with no token cost.
+        """
+        assert cache.get("key") is None
+        cache.put("key", llm_response("answer"))
+        response = cache.get("key")
+        assert response == LLMResponse(output="answer", model="test", input_tokens=0,
+                                       output_tokens=0, cached=True)
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+        assert stats["hit_rate"] == 0.5
+
+
+    def test__get__persisted(self, tmp_path, cache):
+        """
+        Checks that entries are shared with other cache instances on the same file.
+        """
+        cache.put("key", llm_response("answer"))
+        other = answer_cache.AnswerCache(cache.path)
+        assert other.get("key").output == "answer"
+        other.close()
+
+
+    def test__get__truncated(self, tmp_path, cache):
+        """
+        Checks that whether an answer was truncated and the chunks the prefilter
+        skipped are stored, including in caches created before they were.
+        """
+        cache.put("key", LLMResponse(output="answer", model="test", input_tokens=1,
+                                     output_tokens=1, truncated=True, skipped_chunks=3))
+        assert cache.get("key").truncated
+        assert cache.get("key").skipped_chunks == 3
+
+        path = os.path.join(tmp_path, "old.sqlite")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE answers (key TEXT PRIMARY KEY, output TEXT NOT NULL, model TEXT NOT NULL, "
+                     "input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL, "
+                     "created REAL NOT NULL, accessed REAL NOT NULL)")
+        conn.execute("INSERT INTO answers VALUES ('key', 'answer', 'test', 1, 1, ?, ?)", (time.time(), time.time()))
+        conn.commit()
+        conn.close()
+        old = answer_cache.AnswerCache(path)
+        assert old.get("key").truncated is False
+        assert old.get("key").skipped_chunks == 0
+        old.close()
+
+
+    def test__get__expired(self, cache):
+        """
+        Checks that entries older than the TTL are misses and removed.
+        """
+        cache.put("key", llm_response("answer"))
+        cache.ttl = -1
+        assert cache.get("key") is None
+        assert cache.stats()["entries"] == 0
+
+
+    def test__put__size_eviction(self, cache):
+        """
+        Checks that the least recently used entries are evicted over the size budget.
+        """
+        cache.max_size = 25
+        cache.put("a", llm_response("a" * 10))
+        time.sleep(0.01)
+        cache.put("b", llm_response("b" * 10))
+        time.sleep(0.01)
+        cache.get("a")
+        cache.put("c", llm_response("c" * 10))
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+
+
+    def test__clear(self, cache):
+        """
+        Checks that clearing removes every entry.
+        """
+        cache.put("key", llm_response("answer"))
+        cache.clear()
+        assert cache.get("key") is None
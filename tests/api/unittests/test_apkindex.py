@@ -0,0 +1,96 @@
+# Standard lib
+import os
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import apkindex
+from tests.api.unittests.utils import write_apkindex, _tar_gz
+
+
+def test__version_key__ordering():
+    """
+    Checks that apk versions sort from oldest to newest.
+    """
+    versions = ["3.12.1-r0", "3.9.0-r0", "3.12.1_rc1-r0", "3.12.1-r2",
+                "3.12.1_p1-r0", "3.12.10-r0", "3.12.1a-r0"]
+    ordered = sorted(versions, key=apkindex.version_key)
+    assert ordered == ["3.9.0-r0", "3.12.1_rc1-r0", "3.12.1-r0", "3.12.1-r2",
+                       "3.12.1_p1-r0", "3.12.1a-r0", "3.12.10-r0"]
+
+
+def test__version_key__not_apk_format():
+    """
+    Checks that versions outside the apk format still get a comparable key.
+    """
+    assert apkindex.version_key("2024.01.beta") < apkindex.version_key("2024.02")
+
+
+@pytest.mark.parametrize("dep,name", [
+    ("python-3.12>=3.12.1", "python-3.12"),
+    ("so:libc.so.6=6", "so:libc.so.6"),
+    ("cmd:git", "cmd:git"),
+    ("busybox~1.36", "busybox"),
+])
+def test__dependency_name(dep, name):
+    """
+    Checks that version constraints are stripped from dependencies.
+    """
+    assert apkindex.dependency_name(dep) == name
+
+
+def test__parse_apkindex__signed(local_apkindex):
+    """
+    Checks that every record of a signed APKINDEX is parsed.
+    """
+    with open(local_apkindex, "rb") as f:
+        packages = list(apkindex.parse_apkindex(f))
+    assert [p.name for p in packages] == ["python-3.12", "python-3.12", "python-3.12-dev",
+                                          "libpython-3.12", "glibc"]
+    dev = packages[2]
+    assert dev.version == "3.12.2-r1"
+    assert dev.depends == ("python-3.12=3.12.2-r1",)
+    assert dev.provides == ("pc:python3=3.12",)
+    assert dev.installed_size == 500
+
+
+def test__parse_apkindex__missing_index(tmp_path):
+    """
+    Checks that a `ValueError` is raised for archives without an APKINDEX.
+    """
+    path = os.path.join(tmp_path, "APKINDEX.tar.gz")
+    with open(path, "wb") as f:
+        f.write(_tar_gz({"DESCRIPTION": "wolfi"}))
+    with pytest.raises(ValueError):
+        with open(path, "rb") as f:
+            list(apkindex.parse_apkindex(f))
+
+
+def test__newest(local_apkindex):
+    """
+    Checks that only the newest version of each package is kept.
+    """
+    with open(local_apkindex, "rb") as f:
+        packages = apkindex.newest(apkindex.parse_apkindex(f))
+    versions = {p.name: p.version for p in packages}
+    assert versions["python-3.12"] == "3.12.2-r1"
+    assert len(packages) == 4
+
+
+def test__open_apkindex__unchanged(local_apkindex):
+    """
+    Checks that `None` is returned when a local index has not
+    changed since `validator` was issued.
+    """
+    stream, validator = apkindex.open_apkindex(local_apkindex)
+    stream.close()
+    assert apkindex.open_apkindex(local_apkindex, validator=validator) is None
+
+
+def test__open_apkindex__dne(tmp_path):
+    """
+    Checks that a `FileNotFoundError` is raised for a missing local index.
+    """
+    with pytest.raises(FileNotFoundError):
+        apkindex.open_apkindex(os.path.join(tmp_path, "dne.tar.gz"))
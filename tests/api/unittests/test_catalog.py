@@ -0,0 +1,151 @@
+# Standard lib
+import os
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api.catalog import WolfiCatalog, CatalogPackage, tokenize, edit_distance, name_version_key
+
+
+PACKAGES = [
+    CatalogPackage("python-3.11", "The Python 3.11 software library", "3.11.8-r0"),
+    CatalogPackage("python-3.12", "The Python 3.12 software library", "3.12.2-r1"),
+    CatalogPackage("py3-pip", "The python package installer", "24.0-r0"),
+    CatalogPackage("git", "distributed version control system", "2.44.0-r0"),
+    CatalogPackage("nodejs-20", "JavaScript runtime built on V8", "20.11.1-r0"),
+]
+
+
+@pytest.fixture(params=[True, False], ids=["mmap", "read"])
+def catalog(request, tmp_path):
+    """
+    Fixture that writes `PACKAGES` to a catalog and loads it, both
+    memory-mapped and read into memory.
+    """
+    path = os.path.join(tmp_path, "catalog.bin")
+    WolfiCatalog.write(path, PACKAGES)
+    c = WolfiCatalog.load(path, use_mmap=request.param)
+    yield c
+    c.close()
+
+
+def test__tokenize():
+    """
+    Checks that text is split into lowercase tokens without stop words.
+    """
+    assert tokenize("The Python 3.12 software-library") == ["python", "3.12", "software", "library"]
+
+
+class TestWolfiCatalog:
+    def test__packages__roundtrip(self, catalog):
+        """
+        Checks that every package is stored, sorted by name.
+        """
+        assert list(catalog.packages()) == sorted(PACKAGES, key=lambda p: p.name)
+
+
+    def test__get__exact(self, catalog):
+        """
+        Checks exact name lookups.
+        """
+        assert catalog.get("git") == PACKAGES[3]
+        assert catalog.get("gi") is None
+
+
+    def test__prefix(self, catalog):
+        """
+        Checks that packages are returned for a name prefix.
+        """
+        assert [p.name for p in catalog.prefix("python-")] == ["python-3.11", "python-3.12"]
+
+
+    def test__keyword__all_tokens_match(self, catalog):
+        """
+        Checks that keyword searches require every token and rank
+        name matches first.
+        """
+        assert [p.name for p in catalog.keyword("python")] == ["python-3.12", "python-3.11", "py3-pip"]
+        assert [p.name for p in catalog.keyword("python installer")] == ["py3-pip"]
+        assert catalog.keyword("python javascript") == []
+
+
+    def test__search__exact_first(self, catalog):
+        """
+        Checks that an exact name match is returned first.
+        """
+        assert catalog.search("nodejs-20")[0].name == "nodejs-20"
+
+
+    def test__search__no_matches(self, catalog):
+        """
+        Checks that no packages are returned for an unknown keyword.
+        """
+        assert catalog.search("nothing") == []
+
+
+def test__load__not_a_catalog(tmp_path):
+    """
+    Checks that a `ValueError` is raised for files that are not catalogs.
+    """
+    path = os.path.join(tmp_path, "catalog.bin")
+    with open(path, "wb") as f:
+        f.write(b"not a catalog at all")
+    with pytest.raises(ValueError):
+        WolfiCatalog.load(path)
+
+
+def test__load__dne(tmp_path):
+    """
+    Checks that a `FileNotFoundError` is raised for missing catalogs.
+    """
+    with pytest.raises(FileNotFoundError):
+        WolfiCatalog.load(os.path.join(tmp_path, "dne.bin"))
+
+
+@pytest.mark.parametrize("a,b,distance", [
+    ("python", "python", 0),
+    ("pyhton", "python", 1),
+    ("nodejs20", "nodejs-20", 1),
+    ("", "git", 3),
+])
+def test__edit_distance(a, b, distance):
+    """
+    Checks the edit distance, counting transpositions as one edit.
+    """
+    assert edit_distance(a, b) == distance
+
+
+def test__name_version_key():
+    """
+    Checks that versions embedded in package names are extracted.
+    """
+    assert name_version_key("python-3.12") == (3, 12)
+    assert name_version_key("python-3.12-dev") == (3, 12)
+    assert name_version_key("git") == ()
+
+
+class TestWolfiCatalogFuzzy:
+    def test__fuzzy__transposition(self, catalog):
+        """
+        Checks that misspelled names return near matches with the
+        newest version first.
+        """
+        names = [p.name for p, _ in catalog.fuzzy("pyhton3")]
+        assert names[:2] == ["python-3.12", "python-3.11"]
+
+
+    def test__fuzzy__missing_separator(self, catalog):
+        """
+        Checks that names missing a separator are matched.
+        """
+        package, score = catalog.fuzzy("nodejs20")[0]
+        assert package.name == "nodejs-20"
+        assert score > 0.8
+
+
+    def test__fuzzy__no_matches(self, catalog):
+        """
+        Checks that nothing is returned for unrelated keywords.
+        """
+        assert catalog.fuzzy("zzzzzz") == []
@@ -0,0 +1,90 @@
+# Standard lib
+import os
+import time
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import digest
+from chaingpt.api.llm import LLMResponse
+
+
+def _digest(purpose: str="Parses config") -> digest.FileDigest:
+    return digest.FileDigest(purpose=purpose, symbols=["load"], key_config=["CONFIG_PATH"],
+                             chunk_summaries=["Imports", "Defines load"])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = digest.DigestStore(os.path.join(tmp_path, "digests.sqlite"), max_entries=2)
+    yield store
+    store.close()
+
+
+def test__render():
+    """
+    Checks that every part of a digest is rendered, with numbered chunk summaries.
+    """
+    text = _digest().render()
+    assert "Purpose: Parses config" in text
+    assert "Exported symbols: load" in text
+    assert "- CONFIG_PATH" in text
+    assert "1. Imports\n2. Defines load\n" in text
+
+
+def test__parse_description():
+    """
+    Checks that JSON is parsed from fenced output, and that other output is
+    used as the purpose.
+    """
+    output = '```json\n{"purpose": "CLI entrypoint", "key_config": ["--verbose"]}\n```'
+    assert digest._parse_description(output) == {"purpose": "CLI entrypoint", "key_config": ["--verbose"]}
+    assert digest._parse_description("Just a file.") == {"purpose": "Just a file."}
+
+
+def test__build_digest(monkeypatch):
+    """
+    Checks that symbols are extracted locally and the rest comes from the LLM.
+    """
+    text = "import os\n\nclass Loader:\n    def load(self):\n        pass\n\ndef _private():\n    pass\n"
+    monkeypatch.setattr(digest, "summarize_file", lambda chunks, file_path: (
+        ["Summary"] * len(chunks),
+        '{"purpose": "Loads things", "key_config": "HOME"}',
+        LLMResponse(output="", model="test", input_tokens=1, output_tokens=1)))
+    built = digest.build_digest("loader.py", text, [text])
+    assert built == digest.FileDigest(purpose="Loads things", symbols=["Loader"],
+                                      key_config=["HOME"], chunk_summaries=["Summary"])
+
+
+def test__digest_key():
+    """
+    Checks that the key depends on the contents and the chunking.
+    """
+    assert digest.digest_key("a", 100, 10) != digest.digest_key("b", 100, 10)
+    assert digest.digest_key("a", 100, 10) != digest.digest_key("a", 200, 10)
+
+
+def test__get__roundtrip(store):
+    """
+    Checks that a stored digest is returned unchanged, and that unknown keys return `None`.
+    """
+    store.put("key", _digest())
+    assert store.get("key") == _digest()
+    assert store.get("other") is None
+
+
+def test__put__evicts_least_recently_used(store):
+    """
+    Checks that the least recently used digest is evicted beyond `max_entries`.
+    """
+    store.put("a", _digest("a"))
+    time.sleep(0.01)
+    store.put("b", _digest("b"))
+    time.sleep(0.01)
+    assert store.get("a") is not None
+    time.sleep(0.01)
+    store.put("c", _digest("c"))
+    assert len(store) == 2
+    assert store.get("b") is None
+    assert store.get("a").purpose == "a"
@@ -0,0 +1,89 @@
+# Standard lib
+import threading
+import time
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import fanout
+from tests.api.unittests.utils import llm_response
+
+
+@pytest.fixture
+def merge(monkeypatch):
+    """
+    Replaces the LLM that combines answers with a fake that joins them.
+    """
+    monkeypatch.setattr(fanout, "text_qa_merge", lambda question, sources:
+                        llm_response(" | ".join(f"{p}: {a}" for p, a in sources.items()), input_tokens=1))
+
+
+def test__question_terms():
+    """
+    Checks that stopwords are dropped and plurals are reduced to the singular.
+    """
+    assert fanout.question_terms("Which services set a custom timeout?") == ["service", "set", "custom", "timeout"]
+
+
+def test__rank_files():
+    """
+    Checks that path matches outweigh content matches and files matching nothing are dropped.
+    """
+    files = ["a/timeout.go", "b/main.go", "c/util.go", "d/README.md"]
+    counts = {"b/main.go": 1, "c/util.go": 3}
+    assert fanout.rank_files(["timeout", "retry", "custom"], files, counts) == ["c/util.go", "a/timeout.go", "b/main.go"]
+    assert fanout.rank_files([], files, {}) == sorted(files)
+
+
+def test__fanout_qa__concurrency(merge):
+    """
+    Checks that files are analyzed concurrently up to the limit, that results
+    are streamed as they finish, that answers are combined in relevance order,
+    that a failed file is recorded without losing the other answers, and that
+    the chunks skipped in every file are summed.
+    """
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def ask(path):
+        with lock:
+            running.append(path)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(path)
+        if path == "binary.bin":
+            raise ValueError("binary")
+        if path == "flaky.py":
+            raise RuntimeError("rate limited")
+        response = llm_response(f"answer {path}")
+        response.skipped_chunks = 2
+        return response
+    streamed = []
+    files = ["f1", "f2", "binary.bin", "flaky.py", "f3", "f4"]
+    result = fanout.fanout_qa("q", files, ask, concurrency=2,
+                              on_result=lambda path, response: streamed.append(path), candidates=9)
+    assert max(peak) == 2
+    assert sorted(streamed) == sorted(result.analyzed) == ["f1", "f2", "f3", "f4"]
+    assert list(result.response.sources) == ["f1", "f2", "f3", "f4"]
+    assert result.response.output.startswith("f1: answer f1 | f2: answer f2")
+    assert result.response.input_tokens == 41
+    assert result.response.skipped_chunks == 8
+    assert result.candidates == 9 and not result.budget_exhausted
+    assert result.failed == {"flaky.py": "RuntimeError: rate limited"}
+
+
+def test__fanout_qa__token_budget(merge):
+    """
+    Checks that no file is started once the token budget is spent.
+    """
+    result = fanout.fanout_qa("q", [f"f{i}" for i in range(10)], lambda path: llm_response(path, input_tokens=100),
+                              concurrency=1, token_budget=250)
+    assert result.analyzed == ["f0", "f1", "f2"]
+    assert result.budget_exhausted
+
+    result = fanout.fanout_qa("q", ["f0"], lambda path: llm_response("only"))
+    assert result.response.output == "only" and result.response.input_tokens == 10
+    assert fanout.fanout_qa("q", [], lambda path: llm_response("")).response.sources == {}
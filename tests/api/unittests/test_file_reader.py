@@ -0,0 +1,89 @@
+# Standard lib
+import os
+import codecs
+
+# 3rd party
+import pytest
+from sh import git
+
+# Local
+from chaingpt.api import file_reader
+from chaingpt.api.file_reader import FileReader
+
+
+def _write(tmp_path, name: str, data: bytes) -> str:
+    path = os.path.join(tmp_path, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test__sniff_encoding():
+    """
+    Checks that byte order marks win, valid UTF-8 is kept and anything else is Latin-1.
+    """
+    assert file_reader.sniff_encoding(codecs.BOM_UTF16_LE + "hi".encode("utf-16-le")) == "utf-16"
+    assert file_reader.sniff_encoding(codecs.BOM_UTF32_LE + "hi".encode("utf-32-le")) == "utf-32"
+    assert file_reader.sniff_encoding(codecs.BOM_UTF8 + b"hi") == "utf-8-sig"
+    assert file_reader.sniff_encoding("café".encode("utf-8")[:-1], final=False) == "utf-8"
+    assert file_reader.sniff_encoding("café".encode("latin-1")) == "latin-1"
+
+
+def test__read__encodings(tmp_path):
+    """
+    Checks that Latin-1 and UTF-16 files are decoded instead of raising.
+    """
+    assert FileReader(_write(tmp_path, "a.txt", "café\n".encode("latin-1"))).read() == "café\n"
+    path = _write(tmp_path, "b.txt", "café\n".encode("utf-16"))
+    reader = FileReader(path)
+    assert not reader.binary
+    assert reader.read() == "café\n"
+
+
+def test__binary(tmp_path):
+    """
+    Checks that files with NUL bytes are detected as binary, and empty files are not.
+    """
+    assert FileReader(_write(tmp_path, "a.bin", b"\x7fELF\x00\x01")).binary
+    empty = FileReader(_write(tmp_path, "empty.txt", b""))
+    assert not empty.binary
+    assert empty.read() == "" and list(empty.chunks(100, 10)) == []
+
+
+def test__truncated(tmp_path):
+    """
+    Checks that reading stops after `max_chars` characters and reports truncation.
+    """
+    path = _write(tmp_path, "a.txt", ("é" * 100_000).encode())
+    reader = FileReader(path, max_chars=70_000)
+    assert reader.truncated
+    assert reader.read() == "é" * 70_000
+    assert not FileReader(path, max_chars=100_000).truncated
+    assert not FileReader(path).truncated
+
+
+def test__chunks(tmp_path, monkeypatch):
+    """
+    Checks that chunks respect the chunk size, end on line boundaries,
+    overlap, and cover the whole text across block boundaries.
+    """
+    monkeypatch.setattr(file_reader, "BLOCK_SZ", 1000)
+    lines = [f"line {i:05d}\n" for i in range(2000)]
+    path = _write(tmp_path, "a.txt", "".join(lines).encode())
+    chunks = list(FileReader(path).chunks(500, 50))
+    assert all(len(c) <= 500 for c in chunks)
+    assert all(c.endswith("\n") for c in chunks)
+    assert all(a[-50:].split("\n", 1)[1] and b.startswith(a[-50:].split("\n", 1)[1])
+               for a, b in zip(chunks, chunks[1:]))
+    assert set("".join(chunks).splitlines(keepends=True)) == set(lines)
+
+    with pytest.raises(ValueError):
+        next(FileReader(path).chunks(100, 50))
+
+
+def test__blob_sha(tmp_path):
+    """
+    Checks that the blob SHA matches git's.
+    """
+    path = _write(tmp_path, "a.txt", b"hello\n" * 50_000)
+    assert FileReader(path).blob_sha() == str(git("hash-object", path)).strip()
@@ -0,0 +1,130 @@
+# Standard lib
+import os
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import grep_index
+from chaingpt.api.path_index import PathIndex
+from tests.api.unittests.utils import git_commit_files
+
+
+@pytest.fixture
+def grep_repo(local_git_repo):
+    """
+    Fixture that adds source files to `local_git_repo` and returns a `GrepIndex` over it.
+    """
+    git_commit_files(local_git_repo, {
+        "src/reader.py": "def open_file(path):\n    return open(path).read()\n",
+        "src/writer.go": "func WriteFile(path string) error {\n\treturn os.WriteFile(path, nil, 0644)\n}\n",
+        "docs/usage.md": "Call open_file to read a file.\n",
+        "image.bin": "PNG\0\0binary open_file",
+    })
+    return grep_index.GrepIndex(PathIndex(local_git_repo))
+
+
+@pytest.mark.parametrize("pattern,expected", [
+    ("open_file", "open_file"),
+    ("ab", None),
+    ("def\\s+open_file", ("and", ["def", "open_file"])),
+    ("(read|write)File", ("and", [("or", ["read", "write"]), "file"])),
+    ("(read|w)File", "file"),
+    ("x*foo", "foo"),
+    ("(?:bar)+baz", ("and", ["bar", "baz"])),
+    ("(?:bar)?baz", "baz"),
+    ("^Open", "open"),
+])
+def test__literal_query(pattern, expected):
+    """
+    Checks that the literals required by a regular expression are extracted.
+    """
+    assert grep_index.literal_query(pattern) == expected
+
+
+def test__literal_query__invalid():
+    """
+    Checks that an invalid regular expression raises a `ValueError`.
+    """
+    with pytest.raises(ValueError):
+        grep_index.literal_query("open(")
+
+
+class TestGrepIndex:
+    def test__refresh__skips_binary_files(self, grep_repo):
+        """
+        Checks that binary files are not indexed.
+        """
+        grep_repo.refresh()
+        assert "image.bin" not in grep_repo._files
+        assert "src/reader.py" in grep_repo._files
+
+
+    def test__grep__literal(self, grep_repo):
+        """
+        Checks that every matching line is returned in path and line order.
+        """
+        matches = grep_repo.grep("open_file")
+        assert matches == [
+            grep_index.GrepMatch("docs/usage.md", 1, "Call open_file to read a file."),
+            grep_index.GrepMatch("src/reader.py", 1, "def open_file(path):"),
+        ]
+
+
+    def test__grep__regex(self, grep_repo):
+        """
+        Checks that regular expressions with alternations are matched.
+        """
+        matches = grep_repo.grep(r"(Read|Write)File\(")
+        assert [(m.path, m.line_number) for m in matches] == [("src/writer.go", 1), ("src/writer.go", 2)]
+
+
+    def test__grep__no_literals(self, grep_repo):
+        """
+        Checks that patterns without usable literals scan every file.
+        """
+        matches = grep_repo.grep(r"^\w+$")
+        assert matches == [grep_index.GrepMatch("README.md", 1, "project")]
+
+
+    def test__grep__path_glob(self, grep_repo):
+        """
+        Checks that only files matching `path_glob` are searched.
+        """
+        matches = grep_repo.grep("open_file", path_glob="src/**")
+        assert [m.path for m in matches] == ["src/reader.py"]
+
+
+    def test__grep__max_results(self, grep_repo):
+        """
+        Checks that no more than `max_results` lines are returned.
+        """
+        assert len(grep_repo.grep("path", max_results=2)) == 2
+
+
+    def test__grep__sees_new_files(self, grep_repo):
+        """
+        Checks that files added after the index was built are searched.
+        """
+        assert grep_repo.grep("needle") == []
+        with open(os.path.join(grep_repo.root, "src", "new.py"), "w") as f:
+            f.write("needle = 1\n")
+        assert grep_repo.grep("needle") == [grep_index.GrepMatch("src/new.py", 1, "needle = 1")]
+
+
+    def test__grep__invalid_pattern(self, grep_repo):
+        """
+        Checks that an invalid regular expression raises a `ValueError`.
+        """
+        with pytest.raises(ValueError):
+            grep_repo.grep("open(")
+
+
+    def test__term_counts(self, grep_repo):
+        """
+        Checks that files are counted by the terms they contain, case-insensitively,
+        within `path_glob`.
+        """
+        assert grep_repo.term_counts(["OPEN_FILE", "path", "ab"]) == \
+            {"src/reader.py": 2, "src/writer.go": 1, "docs/usage.md": 1}
+        assert grep_repo.term_counts(["path"], path_glob="src/*.go") == {"src/writer.go": 1}
@@ -0,0 +1,204 @@
+# Standard lib
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+# 3rd party
+import pytest
+from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+# Local
+from chaingpt.api import llm
+
+
+@pytest.fixture
+def fake_chains(monkeypatch):
+    """
+    Replaces the notes chains with fakes. Extracting returns the chunk,
+    combining joins the notes with "+". Chunks are not prefiltered.
+    """
+    combined: List[List[str]] = []
+
+    def combine(inputs):
+        combined.append(inputs["notes"])
+        return "+".join(inputs["notes"])
+    monkeypatch.setattr(llm, "extract_notes_chain", RunnableLambda(lambda inputs: inputs["chunk"]))
+    monkeypatch.setattr(llm, "combine_notes_chain", RunnableLambda(combine))
+    monkeypatch.setattr(llm, "read_summary_chain", RunnableLambda(lambda inputs: inputs["summary"]))
+    monkeypatch.setattr(llm, "PREFILTER", None)
+    return combined
+
+
+def test__notes_tree__fan_in(fake_chains):
+    """
+    Checks that notes are merged in groups of `fan_in` in file order, and
+    that empty and NONE notes are dropped.
+    """
+    tree = llm.NotesTree("q", "f", fan_in=2)
+    for notes in ["a", "NONE", "b", "c", " ", "d", "e"]:
+        tree.add(notes)
+    assert tree.result() == "a+b+c+d+e"
+    assert all(len(notes) <= 2 for notes in fake_chains)
+    assert fake_chains[:3] == [["a", "b"], ["c", "d"], ["a+b", "c+d"]]
+    assert llm.NotesTree("q", "f").result() == ""
+    with pytest.raises(ValueError):
+        llm.NotesTree("q", "f", fan_in=1)
+
+
+def test__text_qa_tree__token_budget(fake_chains):
+    """
+    Checks that chunks are read lazily and reading stops once the token budget is spent.
+    """
+    read = []
+
+    def chunks():
+        for i in range(100):
+            read.append(i)
+            yield f"chunk {i} " * 10
+
+    response = llm.text_qa_tree("q", chunks(), fan_in=4, token_budget=10)
+    assert response.truncated
+    assert read == [0]
+    assert response.output == "[No relevant information was found]"
+
+    response = llm.text_qa_tree("q", iter(["x", "y", "z"]), fan_in=4)
+    assert not response.truncated
+    assert response.output == "x+y+z"
+
+
+def test__reduce_notes(fake_chains):
+    """
+    Checks that notes are merged level by level in file order, and that
+    a group of one is carried up without an LLM call.
+    """
+    assert llm.reduce_notes("q", ["a", "b", "NONE", "c", "d", "e"], fan_in=2) == "a+b+c+d+e"
+    # Groups of a level are merged concurrently, in any order
+    assert sorted(fake_chains[:2]) == [["a", "b"], ["c", "d"]]
+    assert fake_chains[2:] == [["a+b", "c+d"], ["a+b+c+d", "e"]]
+    assert llm.reduce_notes("q", ["NONE", " "]) == ""
+
+
+def test__text_qa_map_reduce__modes(fake_chains, monkeypatch):
+    """
+    Checks that tree mode merges the notes of every chunk, that refine mode
+    is still selectable, and that unknown modes are rejected.
+    """
+    monkeypatch.setattr(llm, "summarize_chunk_chain",
+                        RunnableLambda(lambda inputs: inputs["chunk"] if inputs["summary"].startswith("[")
+                                       else inputs["summary"] + ">" + inputs["chunk"]))
+    chunks = ["a", "b", "c", "d", "e"]
+    response = llm.text_qa_map_reduce("q", chunks, mode="tree", fan_in=2, max_concurrency=4)
+    assert response.output == "a+b+c+d+e"
+    assert llm.text_qa_map_reduce("q", iter(chunks), mode="refine").output == "a>b>c>d>e"
+    assert llm.text_qa_map_reduce("q", ["NONE"], mode="tree").output == "[No relevant information was found]"
+    with pytest.raises(ValueError):
+        llm.text_qa_map_reduce("q", chunks, mode="stuff")
+
+
+def test__prefilter(fake_chains, monkeypatch):
+    """
+    Checks that chunks dropped by the prefilter are never sent to the LLM
+    in either mode, that they are reported as skipped, and that passing no
+    prefilter disables the configured one.
+    """
+    summarized = []
+
+    def summarize(inputs):
+        summarized.append(inputs["chunk"])
+        return inputs["chunk"]
+    monkeypatch.setattr(llm, "summarize_chunk_chain", RunnableLambda(summarize))
+    prefilter = llm.ChunkPrefilter("keyword", min_score=0.5, min_keep=0.1, window=4)
+    chunks = ["def login(user):", "x = 1", "y = 2", "z = 3", "w = 4", "v = 5"]
+
+    response = llm.text_qa_map_reduce("How does login work?", iter(chunks), mode="refine", prefilter=prefilter)
+    assert summarized == ["def login(user):", "w = 4"]
+    assert response.skipped_chunks == 4
+
+    response = llm.text_qa_tree("How does login work?", iter(chunks), prefilter=prefilter)
+    assert response.output == "def login(user):+w = 4"
+    assert response.skipped_chunks == 4
+    monkeypatch.setattr(llm, "PREFILTER", prefilter)
+    assert llm.text_qa_map_reduce("login", chunks, mode="tree").skipped_chunks == 4
+    assert llm.text_qa_map_reduce("login", chunks, mode="tree", prefilter=None).skipped_chunks == 0
+    assert llm.text_qa_tree("login", iter(chunks), prefilter=None).output == "+".join(chunks)
+
+
+def test__qa_engine__pack(monkeypatch):
+    """
+    Checks that files are packed into as few prompts as fit, in order
+    within a prompt, and that files too large for a prompt are set apart.
+    """
+    monkeypatch.setattr(llm, "count_tokens", lambda text, model: len(text))
+    engine = llm.QAEngine(max_tokens=100, max_files=3)
+    files = [("a", "x" * 40), ("b", "x" * 20), ("c", "x" * 5), ("d", "x" * 200), ("e", "x" * 20)]
+    bins, oversized = engine.pack([(p, t) for p, t in files])
+    # Every rendered file has 24 characters of markup
+    assert bins == [[0, 2], [1, 4]]
+    assert oversized == [3]
+    assert llm.QAEngine(max_tokens=1000, max_files=2).pack(files[:3])[0] == [[0, 1], [2]]
+
+
+def test__qa_engine__answer(fake_chains, monkeypatch):
+    """
+    Checks that packed files are answered in one call with per-file sources,
+    that oversized files are chunked, and that answers from several prompts are merged.
+    A single chunked file is answered in one call, or via map-reduce if it has several chunks.
+    """
+    prompts = []
+
+    def multi_qa(inputs):
+        prompts.append([p for p, _ in inputs["files"]])
+        return "".join(f"FILE: {p}\n{t if t != 'noise' else 'NOT RELEVANT'}\n" for p, t in inputs["files"]) + \
+            "ANSWER: " + "+".join(p for p, t in inputs["files"] if t != "noise")
+    monkeypatch.setattr(llm, "multi_qa_chain", RunnableLambda(multi_qa))
+    monkeypatch.setattr(llm, "qa_chain", RunnableLambda(lambda inputs: inputs["content"][0]))
+    monkeypatch.setattr(llm, "merge_answers_chain",
+                        RunnableLambda(lambda inputs: "merged " + ",".join(inputs["sources"])))
+    monkeypatch.setattr(llm, "text_qa_map_reduce", lambda question, chunks, file_path, max_concurrency, prefilter:
+                        llm.LLMResponse(output=f"{sum(1 for _ in chunks)} chunks", model="test", input_tokens=7,
+                                        output_tokens=3, skipped_chunks=2))
+
+    response = llm.QAEngine(max_tokens=1000).answer("q", [("a.yaml", "port: 80"), ("b.yaml", "noise")])
+    assert prompts == [["a.yaml", "b.yaml"]]
+    assert response.output == "a.yaml"
+    assert response.sources == {"a.yaml": "port: 80", "b.yaml": llm.NOT_RELEVANT}
+
+    big = "".join(f"line {i}\n" for i in range(500))
+    response = llm.QAEngine(max_tokens=1000).answer("q", [("a.yaml", "port: 80"), ("big.log", big)])
+    assert response.output == "merged a.yaml,big.log"
+    assert response.sources["big.log"].endswith("chunks") and response.input_tokens == 7
+    assert response.skipped_chunks == 2
+    assert llm.QAEngine().answer_chunks("q", "a.py", iter(["x = 1"])).output == "x = 1"
+    assert llm.QAEngine().answer_chunks("q", "a.py", iter(["x = 1", "y = 2"])).output == "2 chunks"
+
+    with pytest.raises(ValueError):
+        llm.QAEngine().answer("q", [])
+
+
+def test__llm__call_slots(monkeypatch):
+    """
+    Checks that LLM requests made from any number of threads never exceed
+    the process-wide limit.
+    """
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def generate(self, messages, *args, **kwargs):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+    monkeypatch.setattr(ChatOpenAI, "_generate", generate)
+    monkeypatch.setattr(llm, "_call_slots", threading.BoundedSemaphore(2))
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        outputs = list(pool.map(lambda i: llm.llm.invoke(f"prompt {i}").content, range(6)))
+    assert outputs == ["ok"] * 6
+    assert max(peak) == 2
@@ -0,0 +1,89 @@
+# Standard lib
+import os
+
+# 3rd party
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+
+# Local
+from chaingpt.api import llm
+from chaingpt.api.llm_cache import LLMCache, ReplayMissError
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMCache(os.path.join(tmp_path, "llm_cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test__lookup__round_trip(cache):
+    """
+    Checks that stored generations come back whole, including function
+    calls, and only for the same model parameters and prompt.
+    """
+    message = AIMessage(content="", additional_kwargs={"function_call": {"name": "file_qa", "arguments": "{}"}})
+    cache.update("prompt", "model", [ChatGeneration(message=message, generation_info={"finish_reason": "stop"})])
+    generations = cache.lookup("prompt", "model")
+    assert generations[0].message == message
+    assert generations[0].generation_info == {"finish_reason": "stop"}
+    assert cache.lookup("prompt", "other model") is None
+    assert cache.lookup("other prompt", "model") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test__update__evicts_least_recently_used(tmp_path):
+    """
+    Checks that the least recently used completions are evicted once the
+    cache outgrows its size budget.
+    """
+    cache = LLMCache(os.path.join(tmp_path, "llm_cache.sqlite"), max_size_mb=600 / 1024 / 1024)
+    generation = lambda text: [ChatGeneration(message=AIMessage(content=text * 20))]
+    cache.update("a", "model", generation("a"))
+    cache.update("b", "model", generation("b"))
+    cache.lookup("a", "model")
+    cache.update("c", "model", generation("c"))
+    assert cache.lookup("b", "model") is None
+    assert cache.lookup("a", "model") is not None
+    assert cache.lookup("c", "model") is not None
+    assert cache.stats()["size"] <= 600
+    cache.close()
+
+
+def test__chat_model__record_replay(tmp_path):
+    """
+    Checks that a chat model answers repeated prompts from the cache, and
+    that a replayed recording answers without calling the model and fails
+    on prompts it lacks.
+    """
+    path = os.path.join(tmp_path, "recording.sqlite")
+    recorder = LLMCache(path, max_size_mb=None)
+    model = FakeListChatModel(responses=["first", "second"], cache=recorder)
+    assert model.invoke("hello").content == "first"
+    assert model.invoke("hello").content == "first"
+    assert model.invoke("bye").content == "second"
+    recorder.close()
+
+    player = LLMCache(path, max_size_mb=None, replay=True)
+    model = FakeListChatModel(responses=["first", "second"], cache=player)
+    assert model.invoke("bye").content == "second"
+    assert model.invoke("hello").content == "first"
+    assert model.i == 0
+    with pytest.raises(ReplayMissError):
+        model.invoke("unseen")
+    player.close()
+
+
+def test__use_response_cache(cache):
+    """
+    Checks that no cache is opened on import, and that a cache set later is
+    used by the file analysis model.
+    """
+    assert llm.llm.cache is None
+    llm.use_response_cache(cache)
+    try:
+        assert [s.cache for s in llm.summarize_chunk_chain.steps if s is llm.llm] == [cache]
+    finally:
+        llm.use_response_cache(None)
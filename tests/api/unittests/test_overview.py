@@ -0,0 +1,149 @@
+# Standard lib
+import os
+
+# 3rd party
+import pytest
+from sh import git
+
+# Local
+from chaingpt.api import overview
+from chaingpt.api.llm import LLMResponse
+from chaingpt.api.path_index import PathIndex
+from tests.api.unittests.utils import git_commit_files
+
+
+@pytest.fixture
+def project(local_git_repo):
+    git_commit_files(local_git_repo, {
+        "go.mod": "module example.com/project\n",
+        "cmd/cli/main.go": "package main\n",
+        "pkg/matcher/matcher.go": "package matcher\n",
+        "pkg/matcher/rules.go": "package matcher\n",
+        "pkg/deep/a/b/c/README.md": "too deep\n",
+        ".github/workflows/ci.yaml": "on: push\n",
+    })
+    return local_git_repo
+
+
+@pytest.fixture
+def summarize(monkeypatch):
+    """
+    Replaces the LLM with a fake that records its inputs.
+    """
+    calls = []
+
+    def fake(dir_path, listing, files, children):
+        calls.append((dir_path, [p for p, _ in files], [p for p, _ in children]))
+        return LLMResponse(output=f"summary of {dir_path or '/'}", model="test",
+                           input_tokens=10, output_tokens=5)
+    monkeypatch.setattr(overview, "summarize_directory", fake)
+    return calls
+
+
+def _overview(repo_dir, cache_dir, **kwargs) -> overview.RepoOverview:
+    paths = PathIndex(repo_dir)
+    paths.refresh()
+    return overview.RepoOverview(repo_dir, paths, cache_dir=cache_dir, **kwargs)
+
+
+def test__key_files():
+    """
+    Checks that READMEs come before manifests and entry points, and other files are ignored.
+    """
+    assert overview.key_files(["main.go", "util.go", "go.mod", "README.md"]) == ["README.md", "go.mod", "main.go"]
+
+
+def test__directory_tree():
+    """
+    Checks that files are grouped by directory with recursive file counts.
+    """
+    dirs = overview.directory_tree(["a.txt", "x/b.txt", "x/y/c.txt"])
+    assert dirs[""].files == ["a.txt"] and dirs[""].subdirs == {"x"} and dirs[""].file_count == 3
+    assert dirs["x"].subdirs == {"y"} and dirs["x"].file_count == 2
+    assert dirs["x/y"].files == ["c.txt"]
+
+
+def test__refresh__bottom_up(tmp_path, project, summarize):
+    """
+    Checks that directories are summarized deepest first from their key
+    files and their subdirectories' summaries, and that hidden and too
+    deep directories are skipped.
+    """
+    ov = _overview(project, os.path.join(tmp_path, "overviews"), max_depth=2, max_workers=2)
+    ov.refresh()
+    order = [dir_path for dir_path, _, _ in summarize]
+    assert order.index("cmd/cli") < order.index("cmd") < order.index("")
+    root = next(c for c in summarize if c[0] == "")
+    assert root[1] == ["README.md", "go.mod"]
+    assert root[2] == ["cmd", "pkg", "src"]
+    assert not any(d.startswith(".github") or d.startswith("pkg/deep/") for d in order)
+    # No key files, so only listed
+    assert ov.get("pkg/matcher") == "Contains matcher.go, rules.go."
+    assert ov.get("") == "summary of /"
+    assert ov.tokens_used == 15 * len(summarize)
+    assert ov.ready() and ov.progress == 1.0
+
+
+def test__refresh__token_budget(tmp_path, project, summarize):
+    """
+    Checks that no LLM calls are made without a token budget.
+    """
+    ov = _overview(project, os.path.join(tmp_path, "overviews"), token_budget=0)
+    ov.refresh()
+    assert summarize == []
+    assert ov.get("").startswith("Contains .github/ (1 file), cmd/ (1 file), pkg/ (3 files)")
+
+
+def test__refresh__persisted(tmp_path, project, summarize):
+    """
+    Checks that an overview is loaded, not rebuilt, for a commit that was
+    already summarized.
+    """
+    cache_dir = os.path.join(tmp_path, "overviews")
+    _overview(project, cache_dir).refresh()
+    calls = len(summarize)
+    ov = _overview(project, cache_dir)
+    ov.refresh()
+    assert len(summarize) == calls
+    assert ov.get("") == "summary of /"
+
+
+def test__refresh__sparse_checkout_not_persisted(tmp_path, project, summarize):
+    """
+    Checks that an overview planned without key files missing from the
+    working copy is not persisted for later sessions on the same commit.
+    """
+    cache_dir = os.path.join(tmp_path, "overviews")
+    # Left out of the working copy the way a sparse checkout does
+    git("-C", project, "update-index", "--skip-worktree", "go.mod")
+    os.remove(os.path.join(project, "go.mod"))
+    ov = _overview(project, cache_dir)
+    ov.refresh()
+    assert ov.get("") == "summary of /"
+    assert not os.path.exists(cache_dir) or os.listdir(cache_dir) == []
+
+
+def test__refresh__no_cache_dir(tmp_path, project, summarize):
+    """
+    Checks that an overview without a `cache_dir` is rebuilt every time.
+    """
+    _overview(project, None).refresh()
+    calls = len(summarize)
+    ov = _overview(project, None)
+    ov.refresh()
+    assert len(summarize) == 2 * calls
+    assert ov.get("") == "summary of /"
+
+
+def test__render(tmp_path, project, summarize):
+    """
+    Checks that summaries are rendered as an outline limited by depth and size.
+    """
+    ov = _overview(project, os.path.join(tmp_path, "overviews"))
+    assert ov.render() == ""
+    ov.refresh()
+    assert ov.render("cmd", depth=1) == "cmd/: summary of cmd\n  cmd/cli/: summary of cmd/cli"
+    outline = ov.render(depth=1)
+    assert outline.splitlines()[0] == "./: summary of /"
+    assert "  cmd/: summary of cmd" in outline and "cmd/cli/" not in outline
+    assert ov.render(depth=1, max_chars=10).splitlines() == ["./: summary of /", "..."]
@@ -0,0 +1,78 @@
+# Standard lib
+import os
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import path_index
+from tests.api.unittests.utils import git_commit_files
+
+
+@pytest.mark.parametrize("pattern,path,expected", [
+    ("*", "README.md", True),
+    ("*", "src/main.py", False),
+    ("src/*.py", "src/main.py", True),
+    ("**/*.py", "main.py", True),
+    ("**/*.py", "src/a/main.py", True),
+    ("src/**", "src/a/main.py", True),
+    ("*", ".hidden", False),
+    ("src/ma?n.py", "src/main.py", True),
+    ("src/[lm]ain.py", "src/main.py", True),
+    ("src/[!m]ain.py", "src/main.py", False),
+])
+def test__glob_to_regex(pattern, path, expected):
+    """
+    Checks that glob patterns are translated with `glob.glob` semantics.
+    """
+    assert bool(path_index.glob_to_regex(pattern).fullmatch(path)) == expected
+
+
+@pytest.mark.parametrize("pattern,prefix", [
+    ("src/api/*.py", "src/api/"),
+    ("**/*.py", ""),
+    ("./src/*", "src/"),
+])
+def test__literal_prefix(pattern, prefix):
+    """
+    Checks that the leading directories without wildcards are returned.
+    """
+    assert path_index.literal_prefix(pattern) == prefix
+
+
+class TestPathIndex:
+    def test__search__literal_path(self, local_git_repo):
+        """
+        Checks that patterns without wildcards match a single file or directory.
+        """
+        index = path_index.PathIndex(local_git_repo)
+        assert index.search("src") == (["src"], [])
+        assert index.search("src/main.py") == ([], ["src/main.py"])
+        assert index.search("./src/main.py") == ([], ["src/main.py"])
+        assert index.search("dne") == ([], [])
+
+
+    def test__search__traversal(self, local_git_repo):
+        """
+        Checks that paths outside of the repository never match.
+        """
+        index = path_index.PathIndex(local_git_repo)
+        assert index.search("../*") == ([], [])
+        assert index.search("/etc/passwd") == ([], [])
+
+
+    def test__refresh__only_when_changed(self, local_git_repo, monkeypatch):
+        """
+        Checks that the index is only rebuilt when the working copy changes.
+        """
+        index = path_index.PathIndex(local_git_repo)
+        index.refresh()
+        calls = []
+        list_files = index._list_files
+        monkeypatch.setattr(index, "_list_files", lambda: calls.append(1) or list_files())
+
+        index.search("**")
+        assert calls == []
+        git_commit_files(local_git_repo, {"src/new.py": ""})
+        assert index.search("src/new.py") == ([], ["src/new.py"])
+        assert calls == [1]
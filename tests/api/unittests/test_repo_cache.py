@@ -0,0 +1,182 @@
+# Standard lib
+import os
+import threading
+
+# 3rd party
+import pytest
+from sh import git, ErrorReturnCode
+
+# Local
+from chaingpt.api import repo_cache, workspace
+from tests.api.unittests.utils import git_commit_files
+
+
+def test__normalize_url__equivalent_spellings():
+    """
+    Checks that different spellings of a GitHub URL normalize to the same value.
+    """
+    expected = "https://github.com/user/project"
+    assert repo_cache.normalize_url("https://github.com/user/project") == expected
+    assert repo_cache.normalize_url("https://GitHub.com/user/project.git") == expected
+    assert repo_cache.normalize_url("https://github.com/user/project/") == expected
+    assert repo_cache.normalize_url("git@github.com:user/project.git") == expected
+    assert repo_cache.normalize_url("ssh://git@github.com/user/project") == expected
+
+
+def test__normalize_url__local_path(tmp_path):
+    """
+    Checks that local paths normalize to absolute `file://` URLs.
+    """
+    path = os.path.join(tmp_path, "project")
+    assert repo_cache.normalize_url(path + "/") == "file://" + path
+    assert repo_cache.normalize_url("file://" + path) == "file://" + path
+
+
+def test__cache_key__distinct_repos():
+    """
+    Checks that repositories with the same name but different owners get
+    different keys, and that the key starts with the repository name.
+    """
+    a = repo_cache.cache_key("https://github.com/a/project")
+    b = repo_cache.cache_key("https://github.com/b/project")
+    assert a != b
+    assert a.startswith("project-")
+    assert a == repo_cache.cache_key("git@github.com:a/project.git")
+
+
+class TestRepositoryCache:
+    def test__checkout__clones_mirror(self, tmp_path, local_git_repo):
+        """
+        Checks that the first checkout creates a mirror and a working copy
+        whose origin is the original URL.
+        """
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        dest = os.path.join(tmp_path, "wk", "project")
+        lease = cache.checkout(local_git_repo, dest)
+        try:
+            assert os.path.exists(cache.mirror_path(local_git_repo))
+            assert os.path.exists(os.path.join(dest, "src", "main.py"))
+            origin = str(git("-C", dest, "remote", "get-url", "origin", _tty_out=False)).strip()
+            assert origin == local_git_repo
+        finally:
+            lease.release()
+
+
+    def test__checkout__fetches_new_commits(self, tmp_path, local_git_repo):
+        """
+        Checks that a later checkout reuses the mirror and sees commits
+        pushed after the mirror was created.
+        """
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        cache.checkout(local_git_repo, os.path.join(tmp_path, "wk1")).release()
+        git_commit_files(local_git_repo, {"NEW.md": "new"})
+
+        dest = os.path.join(tmp_path, "wk2")
+        cache.checkout(local_git_repo, dest).release()
+        assert os.path.exists(os.path.join(dest, "NEW.md"))
+        assert len(os.listdir(cache.mirrors_dir)) == 3  # mirror and two lock files
+
+
+    def test__checkout__shares_objects(self, tmp_path, local_git_repo):
+        """
+        Checks that working copies borrow the mirror's objects instead of copying them.
+        """
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        dest = os.path.join(tmp_path, "wk")
+        cache.checkout(local_git_repo, dest).release()
+        alternates = os.path.join(dest, ".git", "objects", "info", "alternates")
+        with open(alternates) as f:
+            assert cache.mirror_path(local_git_repo) in f.read()
+
+
+    def test__checkout__invalid_url(self, tmp_path):
+        """
+        Checks that a failed clone raises and leaves no partial mirror behind.
+        """
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        url = os.path.join(tmp_path, "dne")
+        with pytest.raises(ErrorReturnCode):
+            cache.checkout(url, os.path.join(tmp_path, "wk"))
+        assert not os.path.exists(cache.mirror_path(url))
+
+
+    def test__checkout__concurrent(self, tmp_path, local_git_repo):
+        """
+        Checks that concurrent checkouts of the same repository share one mirror.
+        """
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        errors = []
+
+        def checkout(i):
+            try:
+                cache.checkout(local_git_repo, os.path.join(tmp_path, f"wk{i}")).release()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=checkout, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        for i in range(4):
+            assert os.path.exists(os.path.join(tmp_path, f"wk{i}", "README.md"))
+
+
+    def test__evict__least_recently_used(self, tmp_path, local_git_repo):
+        """
+        Checks that the least recently used mirror is evicted once the
+        cache is over budget.
+        """
+        other = os.path.join(tmp_path, "upstream", "other")
+        git.clone("--quiet", local_git_repo, other)
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        cache.checkout(local_git_repo, os.path.join(tmp_path, "wk1")).release()
+        cache.checkout(other, os.path.join(tmp_path, "wk2")).release()
+        old = cache.mirror_path(local_git_repo)
+        os.utime(old, (0, 0))
+
+        cache.max_size = cache.size() - 1
+        assert cache.evict() == [repo_cache.cache_key(local_git_repo)]
+        assert not os.path.exists(old)
+        assert os.path.exists(cache.mirror_path(other))
+
+
+    def test__evict__skips_mirrors_in_use(self, tmp_path, local_git_repo):
+        """
+        Checks that a mirror held by a live lease is never evicted.
+        """
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        lease = cache.checkout(local_git_repo, os.path.join(tmp_path, "wk"))
+        cache.max_size = 0
+        assert cache.evict() == []
+        assert os.path.exists(cache.mirror_path(local_git_repo))
+
+        lease.release()
+        assert cache.evict() == [repo_cache.cache_key(local_git_repo)]
+
+
+class TestWorkspaceCache:
+    def test__workspace__uses_cache(self, tmp_path, local_git_repo):
+        """
+        Checks that a workspace is created from the cache and that
+        closing it removes the workspace directory but keeps the mirror.
+        """
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        wk = workspace.Workspace(local_git_repo, cache=cache)
+        assert os.path.exists(os.path.join(wk.repo_dir, "README.md"))
+        wk.close()
+        assert not os.path.exists(wk.parent_dir)
+        assert os.path.exists(cache.mirror_path(local_git_repo))
+
+
+    def test__workspace__invalid_url(self, tmp_path):
+        """
+        Checks that a URL that cannot be cloned through the cache raises
+        a `ValueError` and leaves no workspace directory behind.
+        """
+        cache = repo_cache.RepositoryCache(os.path.join(tmp_path, "cache"))
+        before = set(os.listdir("/tmp"))
+        with pytest.raises(ValueError):
+            workspace.Workspace(os.path.join(tmp_path, "dne"), cache=cache)
+        assert set(os.listdir("/tmp")) == before
@@ -0,0 +1,64 @@
+# Standard lib
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api.catalog import CatalogPackage
+from chaingpt.api.resolver import DependencyResolver
+
+
+PACKAGES = [
+    CatalogPackage("python-3.12", "", "3.12.2-r1", provides=("cmd:python3=3.12.2-r1",),
+                   depends=("so:libc.so.6", "so:libpython3.12.so.1.0"), installed_size=2100),
+    CatalogPackage("libpython-3.12", "", "3.12.2-r1", provides=("so:libpython3.12.so.1.0=1.0",),
+                   depends=("so:libc.so.6", "python-3.12"), installed_size=3000),
+    CatalogPackage("glibc", "", "2.39-r0", provides=("so:libc.so.6=6",), installed_size=6000),
+    CatalogPackage("musl-compat", "", "1.0-r0", provides=("so:libc.so.6=5",), installed_size=10),
+    CatalogPackage("broken", "", "1.0-r0", depends=("so:libmissing.so.1", "!glibc"), installed_size=1),
+]
+
+
+@pytest.fixture
+def resolver():
+    return DependencyResolver(PACKAGES)
+
+
+class TestDependencyResolver:
+    def test__provider__virtual_name(self, resolver):
+        """
+        Checks that provided names resolve to the newest provider.
+        """
+        assert resolver.provider("cmd:python3") == "python-3.12"
+        assert resolver.provider("so:libc.so.6") == "glibc"
+        assert resolver.provider("python-3.12>=3.12") == "python-3.12"
+
+
+    def test__resolve__transitive_with_cycle(self, resolver):
+        """
+        Checks that the closure follows provided names and terminates
+        on dependency cycles.
+        """
+        resolution = resolver.resolve(["python-3.12"])
+        assert resolution.packages == ["glibc", "libpython-3.12", "python-3.12"]
+        assert resolution.installed_size == 11100
+        assert resolution.unresolved == []
+
+
+    def test__resolve__unresolved(self, resolver):
+        """
+        Checks that unknown requested and transitive names are reported
+        and that conflicts are not installed.
+        """
+        resolution = resolver.resolve(["broken", "nope", " "])
+        assert resolution.packages == ["broken"]
+        assert resolution.unresolved == ["nope", "so:libmissing.so.1"]
+
+
+    def test__resolve__memoized(self, resolver):
+        """
+        Checks that closures are reused across calls.
+        """
+        first = resolver.resolve(["libpython-3.12"])
+        assert "libpython-3.12" in resolver._closures
+        assert resolver.resolve(["libpython-3.12"]) == first
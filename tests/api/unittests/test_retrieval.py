@@ -0,0 +1,126 @@
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import retrieval
+
+
+CHUNKS = [
+    "import os\nimport sys\n\ndef main():\n    run()\n",
+    "def parse_config(path):\n    with open(path) as f:\n        return yaml.safe_load(f)\n",
+    "class HTTPServer:\n    def listen(self, port):\n        self.socket.bind(port)\n",
+    "def run():\n    server = HTTPServer()\n    server.listen(8080)\n",
+    "def cleanup():\n    shutil.rmtree(TMP_DIR)\n",
+]
+
+
+def test__tokenize__splits_identifiers():
+    """
+    Checks that identifiers are kept whole and split into their parts.
+    """
+    assert retrieval.tokenize("parseHTTPHeader snake_case") == [
+        "parsehttpheader", "parse", "http", "header", "snake_case", "snake", "case"]
+
+
+class TestChunkIndex:
+    def test__rank__best_chunk_first(self):
+        """
+        Checks that the chunk containing the question's terms ranks first.
+        """
+        index = retrieval.ChunkIndex(CHUNKS)
+        ranked = index.rank("How is the config file parsed?")
+        assert ranked[0][0] == 1
+
+
+    def test__rank__stopwords_ignored(self):
+        """
+        Checks that questions made only of stopwords match nothing.
+        """
+        index = retrieval.ChunkIndex(CHUNKS)
+        assert index.rank("What does this do?") == []
+
+
+def test__chunk_index__cached_by_blob():
+    """
+    Checks that indexes are reused for the same blob and chunking settings.
+    """
+    a = retrieval.chunk_index("sha-a", CHUNKS, 100, 10)
+    assert retrieval.chunk_index("sha-a", CHUNKS, 100, 10) is a
+    assert retrieval.chunk_index("sha-a", CHUNKS, 200, 10) is not a
+    assert retrieval.chunk_index("sha-b", CHUNKS, 100, 10) is not a
+
+
+class TestSelectChunks:
+    def test__select_chunks__neighbors(self):
+        """
+        Checks that the best chunks are selected with their neighbors, in file order.
+        """
+        index = retrieval.ChunkIndex(CHUNKS)
+        selected = retrieval.select_chunks(index, "Which port does the HTTPServer listen on?",
+                                           top_k=1, neighbors=1, token_budget=1000, min_score=0)
+        assert selected == [1, 2, 3]
+
+
+    def test__select_chunks__token_budget(self):
+        """
+        Checks that the selection stops once the token budget is spent.
+        """
+        index = retrieval.ChunkIndex(CHUNKS)
+        budget = retrieval.estimate_tokens(CHUNKS[2])
+        selected = retrieval.select_chunks(index, "Which port does the HTTPServer listen on?",
+                                           top_k=3, neighbors=1, token_budget=budget, min_score=0)
+        assert selected == [2]
+
+
+    def test__select_chunks__low_confidence(self):
+        """
+        Checks that `None` is returned when no chunk scores high enough,
+        so the whole file is scanned.
+        """
+        index = retrieval.ChunkIndex(CHUNKS)
+        assert retrieval.select_chunks(index, "What does this do?") is None
+        assert retrieval.select_chunks(index, "listen", min_score=100) is None
+
+
+class TestChunkPrefilter:
+    @pytest.mark.parametrize("scorer", ["keyword", "bm25", "hashing"])
+    def test__filter__scorers(self, scorer):
+        """
+        Checks that every scorer keeps the chunks about the question, in file
+        order, and counts the others as skipped.
+        """
+        prefilter = retrieval.ChunkPrefilter(scorer, min_score=0.1, min_keep=0.2, window=5)
+        chunks, stats = prefilter.filter("Which port does the HTTPServer listen on?", CHUNKS)
+        assert list(chunks) == [CHUNKS[2], CHUNKS[3]]
+        assert (stats.seen, stats.skipped) == (5, 3)
+
+
+    def test__filter__safety_floor(self):
+        """
+        Checks that the best chunks of every window are kept when none score
+        high enough, that chunks are read a window at a time, and that questions
+        without terms keep every chunk.
+        """
+        read = []
+
+        def chunks():
+            for i, chunk in enumerate(CHUNKS):
+                read.append(i)
+                yield chunk
+
+        prefilter = retrieval.ChunkPrefilter("keyword", min_score=0.9, min_keep=0.5, window=2)
+        kept, stats = prefilter.filter("Where is the config parsed from yaml and cached?", chunks())
+        assert next(kept) == CHUNKS[1]
+        assert read == [0, 1]
+        assert len(list(kept)) == 2
+        assert (stats.seen, stats.skipped) == (5, 2)
+
+        strict = retrieval.ChunkPrefilter("keyword", min_score=2, min_keep=0.1, window=2)
+        kept, stats = strict.filter("What does this do?", CHUNKS)
+        assert list(kept) == CHUNKS
+        assert (stats.seen, stats.skipped) == (len(CHUNKS), 0)
+
+        with pytest.raises(ValueError):
+            retrieval.ChunkPrefilter("tfidf")
+        with pytest.raises(ValueError):
+            retrieval.ChunkPrefilter(min_keep=0)
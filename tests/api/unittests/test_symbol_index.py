@@ -0,0 +1,174 @@
+# Standard lib
+import os
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import symbol_index
+from tests.api.unittests.utils import git_commit_files
+
+
+PYTHON_SOURCE = """\
+MAX_SIZE = 10
+
+
+class Workspace:
+    def fileqa(self, question):
+        return helper(question)
+
+
+def helper(x):
+    return x
+
+
+async def fetch():
+    pass
+"""
+
+
+def _defs(path, text):
+    definitions, _ = symbol_index.extract_symbols(path, text)
+    return [(s.qualname, s.kind, s.line_number) for s in definitions]
+
+
+def test__extract_symbols__python():
+    """
+    Checks that Python classes, methods, functions and constants are extracted.
+    """
+    assert _defs("a.py", PYTHON_SOURCE) == [
+        ("MAX_SIZE", "variable", 1),
+        ("Workspace", "class", 4),
+        ("Workspace.fileqa", "method", 5),
+        ("helper", "function", 9),
+        ("fetch", "function", 13),
+    ]
+
+
+def test__extract_symbols__python_syntax_error():
+    """
+    Checks that unparsable Python files yield no definitions but still yield uses.
+    """
+    definitions, names = symbol_index.extract_symbols("a.py", "def broken(:\n    helper()\n")
+    assert definitions == []
+    assert ("helper", 2) in names
+
+
+def test__extract_symbols__go():
+    """
+    Checks that Go functions, methods and types are extracted.
+    """
+    text = "type Client struct {\n}\n\nfunc (c *Client) Search(q string) {}\n\nfunc NewClient() *Client {}\n"
+    assert _defs("a.go", text) == [("Client", "class", 1), ("Search", "method", 4), ("NewClient", "function", 6)]
+
+
+def test__extract_symbols__javascript():
+    """
+    Checks that JavaScript functions, classes, arrow functions and methods are extracted.
+    """
+    text = ("export function parse(x) {}\n"
+            "class Reader {\n"
+            "  read(path) {\n"
+            "    if (path) {\n"
+            "    }\n"
+            "  }\n"
+            "}\n"
+            "const load = async (x) => x\n")
+    assert _defs("a.ts", text) == [("parse", "function", 1), ("Reader", "class", 2),
+                                   ("read", "method", 3), ("load", "function", 8)]
+
+
+def test__extract_symbols__rust():
+    """
+    Checks that Rust functions, types and macros are extracted.
+    """
+    text = "pub struct Index {}\npub(crate) async fn build() {}\nmacro_rules! log {}\n"
+    assert _defs("a.rs", text) == [("Index", "class", 1), ("build", "function", 2), ("log", "macro", 3)]
+
+
+def test__extract_symbols__java():
+    """
+    Checks that Java classes and methods are extracted, but not control flow.
+    """
+    text = ("public final class Index {\n"
+            "    public static List<String> search(String q) {\n"
+            "        if (q == null) {\n"
+            "        }\n"
+            "    }\n"
+            "}\n")
+    assert _defs("A.java", text) == [("Index", "class", 1), ("search", "method", 2)]
+
+
+def test__extract_symbols__unsupported():
+    """
+    Checks that unsupported files yield nothing.
+    """
+    assert symbol_index.extract_symbols("README.md", "def helper(): pass") == ([], [])
+
+
+@pytest.fixture
+def symbol_repo(local_git_repo):
+    git_commit_files(local_git_repo, {
+        "pkg/workspace.py": PYTHON_SOURCE,
+        "pkg/cli.py": "from pkg.workspace import Workspace, helper\n\nhelper(Workspace().fileqa('q'))\n",
+        "web/app.js": "function helper() {}\n",
+    })
+    return local_git_repo
+
+
+class TestSymbolIndex:
+    def test__find__definitions_and_references(self, tmp_path, symbol_repo):
+        """
+        Checks that definitions across languages and references outside the
+        definition are returned.
+        """
+        index = symbol_index.SymbolIndex(symbol_repo, cache_dir=os.path.join(tmp_path, "symbols"))
+        lookup = index.find("helper")
+        assert [(s.path, s.line_number) for s in lookup.definitions] == [
+            ("pkg/workspace.py", 9), ("web/app.js", 1)]
+        assert [(r.path, r.line_number) for r in lookup.references] == [
+            ("pkg/cli.py", 1), ("pkg/cli.py", 3), ("pkg/workspace.py", 6)]
+        assert lookup.references[2].line == "return helper(question)"
+        assert lookup.total_references == 3
+
+
+    def test__find__qualified_name(self, tmp_path, symbol_repo):
+        """
+        Checks that qualified names only match definitions in that scope.
+        """
+        index = symbol_index.SymbolIndex(symbol_repo, cache_dir=os.path.join(tmp_path, "symbols"))
+        lookup = index.find("Workspace.fileqa")
+        assert [s.qualname for s in lookup.definitions] == ["Workspace.fileqa"]
+        assert index.find("Other.fileqa").definitions == []
+
+
+    def test__find__max_references(self, tmp_path, symbol_repo):
+        """
+        Checks that references are capped while the total is still reported.
+        """
+        index = symbol_index.SymbolIndex(symbol_repo, cache_dir=os.path.join(tmp_path, "symbols"))
+        lookup = index.find("helper", max_references=1)
+        assert len(lookup.references) == 1
+        assert lookup.total_references == 3
+
+
+    def test__refresh__persisted_by_commit(self, tmp_path, symbol_repo, monkeypatch):
+        """
+        Checks that an index built for a commit is loaded by later sessions
+        on the same commit and rebuilt for a new commit.
+        """
+        cache_dir = os.path.join(tmp_path, "symbols")
+        symbol_index.SymbolIndex(symbol_repo, cache_dir=cache_dir).refresh()
+        assert len(os.listdir(cache_dir)) == 1
+
+        def fail(self):
+            raise AssertionError("the index should be loaded from the cache")
+        monkeypatch.setattr(symbol_index.SymbolIndex, "_index", fail)
+        index = symbol_index.SymbolIndex(symbol_repo, cache_dir=cache_dir)
+        assert [s.qualname for s in index.find("Workspace").definitions] == ["Workspace"]
+        monkeypatch.undo()
+
+        git_commit_files(symbol_repo, {"pkg/new.py": "def added(): pass\n"})
+        index = symbol_index.SymbolIndex(symbol_repo, cache_dir=cache_dir)
+        assert [s.path for s in index.find("added").definitions] == ["pkg/new.py"]
+        assert len(os.listdir(cache_dir)) == 2
@@ -0,0 +1,63 @@
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.api import tokens
+from chaingpt.api.tokens import ModelLimits
+
+
+def _chars(text: str) -> int:
+    return len(text)
+
+
+def test__model_limits():
+    """
+    Checks that the longest matching model prefix wins and unknown models get the default.
+    """
+    assert tokens.model_limits("gpt-3.5-turbo-0125") == ModelLimits(16385, 4096)
+    assert tokens.model_limits("gpt-3.5-turbo-0613") == ModelLimits(4096, 4096)
+    assert tokens.model_limits("gpt-4o-mini-2024-07-18").output == 16384
+    assert tokens.model_limits("llama") == tokens.DEFAULT_LIMITS
+    assert tokens.chunk_budget("gpt-3.5-turbo-0125", reserve=1000) == 16385 - 4096 - 1000
+    assert tokens.chunk_budget("llama", reserve=10000) == tokens.MIN_CHUNK_TOKENS
+
+
+def test__count_tokens__approximate(monkeypatch):
+    """
+    Checks that tokens are estimated from characters without a tokenizer.
+    """
+    monkeypatch.setattr(tokens, "_encoding", lambda model: None)
+    assert tokens.count_tokens("abcd" * 10) == 10
+    assert tokens.count_tokens("abcde") == 2
+    assert tokens.count_tokens("") == 0
+
+
+def test__split_tokens__code_boundaries():
+    """
+    Checks that chunks are cut between top-level definitions, not inside them.
+    """
+    functions = [f"def function_{i}():\n" + "    x = 1\n" * 5 + "    return x\n\n" for i in range(20)]
+    chunks = list(tokens.split_tokens(functions, 400, 50, count=_chars))
+    assert len(chunks) > 1
+    assert all(len(c) <= 400 for c in chunks)
+    assert all(c.startswith("def ") for c in chunks)
+    assert "".join(chunks) == "".join(functions)
+
+
+def test__split_tokens__overlap_and_long_lines():
+    """
+    Checks that chunks cut inside a block overlap, and that lines longer
+    than a chunk are split.
+    """
+    lines = [f"    line {i:04d}\n" for i in range(200)]
+    chunks = list(tokens.split_tokens(lines, 300, 40, count=_chars))
+    assert all(len(c) <= 300 for c in chunks)
+    # Two 14-character lines fit in the overlap
+    assert all(b.startswith(a[-28:]) for a, b in zip(chunks, chunks[1:]))
+    assert set("".join(chunks).splitlines(keepends=True)) == set(lines)
+
+    chunks = list(tokens.split_tokens(["x" * 1000], 300, count=_chars))
+    assert all(len(c) <= 300 for c in chunks) and "".join(chunks) == "x" * 1000
+
+    with pytest.raises(ValueError):
+        next(tokens.split_tokens(lines, 100, 50))
@@ -1,11 +1,15 @@
 # Standard lib
 import os
+import threading
 
 # 3rd party
 import pytest
 
 # Local
+from chaingpt.api import wolfi
 from chaingpt.api.wolfi import WolfiClient
+from tests.api.unittests.utils import git_commit_files, melange_yaml
+from tests.api.unittests.utils import write_apkindex, APKINDEX_TEXT
 
 
 class TestWolfiClient:
@@ -39,3 +43,416 @@ class TestWolfiClient:
         """
         with pytest.raises(TypeError):
             WolfiClient().search(123)
+
+
+MELANGE_WITH_PIPELINE = """\
+# Generated by the test suite
+package:
+  name: example
+  version: 1.2.3
+  # The description follows
+  description: An example package
+
+environment:
+  contents:
+    packages:
+      - busybox
+pipeline:
+  - runs: |
+      package: not-the-package
+      make install
+"""
+
+
+def test___package_block__stops_at_next_section():
+    """
+    Checks that only the top-level `package:` mapping is extracted.
+    """
+    block = wolfi._package_block(MELANGE_WITH_PIPELINE)
+    assert block.startswith("package:")
+    assert "environment" not in block
+    assert "make install" not in block
+
+
+def test___package_block__no_package():
+    """
+    Checks that `None` is returned for files without a `package:` section.
+    """
+    assert wolfi._package_block("pipeline:\n  - uses: fetch\n") is None
+
+
+def test___parse_package_file__partial(tmp_path):
+    """
+    Checks that the name and description are parsed from the
+    `package:` section only.
+    """
+    path = os.path.join(tmp_path, "example.yaml")
+    with open(path, "w") as f:
+        f.write(MELANGE_WITH_PIPELINE)
+    package = wolfi._parse_package_file(path)
+    assert package.name == "example"
+    assert package.description == "An example package"
+    assert package.version == "1.2.3-r0"
+
+
+def test___parse_package_files__pool_matches_serial(tmp_path):
+    """
+    Checks that parsing in a process pool yields the same results,
+    in the same order, as parsing serially.
+    """
+    paths = []
+    for i in range(wolfi.PARALLEL_BUILD_MIN_FILES + 10):
+        path = os.path.join(tmp_path, f"pkg-{i}.yaml")
+        with open(path, "w") as f:
+            f.write(melange_yaml(f"pkg-{i}", f"Package number {i}") if i % 7 else "pipeline: []\n")
+        paths.append(path)
+    serial = list(wolfi._parse_package_files(paths, workers=1))
+    parallel = list(wolfi._parse_package_files(paths, workers=2))
+    assert parallel == serial
+    assert serial[0] is None
+    assert serial[1].name == "pkg-1"
+
+
+def test___parse_package_files__background_thread(tmp_path):
+    """
+    Checks that the process pool works when started from a background
+    thread, as `BackgroundWolfiClient` does.
+    """
+    paths = []
+    for i in range(wolfi.PARALLEL_BUILD_MIN_FILES):
+        path = os.path.join(tmp_path, f"pkg-{i}.yaml")
+        with open(path, "w") as f:
+            f.write(melange_yaml(f"pkg-{i}", f"Package number {i}"))
+        paths.append(path)
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(wolfi._parse_package_files(paths, workers=2)))
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive()
+    assert [p.name for p in results] == [f"pkg-{i}" for i in range(len(paths))]
+
+
+def _local_client(tmp_path, repo_dir, **kwargs) -> WolfiClient:
+    return WolfiClient(os_path=os.path.join(tmp_path, "wolfi-os"),
+                       index_path=os.path.join(tmp_path, "wolfi-index"),
+                       os_url=repo_dir, **kwargs)
+
+
+class TestWolfiClientRefresh:
+    def test__init_index__local_repo(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that every package in the checkout is indexed and
+        that the manifest records the indexed commit.
+        """
+        client = _local_client(tmp_path, local_wolfi_repo)
+        names = [r.name for r in client.search("python")]
+        assert sorted(names) == ["python-3.11", "python-3.12"]
+        assert client._read_manifest()["head"] == client._head()
+
+
+    def test__refresh_index__unchanged(self, tmp_path, local_wolfi_repo, monkeypatch):
+        """
+        Checks that no melange file is parsed when the upstream
+        commit has not changed.
+        """
+        _local_client(tmp_path, local_wolfi_repo)
+
+        def fail(file_path):
+            raise AssertionError(f"{file_path} should not be parsed")
+
+        monkeypatch.setattr(wolfi, "_parse_package_file", fail)
+        client = _local_client(tmp_path, local_wolfi_repo, rebuild=True)
+        assert len(client.search("python")) == 2
+
+
+    def test__refresh_index__added_modified_deleted(self, tmp_path, local_wolfi_repo, monkeypatch):
+        """
+        Checks that only changed melange files are reparsed and that
+        added, modified and deleted packages are reflected in the index.
+        """
+        _local_client(tmp_path, local_wolfi_repo)
+        git_commit_files(local_wolfi_repo, {
+            "nodejs-20.yaml": melange_yaml("nodejs-20", "JavaScript runtime"),
+            "git.yaml": melange_yaml("git", "the stupid content tracker"),
+            "python-3.11.yaml": None,
+        })
+
+        parsed = []
+        parse = wolfi._parse_package_file
+        def record(file_path):
+            parsed.append(os.path.basename(file_path))
+            return parse(file_path)
+
+        monkeypatch.setattr(wolfi, "_parse_package_file", record)
+        client = _local_client(tmp_path, local_wolfi_repo, rebuild=True)
+        assert sorted(parsed) == ["git.yaml", "nodejs-20.yaml"]
+        assert [r.name for r in client.search("nodejs")] == ["nodejs-20"]
+        assert [r.name for r in client.search("python")] == ["python-3.12"]
+        assert [r.description for r in client.search("git")] == ["the stupid content tracker"]
+        assert client._read_manifest()["head"] == client._head()
+
+
+    def test__refresh_index__missing_manifest(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that a full rebuild happens when the index has no manifest.
+        """
+        client = _local_client(tmp_path, local_wolfi_repo)
+        os.remove(os.path.join(client.index_path, wolfi.MANIFEST_NAME))
+        client = _local_client(tmp_path, local_wolfi_repo, rebuild=True)
+        assert len(client.search("python")) == 2
+        assert client._read_manifest() is not None
+
+
+class TestWolfiClientSearchCache:
+    def test__search__cache_hit(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that repeated and equivalent keywords are served
+        from the result cache.
+        """
+        client = _local_client(tmp_path, local_wolfi_repo)
+        first = client.search("python")
+        second = client.search("  Python ")
+        assert first == second
+        assert client.cache_stats()["misses"] == 1
+        assert client.cache_stats()["hits"] == 1
+
+
+    def test__search__cache_is_bounded(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that the least recently used keyword is evicted.
+        """
+        client = _local_client(tmp_path, local_wolfi_repo, cache_size=1)
+        client.search("python")
+        client.search("git")
+        client.search("python")
+        assert client.cache_stats() == {"hits": 0, "misses": 3, "size": 1, "maxsize": 1}
+
+
+    def test__search__index_changed(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that the searcher is refreshed and cached results are
+        dropped when the index changes.
+        """
+        client = _local_client(tmp_path, local_wolfi_repo, use_catalog=False)
+        assert len(client.search("python")) == 2
+
+        writer = client.index.writer()
+        writer.add_document(file_name="python-3.13.yaml", package_name="python-3.13",
+                            package_desc="The Python 3.13 software library")
+        writer.commit()
+
+        assert len(client.search("python")) == 3
+        client.close()
+
+
+class TestWolfiClientCatalog:
+    def test__init__no_rebuild_skips_index(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that a client started without a rebuild answers simple
+        searches from the catalog without opening the whoosh index.
+        """
+        _local_client(tmp_path, local_wolfi_repo).close()
+        client = _local_client(tmp_path, local_wolfi_repo, rebuild=False)
+        results = client.search("python")
+        assert [r.name for r in results] == ["python-3.12", "python-3.11"]
+        assert results[0].version == "1.0.0-r0"
+        assert client._index is None
+
+
+    def test__search__complex_query_uses_index(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that keywords using the query language fall back to whoosh.
+        """
+        client = _local_client(tmp_path, local_wolfi_repo, rebuild=False)
+        results = client.search("python*")
+        assert len(results) == 2
+        assert client._index is not None
+
+
+    def test__init__missing_catalog(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that a missing catalog is rewritten from the index.
+        """
+        client = _local_client(tmp_path, local_wolfi_repo)
+        client.close()
+        os.remove(client.catalog_path)
+        client = _local_client(tmp_path, local_wolfi_repo, rebuild=False)
+        assert len(client.search("git")) == 1
+
+
+def _apkindex_client(tmp_path, apkindex_path, **kwargs) -> WolfiClient:
+    return WolfiClient(index_path=os.path.join(tmp_path, "wolfi-index"),
+                       source=wolfi.SOURCE_APKINDEX, apkindex_url=apkindex_path, **kwargs)
+
+
+class TestWolfiClientAPKINDEX:
+    def test__init_index__subpackages(self, tmp_path, local_apkindex):
+        """
+        Checks that binary subpackages are indexed with their newest
+        version, dependencies and provides.
+        """
+        client = _apkindex_client(tmp_path, local_apkindex)
+        names = [r.name for r in client.search("python")]
+        assert "python-3.12-dev" in names
+        package = client.catalog.get("python-3.12")
+        assert package.version == "3.12.2-r1"
+        assert "so:libpython3.12.so.1.0" in package.depends
+        assert "cmd:python3=3.12.2-r1" in package.provides
+
+
+    def test__refresh_index__unchanged(self, tmp_path, local_apkindex, monkeypatch):
+        """
+        Checks that an unchanged APKINDEX is not parsed again.
+        """
+        _apkindex_client(tmp_path, local_apkindex).close()
+
+        def fail(fileobj):
+            raise AssertionError("The APKINDEX should not be parsed")
+
+        monkeypatch.setattr(wolfi, "parse_apkindex", fail)
+        client = _apkindex_client(tmp_path, local_apkindex, rebuild=True)
+        assert len(client.search("python-3.12-dev")) >= 1
+
+
+    def test__refresh_index__changed(self, tmp_path, local_apkindex):
+        """
+        Checks that the index is rebuilt when the APKINDEX changes.
+        """
+        _apkindex_client(tmp_path, local_apkindex).close()
+        write_apkindex(local_apkindex, APKINDEX_TEXT + "\nP:nodejs-20\nV:20.11.1-r0\nT:JavaScript runtime\n")
+        client = _apkindex_client(tmp_path, local_apkindex, rebuild=True)
+        assert [r.name for r in client.search("nodejs")] == ["nodejs-20"]
+
+
+    def test__refresh_index__truncated(self, tmp_path, local_apkindex):
+        """
+        Checks that the existing index is kept when the changed APKINDEX
+        cannot be read.
+        """
+        _apkindex_client(tmp_path, local_apkindex).close()
+        with open(local_apkindex, "rb") as f:
+            data = f.read()
+        with open(local_apkindex, "wb") as f:
+            f.write(data[:len(data) // 2])
+        client = _apkindex_client(tmp_path, local_apkindex, rebuild=True)
+        assert len(client.search("python-3.12-dev")) >= 1
+
+
+    def test__refresh_index__missing(self, tmp_path, local_apkindex):
+        """
+        Checks that the existing index is kept when a local APKINDEX is removed.
+        """
+        _apkindex_client(tmp_path, local_apkindex).close()
+        os.remove(local_apkindex)
+        client = _apkindex_client(tmp_path, local_apkindex, rebuild=True)
+        assert len(client.search("python-3.12-dev")) >= 1
+
+
+    def test__init__unknown_source(self, tmp_path):
+        """
+        Checks that a `ValueError` is raised for an unknown source.
+        """
+        with pytest.raises(ValueError):
+            WolfiClient(index_path=os.path.join(tmp_path, "wolfi-index"), source="svn")
+
+
+class TestWolfiClientResolve:
+    def test__resolve__apkindex(self, tmp_path, local_apkindex):
+        """
+        Checks that a subpackage resolves to its full install set.
+        """
+        client = _apkindex_client(tmp_path, local_apkindex)
+        resolution = client.resolve(["python-3.12-dev", "nope"])
+        assert resolution.packages == ["glibc", "libpython-3.12", "python-3.12", "python-3.12-dev"]
+        assert resolution.installed_size == 500 + 2100 + 3000 + 6000
+        assert resolution.unresolved == ["nope"]
+
+
+    def test__resolve__melange_runtime_deps(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that melange runtime dependencies and provides are used
+        with the git source.
+        """
+        git_commit_files(local_wolfi_repo, {
+            "py3-pip.yaml": melange_yaml("py3-pip", "pip").replace(
+                "  epoch: 0\n", "  epoch: 0\n  dependencies:\n    runtime:\n      - python3\n"),
+            "python-3.12.yaml": melange_yaml("python-3.12", "Python").replace(
+                "  epoch: 0\n", "  epoch: 0\n  dependencies:\n    provides:\n      - python3=${{package.full-version}}\n"),
+        })
+        client = _local_client(tmp_path, local_wolfi_repo)
+        assert client.resolve(["py3-pip"]).packages == ["py3-pip", "python-3.12"]
+
+
+    def test__resolve__deps_is_not_list(self, tmp_path, local_apkindex):
+        """
+        Checks that a `TypeError` is raised if `deps` is not a list of `str`.
+        """
+        client = _apkindex_client(tmp_path, local_apkindex)
+        with pytest.raises(TypeError):
+            client.resolve("python-3.12")
+
+
+class TestWolfiClientSuggest:
+    def test__suggest__typo(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that near matches are suggested for a misspelled keyword.
+        """
+        client = _local_client(tmp_path, local_wolfi_repo)
+        assert client.search("pyhton3") == []
+        assert [r.name for r in client.suggest("pyhton3")] == ["python-3.12", "python-3.11"]
+
+
+    def test__suggest__keyword_is_not_str(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that a `TypeError` is raised if `keyword` is not a `str`.
+        """
+        with pytest.raises(TypeError):
+            _local_client(tmp_path, local_wolfi_repo).suggest(123)
+
+
+class TestBackgroundWolfiClient:
+    def test__get__ready(self, tmp_path, local_wolfi_repo):
+        """
+        Checks that the client is built in the background and reports
+        full progress once ready.
+        """
+        wolfi_bg = wolfi.BackgroundWolfiClient(os_path=os.path.join(tmp_path, "wolfi-os"),
+                                               index_path=os.path.join(tmp_path, "wolfi-index"),
+                                               os_url=local_wolfi_repo)
+        client = wolfi_bg.get(timeout=60)
+        assert wolfi_bg.ready()
+        assert wolfi_bg.progress == 1.0
+        assert len(client.search("python")) == 2
+
+
+    def test__get__not_ready(self, tmp_path, local_wolfi_repo, monkeypatch):
+        """
+        Checks that `None` is returned while the build is running and
+        that the previous snapshot can be searched in the meantime.
+        """
+        _local_client(tmp_path, local_wolfi_repo).close()
+
+        release = threading.Event()
+        init = WolfiClient.__init__
+        def slow_init(self, *args, **kwargs):
+            release.wait()
+            init(self, *args, **kwargs)
+
+        monkeypatch.setattr(WolfiClient, "__init__", slow_init)
+        wolfi_bg = wolfi.BackgroundWolfiClient(os_path=os.path.join(tmp_path, "wolfi-os"),
+                                               index_path=os.path.join(tmp_path, "wolfi-index"),
+                                               os_url=local_wolfi_repo)
+        assert wolfi_bg.get(timeout=0) is None
+        assert [r.name for r in wolfi_bg.search_snapshot("python")] == ["python-3.12", "python-3.11"]
+        release.set()
+        assert wolfi_bg.get(timeout=60) is not None
+
+
+    def test__get__error(self, tmp_path):
+        """
+        Checks that errors from the background build are raised by `get`.
+        """
+        wolfi_bg = wolfi.BackgroundWolfiClient(index_path=os.path.join(tmp_path, "wolfi-index"),
+                                               source="svn")
+        with pytest.raises(ValueError):
+            wolfi_bg.get(timeout=60)
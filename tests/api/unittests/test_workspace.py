@@ -4,10 +4,18 @@ import shutil
 
 # 3rd party
 import pytest
+from langchain_core.runnables import RunnableLambda
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
 
 # Local
 from chaingpt.api import workspace
-from tests.api.unittests.utils import setup_grype_workspace, cleanup_leftover_workspaces
+from chaingpt.api import overview
+from chaingpt.api import llm
+from chaingpt.api import llm_cache
+from chaingpt.api.repo_cache import RepositoryCache
+from chaingpt.api.digest import DigestStore, FileDigest
+from tests.api.unittests.utils import setup_grype_workspace, cleanup_leftover_workspaces, llm_response
 
 
 def test___random_parent_dir__prefix_provided():
@@ -76,6 +84,456 @@ def test___repo_name__with_suffix():
     assert repo == "project"
 
 
+class TestWorkspaceCloneStrategies:
+    def test__clone__depth(self, local_bare_repo):
+        """
+        Checks that a shallow clone only contains the latest commit.
+        """
+        wk = workspace.Workspace(local_bare_repo, depth=1)
+        try:
+            assert wk._git("rev-list", "--count", "HEAD").strip() == "1"
+            assert wk._read_n(100, "src/util.py") == "X = 2\n"
+        finally:
+            wk.close()
+
+
+    def test__clone__blob_filter(self, local_bare_repo):
+        """
+        Checks that a blobless clone is a partial clone whose files can
+        still be read.
+        """
+        wk = workspace.Workspace(local_bare_repo, blob_filter="blob:none")
+        try:
+            assert wk._git("config", "remote.origin.promisor").strip() == "true"
+            assert wk._read_n(100, "docs/guide.md") == "guide"
+        finally:
+            wk.close()
+
+
+    def test__clone__sparse(self, tmp_path, local_bare_repo):
+        """
+        Checks that a sparse clone only checks out the requested paths, while
+        `search` still finds the other tracked files.
+        """
+        cache = RepositoryCache(os.path.join(tmp_path, "cache"))
+        wk = workspace.Workspace(local_bare_repo, cache=cache, sparse_paths=["/src/"])
+        try:
+            assert os.path.exists(os.path.join(wk.repo_dir, "src", "main.py"))
+            assert not os.path.exists(os.path.join(wk.repo_dir, "docs", "guide.md"))
+            dirs, files = wk.search("**/*.md")
+            assert files == ["README.md", "docs/guide.md"]
+            dirs, files = wk.search("*")
+            assert dirs == ["docs", "src"]
+        finally:
+            wk.close()
+
+
+    def test___read_n__sparse_blobless_fetches_on_demand(self, local_bare_repo):
+        """
+        Checks that reading a file outside a sparse, blobless checkout
+        fetches and checks it out.
+        """
+        wk = workspace.Workspace(local_bare_repo, blob_filter="blob:none", sparse_paths=["/src/"])
+        try:
+            assert wk._read_n(100, "docs/guide.md") == "guide"
+            assert os.path.exists(os.path.join(wk.repo_dir, "docs", "guide.md"))
+            assert os.path.exists(os.path.join(wk.repo_dir, "src", "main.py"))
+        finally:
+            wk.close()
+
+
+    def test___read_n__sparse_untracked_file_dne(self, tmp_path, local_bare_repo):
+        """
+        Checks that reading a file that is not tracked from a sparse checkout
+        raises a `FileNotFoundError`.
+        """
+        cache = RepositoryCache(os.path.join(tmp_path, "cache"))
+        wk = workspace.Workspace(local_bare_repo, cache=cache, sparse_paths=["/src/"])
+        try:
+            with pytest.raises(FileNotFoundError):
+                wk._read_n(100, "dne.txt")
+        finally:
+            wk.close()
+
+
+class TestWorkspaceSearch:
+    def test__search__pagination(self, local_workspace):
+        """
+        Checks that results are sorted directories first and paged
+        through with `offset` and `limit`.
+        """
+        wk = local_workspace
+        assert wk.search("**") == (["docs", "src"],
+                                   ["README.md", "docs/guide.md", "src/main.py", "src/util.py"])
+        assert wk.search_count("**") == 6
+        assert wk.search("**", offset=1, limit=2) == (["src"], ["README.md"])
+        assert wk.search("**", offset=4) == ([], ["src/main.py", "src/util.py"])
+        with pytest.raises(ValueError):
+            wk.search("**", offset=-1)
+
+
+    def test__search__sees_new_files(self, local_workspace):
+        """
+        Checks that files created or deleted after the clone are found by
+        the next search.
+        """
+        wk = local_workspace
+        assert wk.search("src/*.txt") == ([], [])
+        os.makedirs(os.path.join(wk.repo_dir, "src", "new"))
+        with open(os.path.join(wk.repo_dir, "src", "new", "notes.txt"), "w") as f:
+            f.write("notes")
+        assert wk.search("src/**/*.txt") == ([], ["src/new/notes.txt"])
+        os.remove(os.path.join(wk.repo_dir, "src", "util.py"))
+        assert wk.search("src/*.py") == ([], ["src/main.py"])
+
+
+    def test__search__skips_ignored_and_git(self, local_workspace):
+        """
+        Checks that `.git` and ignored directories are not searched.
+        """
+        wk = local_workspace
+        with open(os.path.join(wk.repo_dir, ".gitignore"), "w") as f:
+            f.write("node_modules/\n")
+        os.makedirs(os.path.join(wk.repo_dir, "node_modules", "pkg"))
+        with open(os.path.join(wk.repo_dir, "node_modules", "pkg", "index.js"), "w") as f:
+            f.write("")
+        dirs, files = wk.search("**")
+        assert "node_modules" not in dirs
+        assert not any(f.startswith(".git/") or f.startswith("node_modules/") for f in files)
+        assert wk.search(".git") == ([], [])
+
+
+class TestWorkspaceGrep:
+    def test__grep(self, local_workspace):
+        """
+        Checks that content search finds matching lines and validates its arguments.
+        """
+        wk = local_workspace
+        matches = wk.grep(r"X = \d", path_glob="src/*.py")
+        assert [(m.path, m.line_number, m.line) for m in matches] == [("src/util.py", 1, "X = 2")]
+        with pytest.raises(TypeError):
+            wk.grep(123)
+        with pytest.raises(ValueError):
+            wk.grep("X", max_results=0)
+
+
+class TestWorkspaceFindSymbol:
+    def test__find_symbol(self, local_workspace):
+        """
+        Checks that symbols are found through the workspace and `name` is validated.
+        """
+        wk = local_workspace
+        lookup = wk.find_symbol(" main ")
+        assert [(s.path, s.kind) for s in lookup.definitions] == [("src/main.py", "function")]
+        with pytest.raises(TypeError):
+            wk.find_symbol(None)
+
+
+class TestWorkspaceFileQA:
+    def test__fileqa__large_file_uses_relevant_chunks(self, local_workspace, monkeypatch):
+        """
+        Checks that only the chunks relevant to the question of a large file
+        are sent to the LLM, in a single call.
+        """
+        wk = local_workspace
+        filler = "".join(f"def helper_{i}():\n    return {i}\n\n" for i in range(2000))
+        with open(os.path.join(wk.repo_dir, "big.py"), "w") as f:
+            f.write(filler + "def parse_config(path):\n    return yaml.safe_load(path)\n" + filler)
+        calls = []
+        monkeypatch.setattr(workspace, "text_qa_excerpts", lambda question, excerpts, file_path:
+                            calls.append(excerpts) or llm_response("answer"))
+        monkeypatch.setattr(llm, "text_qa_map_reduce",
+                            lambda *args, **kwargs: pytest.fail("the whole file should not be scanned"))
+        assert wk.fileqa("How is the config parsed?", "big.py").output == "answer"
+        assert len(calls) == 1
+        assert any("parse_config" in e for e in calls[0])
+        assert len(calls[0]) <= 3
+
+
+    def test__fileqa__large_file_low_confidence(self, local_workspace, monkeypatch):
+        """
+        Checks that the whole file is scanned when no chunk is relevant, without
+        the prefilter, which is only applied when retrieval is disabled.
+        """
+        wk = local_workspace
+        with open(os.path.join(wk.repo_dir, "big.txt"), "w") as f:
+            f.write("A" * 30000)
+        monkeypatch.setattr(workspace, "MAP_REDUCE_CHUNK_TOKENS", 2000)
+        prefilters = []
+        monkeypatch.setattr(llm, "text_qa_map_reduce", lambda *args, prefilter, **kwargs:
+                            prefilters.append(prefilter) or llm_response("full scan"))
+        assert wk.fileqa("What does this do?", "big.txt", use_cache=False).output == "full scan"
+        monkeypatch.setattr(workspace.retrieval, "RETRIEVAL_ENABLED", False)
+        monkeypatch.setattr(workspace.retrieval, "PREFILTER", workspace.retrieval.ChunkPrefilter())
+        wk.fileqa("What does this do?", "big.txt", use_cache=False)
+        assert prefilters == [None, workspace.retrieval.PREFILTER]
+
+
+    def test__fileqa__fits_in_context(self, local_workspace, monkeypatch):
+        """
+        Checks that a file longer than a retrieval chunk but within the model's
+        context is answered whole in a single call.
+        """
+        wk = local_workspace
+        text = "".join(f"def helper_{i}():\n    return {i}\n\n" for i in range(1000))
+        with open(os.path.join(wk.repo_dir, "big.py"), "w") as f:
+            f.write(text)
+        monkeypatch.setattr(workspace, "MAP_REDUCE_CHUNK_TOKENS", 20000)
+        calls = []
+        monkeypatch.setattr(llm, "text_qa",
+                            lambda question, text, file_path: calls.append(text) or llm_response("answer"))
+        assert len(text) > workspace.MAP_REDUCE_CHUNK_SZ
+        assert wk.fileqa("What do the helpers return?", "big.py", use_cache=False).output == "answer"
+        assert calls == [text]
+
+
+    def test__fileqa__record_replay(self, tmp_path, local_bare_repo, monkeypatch):
+        """
+        Checks that a session recorded while the answer cache already holds
+        the answer still records the LLM call, so the session replays.
+        """
+        calls = []
+
+        def generate(self, messages, *args, **kwargs):
+            calls.append(messages)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="X is 2"))])
+
+        monkeypatch.setattr(type(llm.llm), "_generate", generate)
+        cache = RepositoryCache(os.path.join(tmp_path, "cache"))
+        question = "What is X?"
+
+        # Warm the answer cache outside of a recording
+        wk = workspace.Workspace(local_bare_repo, cache=cache)
+        assert wk.fileqa(question, "src/util.py").output == "X is 2"
+        wk.close()
+
+        path = os.path.join(tmp_path, "recording.sqlite")
+        monkeypatch.setattr(llm_cache, "RESPONSE_CACHE_ENABLED", True)
+        for mode in ("record", "replay"):
+            monkeypatch.setattr(llm_cache, "CACHE_MODE", mode)
+            responses = llm_cache.LLMCache(path, max_size_mb=None, replay=mode == "replay")
+            llm.use_response_cache(responses)
+            try:
+                wk = workspace.Workspace(local_bare_repo, cache=cache)
+                assert wk.answers is None and wk.digests is None
+                assert wk.fileqa(question, "src/util.py").output == "X is 2"
+                wk.close()
+            finally:
+                llm.use_response_cache(None)
+                responses.close()
+        assert len(calls) == 2
+
+
+    def test__fileqa__cached_answer(self, local_workspace, monkeypatch):
+        """
+        Checks that a repeated question about unchanged contents is answered
+        from the cache, and that changed contents or a bypass call the LLM.
+        """
+        wk = local_workspace
+        calls = []
+        monkeypatch.setattr(llm, "text_qa",
+                            lambda question, text, file_path: calls.append(text) or llm_response(text))
+        assert wk.fileqa("What is X?", "src/util.py").output == "X = 2\n"
+        cached = wk.fileqa("what is  x", "src/util.py")
+        assert cached.output == "X = 2\n"
+        assert cached.cached and cached.input_tokens == 0
+        assert len(calls) == 1
+
+        wk.fileqa("What is X?", "src/util.py", use_cache=False)
+        assert len(calls) == 2
+
+        with open(os.path.join(wk.repo_dir, "src", "util.py"), "w") as f:
+            f.write("X = 3\n")
+        assert wk.fileqa("What is X?", "src/util.py").output == "X = 3\n"
+        assert len(calls) == 3
+        assert wk.answers.stats()["hits"] == 1
+
+
+    def test__fileqa__large_file_uses_digest(self, tmp_path, local_workspace, monkeypatch):
+        """
+        Checks that a large file's digest is built once and reused for later
+        questions, together with the relevant chunks.
+        """
+        wk = local_workspace
+        wk.digests = DigestStore(os.path.join(tmp_path, "digests.sqlite"))
+        filler = "".join(f"def helper_{i}():\n    return {i}\n\n" for i in range(2000))
+        with open(os.path.join(wk.repo_dir, "big.py"), "w") as f:
+            f.write(filler + "def parse_config(path):\n    return yaml.safe_load(path)\n" + filler)
+        built = []
+        monkeypatch.setattr(workspace, "MAX_FILE_SZ", 1_000_000)
+        monkeypatch.setattr(workspace.digest, "DIGEST_BACKGROUND", False)
+        monkeypatch.setattr(workspace.digest, "build_digest", lambda file_path, text, chunks: built.append(
+            file_path) or FileDigest("Helpers", ["parse_config"], [], ["Helpers"] * len(chunks)))
+        calls = []
+        monkeypatch.setattr(workspace, "text_qa_digest", lambda question, digest, excerpts, file_path:
+                            calls.append((digest, excerpts)) or llm_response("answer"))
+        monkeypatch.setattr(llm, "text_qa_map_reduce",
+                            lambda *args, **kwargs: pytest.fail("the whole file should not be scanned"))
+        assert wk.fileqa("How is the config parsed?", "big.py", use_cache=False).output == "answer"
+        assert wk.fileqa("What does this do?", "big.py", use_cache=False).output == "answer"
+        assert built == ["big.py"]
+        assert len(calls) == 2
+        assert "Purpose: Helpers" in calls[0][0]
+        assert any("parse_config" in e for e in calls[0][1])
+        assert calls[1][1] == []
+
+
+    def test__fileqa__encodings_and_binary(self, local_workspace, monkeypatch):
+        """
+        Checks that Latin-1 files are decoded, binary files are rejected and
+        truncated files are reported.
+        """
+        wk = local_workspace
+        with open(os.path.join(wk.repo_dir, "latin.txt"), "wb") as f:
+            f.write("café".encode("latin-1"))
+        with open(os.path.join(wk.repo_dir, "app.bin"), "wb") as f:
+            f.write(b"\x7fELF\x00\x00")
+        monkeypatch.setattr(llm, "text_qa", lambda question, text, file_path: llm_response(text))
+        monkeypatch.setattr(workspace, "MAX_FILE_SZ", 4)
+        monkeypatch.setattr(workspace, "HIERARCHICAL_ENABLED", False)
+        response = wk.fileqa("What is this?", "latin.txt", use_cache=False)
+        assert response.output == "café"
+        assert not response.truncated
+        response = wk.fileqa("What is X?", "src/util.py", use_cache=False)
+        assert response.output == "X = "
+        assert response.truncated
+        with pytest.raises(ValueError):
+            wk.fileqa("What is this?", "app.bin")
+
+
+    def test__fileqa__large_file_streamed(self, local_workspace, monkeypatch):
+        """
+        Checks that chunks are passed to the full scan lazily when neither
+        retrieval nor digests need them all at once.
+        """
+        wk = local_workspace
+        wk.digests = None
+        with open(os.path.join(wk.repo_dir, "big.txt"), "w") as f:
+            f.write("word " * 10000)
+        monkeypatch.setattr(workspace.retrieval, "RETRIEVAL_ENABLED", False)
+        monkeypatch.setattr(workspace, "MAP_REDUCE_CHUNK_TOKENS", 1000)
+
+        def map_reduce(question, text, **kwargs):
+            assert not isinstance(text, (str, list))
+            return llm_response(str(sum(1 for _ in text)))
+        monkeypatch.setattr(llm, "text_qa_map_reduce", map_reduce)
+        assert int(wk.fileqa("What is this?", "big.txt", use_cache=False).output) >= 5
+
+
+    def test__fileqa__larger_than_max_file_sz(self, local_workspace, monkeypatch):
+        """
+        Checks that files longer than `MAX_FILE_SZ` are analyzed whole in a
+        tree instead of truncated.
+        """
+        wk = local_workspace
+        with open(os.path.join(wk.repo_dir, "big.log"), "w") as f:
+            f.write("".join(f"event {i}\n" for i in range(20000)))
+        monkeypatch.setattr(workspace, "MAX_FILE_SZ", 1000)
+
+        def tree(question, chunks, file_path, fan_in, token_budget, prefilter):
+            assert prefilter is None
+            text = "".join(chunks)
+            return llm_response(text.splitlines()[-1])
+        monkeypatch.setattr(workspace, "text_qa_tree", tree)
+        response = wk.fileqa("What is the last event?", "big.log", use_cache=False)
+        assert response.output == "event 19999"
+        assert not response.truncated
+
+
+    def test__fileqa__larger_than_max_file_sz_relevant_chunks(self, local_workspace, monkeypatch):
+        """
+        Checks that relevant chunks are found anywhere in files longer than `MAX_FILE_SZ`.
+        """
+        wk = local_workspace
+        with open(os.path.join(wk.repo_dir, "big.log"), "w") as f:
+            f.write("".join(f"event {i}\n" for i in range(20000)) + "shutdown requested by operator\n")
+        monkeypatch.setattr(workspace, "MAX_FILE_SZ", 1000)
+        calls = []
+        monkeypatch.setattr(workspace, "text_qa_excerpts", lambda question, excerpts, file_path:
+                            calls.append(excerpts) or llm_response("answer"))
+        response = wk.fileqa("Who requested the shutdown?", "big.log", use_cache=False)
+        assert response.output == "answer" and not response.truncated
+        assert "shutdown requested by operator" in calls[0][-1]
+
+
+class TestWorkspaceMultiFileQA:
+    def test__multi_fileqa(self, local_workspace, monkeypatch):
+        """
+        Checks that several small files are answered from in a single call,
+        with what every file says, and that bad paths are rejected.
+        """
+        wk = local_workspace
+        prompts = []
+
+        def multi_qa(inputs):
+            prompts.append([p for p, _ in inputs["files"]])
+            return "FILE: src/util.py\nSets X to 2.\nFILE: README.md\nNOT RELEVANT\nANSWER: X is 2 (src/util.py)."
+        monkeypatch.setattr(llm, "multi_qa_chain", RunnableLambda(multi_qa))
+        response = wk.multi_fileqa("What is X?", ["README.md", "src/util.py", "README.md"])
+        assert prompts == [["README.md", "src/util.py"]]
+        assert response.output == "X is 2 (src/util.py)."
+        assert response.sources == {"README.md": llm.NOT_RELEVANT, "src/util.py": "Sets X to 2."}
+        with pytest.raises(FileNotFoundError):
+            wk.multi_fileqa("What is X?", ["missing.py"])
+        with pytest.raises(ValueError):
+            wk.multi_fileqa("What is X?", [])
+        with pytest.raises(TypeError):
+            wk.multi_fileqa("What is X?", "src/util.py")
+
+
+class TestWorkspaceFanoutQA:
+    def test__fanout_qa(self, local_workspace, monkeypatch):
+        """
+        Checks that only files matching the glob and the question's keywords
+        are analyzed, most relevant first, and that their answers are combined.
+        """
+        wk = local_workspace
+        for name, text in [("api", "timeout: 30\n"), ("web", "retries: 3\n"), ("db", "timeout: 5\n")]:
+            os.makedirs(os.path.join(wk.repo_dir, "services", name))
+            with open(os.path.join(wk.repo_dir, "services", name, "config.yaml"), "w") as f:
+                f.write(text)
+        monkeypatch.setattr(llm, "text_qa", lambda question, text, file_path: llm_response(text.strip()))
+        monkeypatch.setattr(workspace.fanout, "text_qa_merge", lambda question, sources:
+                            llm_response(", ".join(sources)))
+        streamed = []
+        result = wk.fanout_qa("Which services set a custom timeout?", "services/**", max_files=2,
+                              on_result=lambda path, response: streamed.append(path))
+        assert result.candidates == 3
+        assert result.response.sources == {"services/api/config.yaml": "timeout: 30",
+                                           "services/db/config.yaml": "timeout: 5"}
+        assert result.response.output == "services/api/config.yaml, services/db/config.yaml"
+        assert sorted(streamed) == sorted(result.analyzed)
+        with pytest.raises(ValueError):
+            wk.fanout_qa("q", max_files=0)
+
+
+class TestWorkspaceOverview:
+    def test__repo_overview(self, tmp_path, local_bare_repo, monkeypatch):
+        """
+        Checks that directory summaries are returned as an outline, that
+        paths which are not directories are rejected, and that a disabled
+        overview is never started.
+        """
+        cache = RepositoryCache(os.path.join(tmp_path, "cache"))
+        wk = workspace.Workspace(local_bare_repo, cache=cache, overview=False)
+        monkeypatch.setattr(overview, "summarize_directory", lambda dir_path, listing, files, children:
+                            llm_response(f"summary of {dir_path or '/'}"))
+        wk.overview.cache_dir = os.path.join(tmp_path, "overviews")
+        try:
+            assert wk.repo_overview() == ""
+            assert not wk.overview.started()
+            wk.overview.refresh()
+            assert wk.overview.started()
+            assert wk.repo_overview("/").startswith("./: summary of /\n")
+            assert wk.repo_overview("src/") == "src/: summary of src"
+            with pytest.raises(ValueError):
+                wk.repo_overview("README.md")
+            with pytest.raises(TypeError):
+                wk.repo_overview(1)
+        finally:
+            wk.close()
+
+
 class TestWorkspace:
     def test__clone__grype(self, setup_grype_workspace):
         """
@@ -1,12 +1,24 @@
 # Standard lib
 import os
+import io
+import gzip
 import shutil
+import tarfile
 
 # 3rd party
 import pytest
+from sh import git
 
 # Local
 from chaingpt.api import workspace
+from chaingpt.api.llm import LLMResponse
+
+
+def llm_response(output: str, input_tokens: int=10, output_tokens: int=0) -> LLMResponse:
+    """
+    Returns the `LLMResponse` of a fake model that answered `output`.
+    """
+    return LLMResponse(output=output, model="test", input_tokens=input_tokens, output_tokens=output_tokens)
 
 
 @pytest.fixture
@@ -40,4 +52,121 @@ def cleanup_leftover_workspaces():
     for d in dirs:
         if d.startswith("chaingpt"):
             path = os.path.join("/tmp", d)
-            shutil.rmtree(path)
\ No newline at end of file
+            shutil.rmtree(path)
+
+def git_commit_files(repo_dir: str, files: dict, message: str="update"):
+    """
+    Writes `files` (a mapping of relative path to contents, or `None` to
+    delete the path) into the git repository at `repo_dir` and commits them.
+    """
+    for name, contents in files.items():
+        path = os.path.join(repo_dir, name)
+        if contents is None:
+            os.remove(path)
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(contents)
+    git("-C", repo_dir, "add", "-A")
+    git("-C", repo_dir, "-c", "user.name=test", "-c", "user.email=test@example.com",
+        "commit", "--quiet", "-m", message)
+
+
+def melange_yaml(name: str, description: str) -> str:
+    """
+    Returns a minimal melange file for the package `name`.
+    """
+    return (f"package:\n"
+            f"  name: {name}\n"
+            f"  version: 1.0.0\n"
+            f"  epoch: 0\n"
+            f"  description: {description}\n"
+            f"pipeline:\n"
+            f"  - uses: fetch\n")
+
+
+APKINDEX_TEXT = """\
+C:Q1abc=
+P:python-3.12
+V:3.12.1-r0
+A:x86_64
+S:100
+I:2000
+T:the Python programming language
+o:python-3.12
+D:so:libc.so.6 so:libpython3.12.so.1.0
+p:cmd:python3=3.12.1-r0 python3=3.12.1-r0
+
+C:Q1def=
+P:python-3.12
+V:3.12.2-r1
+A:x86_64
+S:100
+I:2100
+T:the Python programming language
+o:python-3.12
+D:so:libc.so.6 so:libpython3.12.so.1.0
+p:cmd:python3=3.12.2-r1 python3=3.12.2-r1
+
+C:Q1ghi=
+P:python-3.12-dev
+V:3.12.2-r1
+A:x86_64
+S:50
+I:500
+T:the Python programming language (development files)
+o:python-3.12
+D:python-3.12=3.12.2-r1
+p:pc:python3=3.12
+
+C:Q1jkl=
+P:libpython-3.12
+V:3.12.2-r1
+A:x86_64
+S:50
+I:3000
+T:the Python programming language (shared library)
+o:python-3.12
+D:so:libc.so.6
+p:so:libpython3.12.so.1.0=1.0
+
+C:Q1mno=
+P:glibc
+V:2.39-r0
+A:x86_64
+S:50
+I:6000
+T:the GNU C library
+o:glibc
+p:so:libc.so.6=6
+"""
+
+
+def _tar_gz(members: dict, end_of_archive: bool=True) -> bytes:
+    """
+    Returns a gzipped tar holding `members` (a mapping of name to text).
+    """
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, text in members.items():
+            data = text.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    raw = buf.getvalue()
+    if not end_of_archive:
+        # Signature tars are written without an end-of-archive marker
+        raw = raw.rstrip(b"\0")
+        raw += b"\0" * ((512 - len(raw) % 512) % 512)
+    return gzip.compress(raw)
+
+
+def write_apkindex(path: str, text: str=APKINDEX_TEXT):
+    """
+    Writes a signed-style APKINDEX.tar.gz: a signature tar followed by
+    the index tar, each compressed separately.
+    """
+    signature = _tar_gz({".SIGN.RSA.wolfi-signing.rsa.pub": "signature"}, end_of_archive=False)
+    index = _tar_gz({"DESCRIPTION": "wolfi", "APKINDEX": text})
+    with open(path, "wb") as f:
+        f.write(signature + index)
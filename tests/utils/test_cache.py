@@ -0,0 +1,50 @@
+# Standard lib
+
+# 3rd party
+import pytest
+
+# Local
+from chaingpt.utils.cache import LRUCache
+
+
+class TestLRUCache:
+    def test__get__hit_and_miss(self):
+        """
+        Checks that hits and misses are counted.
+        """
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 1, "maxsize": 2}
+
+
+    def test__put__evicts_least_recently_used(self):
+        """
+        Checks that the least recently used entry is evicted when full.
+        """
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+
+
+    def test__put__maxsize_zero(self):
+        """
+        Checks that nothing is stored when `maxsize` is 0.
+        """
+        cache = LRUCache(0)
+        cache.put("a", 1)
+        assert len(cache) == 0
+
+
+    def test__init__negative_maxsize(self):
+        """
+        Checks that a `ValueError` is raised for a negative `maxsize`.
+        """
+        with pytest.raises(ValueError):
+            LRUCache(-1)